@@ -0,0 +1,448 @@
+'''
+多蛇竞技场：成百上千条蛇（自动或人工控制）共用一张棋盘
+
+规则沿用 SnakeEngine.step / generate_food：撞墙或撞到任何蛇身（含蛇尾，包括自己的）死亡；
+食物 +10 分、长 1 节；能量豆 +50 分、长 3 节（在尾部复制 2 个节点）；直接反向的方向被忽略。
+竞技场没有胜利条件（相当于无限模式），死掉的蛇在下一个节拍于随机空格重生。
+
+每个节拍所有蛇同时移动：先按节拍开始时的棋盘判定每条蛇的新蛇头，
+两条以上的蛇同时进入同一个空格子时正面相撞，全部死亡；然后再统一落子、删尾、吃东西。
+碰撞检测只查共享的占用网格 occupancy（每个格子上所有蛇的节点数之和），与蛇的条数和长度无关。
+
+棋盘上同时有 food_count 个食物和至多 max_beans 个能量豆，items[格子下标] 记录格子上的物品。
+物品另按 16x16 的桶做空间哈希，每条蛇的目标是离它最近的物品（由近到远逐圈查桶），
+只有目标被吃掉后才重新挑选。
+
+自动驾驶直接复用 autopilot.py 中的策略：每条蛇有一个 ArenaSnake 视图，提供策略读取的
+SnakeEngine 属性（共享的 occupancy、自己的 snake / direction，以及把目标物品放在
+food_pos / power_bean_pos 上）；同一算法的寻路器（每格一个邻居表，大棋盘上很占内存）
+由所有蛇共用。默认的机器人是不做安全检查的 A*（BfsAutopilot(safe=False, algorithm="astar")），
+找不到路径时用 open_direction() 走向开阔处。
+
+用于压测机器人：
+    python arena.py --snakes 500 --size 500x500 --ticks 1000
+'''
+import argparse
+import random
+import sys
+import time
+
+from autopilot import BfsAutopilot, PATHFINDERS, open_direction
+from snake_engine import (
+    SnakeBody, DIRECTIONS, OPPOSITE, FOOD_SCORE, POWER_BEAN_SCORE, POWER_BEAN_SPAWN_CHANCE,
+)
+
+FOOD = 1
+BEAN = 2
+BUCKET_SHIFT = 4  # 空间哈希的桶为 16x16 个格子
+SPAWN_LENGTH = 4  # 重生时的蛇长：排成一条直线；棋盘太挤找不到直线空位时叠在同一格，随移动展开
+SPAWN_TRIES = 8  # 找直线空位时随机试探的蛇头数
+SEARCH_NODES = 2000  # 单次 A* 最多展开的格子数，目标被围住时不会泛洪整张棋盘
+HEAD_ON = -1  # claims 中表示有多条蛇争抢同一格子
+
+
+class ArenaSnake:
+    """竞技场中的一条蛇；同时是交给自动驾驶策略的 SnakeEngine 式视图"""
+
+    def __init__(self, arena, snake_id, pilot=None):
+        self.id = snake_id
+        self.pilot = pilot  # 有 next_direction(engine) 的策略；None 表示人工控制
+        self.grid_width = arena.grid_width
+        self.grid_height = arena.grid_height
+        self.occupancy = arena.occupancy  # 与竞技场共享
+        self.snake = SnakeBody(arena.grid_width)
+        self.direction = DIRECTIONS[0]
+        self.food_pos = None  # 目标是食物时的位置
+        self.power_bean_pos = None  # 目标是能量豆时的位置
+        self.target = -1  # 目标物品的格子下标
+        self.game_over = True  # 还没有出生或已经死亡
+        self.score = 0
+        self.best_score = 0
+        self.deaths = 0
+
+    def __len__(self):
+        return len(self.snake)
+
+
+class SnakeArena:
+    """多条蛇同时移动的共享棋盘"""
+
+    def __init__(self, grid_width=500, grid_height=500, seed=None, food_count=500, max_beans=50,
+                 respawn=True):
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.rng = random.Random(seed)
+        self.food_count = food_count
+        self.max_beans = max_beans
+        self.power_bean_spawn_chance = POWER_BEAN_SPAWN_CHANCE
+        self.respawn = respawn
+
+        size = grid_width * grid_height
+        self.occupancy = [0] * size  # 每个格子上所有蛇的节点数
+        self.free_cells = list(range(size))  # 没有蛇身的格子（可能有物品），与 SnakeEngine 相同
+        self.free_slot = self.free_cells[:]
+        self.items = bytearray(size)  # 格子下标 -> 0 / FOOD / BEAN
+        self.buckets_x = ((grid_width - 1) >> BUCKET_SHIFT) + 1
+        self.buckets_y = ((grid_height - 1) >> BUCKET_SHIFT) + 1
+        self.buckets = [set() for _ in range(self.buckets_x * self.buckets_y)]  # 桶 -> 物品格子下标
+        self.foods = 0
+        self.beans = 0
+        self.pathfinders = {}  # 算法名 -> 所有蛇共用的寻路器
+
+        self.snakes = []
+        self.ticks = 0
+        self.deaths = 0  # 累计死亡次数
+        self.head_ons = 0  # 其中正面相撞的次数
+        self._top_up_food()
+
+    def add_snake(self, pilot=None, bot=True):
+        """加入一条蛇并让它出生；pilot 为 None 且 bot 为 True 时使用默认的 A* 机器人，
+        bot 为 False 时是人工控制的蛇（方向由 step(actions) 给出）"""
+        if pilot is None and bot:
+            pilot = BfsAutopilot(safe=False, algorithm="astar")
+        snake = ArenaSnake(self, len(self.snakes), pilot)
+        self.snakes.append(snake)
+        self.spawn(snake)
+        return snake
+
+    def spawn(self, snake, cells=None, direction=None):
+        """放下一条新蛇，没有空格子时返回 False
+
+        cells 为蛇头在前的格子下标（须是空格子），direction 为初始方向；默认随机找一段直线空位。
+        """
+        if cells is None:
+            cells, direction = self._spawn_cells()
+            if cells is None:
+                return False
+        snake.snake = SnakeBody(self.grid_width, cells)
+        occupancy = self.occupancy
+        for index in cells:
+            if not occupancy[index]:
+                self._claim(index)
+            occupancy[index] += 1
+        snake.direction = direction
+        snake.score = 0
+        snake.target = -1
+        snake.game_over = False
+        if snake.pilot is not None:
+            self._attach_pathfinder(snake.pilot)
+            snake.pilot.reset()
+        return True
+
+    def _spawn_cells(self):
+        """随机找一段没有蛇身和物品的直线放新蛇，返回 (蛇头在前的格子下标, 朝向蛇头的方向)
+
+        试探 SPAWN_TRIES 个蛇头都放不下时，SPAWN_LENGTH 个节点叠在一个空格子上；
+        没有空格子时返回 (None, None)。
+        """
+        width = self.grid_width
+        height = self.grid_height
+        occupancy = self.occupancy
+        items = self.items
+        directions = list(DIRECTIONS)
+        for _ in range(SPAWN_TRIES):
+            head = self._random_free_cell()
+            if head < 0:
+                return None, None
+            x = head % width
+            y = head // width
+            self.rng.shuffle(directions)
+            for dx, dy in directions:
+                # 身体在蛇头的反方向上，蛇朝 (dx, dy) 前进
+                tail_x = x - dx * (SPAWN_LENGTH - 1)
+                tail_y = y - dy * (SPAWN_LENGTH - 1)
+                if not (0 <= tail_x < width and 0 <= tail_y < height):
+                    continue
+                cells = [(y - dy * k) * width + x - dx * k for k in range(SPAWN_LENGTH)]
+                if not any(occupancy[index] or items[index] for index in cells):
+                    return cells, (dx, dy)
+        index = self._random_free_cell()
+        if index < 0:
+            return None, None
+        return [index] * SPAWN_LENGTH, self.rng.choice(DIRECTIONS)
+
+    def _attach_pathfinder(self, pilot):
+        """让策略使用竞技场共用的寻路器，而不是每条蛇各建一份"""
+        algorithm = getattr(pilot, "algorithm", None)
+        if algorithm not in PATHFINDERS or getattr(pilot, "pathfinder", None) is not None:
+            return
+        pathfinder = self.pathfinders.get(algorithm)
+        if pathfinder is None:
+            pathfinder = PATHFINDERS[algorithm](self.grid_width, self.grid_height)
+            if hasattr(pathfinder, "node_limit"):
+                pathfinder.node_limit = SEARCH_NODES
+            self.pathfinders[algorithm] = pathfinder
+        pilot.pathfinder = pathfinder
+
+    # ---- 空格子与物品 ----
+
+    def _claim(self, index):
+        """格子被蛇身占用：从 free_cells 中交换删除"""
+        free_cells = self.free_cells
+        free_slot = self.free_slot
+        slot = free_slot[index]
+        last = free_cells.pop()
+        if last != index:
+            free_cells[slot] = last
+            free_slot[last] = slot
+        free_slot[index] = -1
+
+    def _release(self, index):
+        """格子上的蛇身全部离开：放回 free_cells"""
+        self.free_slot[index] = len(self.free_cells)
+        self.free_cells.append(index)
+
+    def _random_free_cell(self, tries=8):
+        """均匀随机取一个没有蛇身、也没有物品的格子，没有时返回 -1
+
+        先在 free_cells 中试探 tries 次；都落在物品上（棋盘很挤）时，再从没有物品的空格子中精确抽样。
+        """
+        free_cells = self.free_cells
+        items = self.items
+        for _ in range(tries):
+            if not free_cells:
+                return -1
+            index = free_cells[self.rng.randrange(len(free_cells))]
+            if not items[index]:
+                return index
+        empty = [index for index in free_cells if not items[index]]
+        return self.rng.choice(empty) if empty else -1
+
+    def _bucket(self, index):
+        width = self.grid_width
+        return ((index // width) >> BUCKET_SHIFT) * self.buckets_x + ((index % width) >> BUCKET_SHIFT)
+
+    def place_item(self, kind):
+        """在随机空格子上放一个物品，返回格子下标（没有位置时返回 -1）"""
+        index = self._random_free_cell()
+        if index < 0:
+            return -1
+        self.items[index] = kind
+        self.buckets[self._bucket(index)].add(index)
+        if kind == FOOD:
+            self.foods += 1
+        else:
+            self.beans += 1
+        return index
+
+    def take_item(self, index):
+        """蛇头吃掉格子上的物品，返回物品种类"""
+        kind = self.items[index]
+        self.items[index] = 0
+        self.buckets[self._bucket(index)].discard(index)
+        if kind == FOOD:
+            self.foods -= 1
+        else:
+            self.beans -= 1
+        return kind
+
+    def nearest_item(self, pos):
+        """离 pos 最近（曼哈顿距离）的物品格子下标，没有物品时返回 -1
+
+        由内向外逐圈查桶：第 r 圈的桶离 pos 至少 (r - 1) * 16 + 1 格，找到的距离不超过
+        这个下界时就不必再往外查。
+        """
+        x, y = pos
+        width = self.grid_width
+        buckets = self.buckets
+        buckets_x = self.buckets_x
+        buckets_y = self.buckets_y
+        bucket_x = x >> BUCKET_SHIFT
+        bucket_y = y >> BUCKET_SHIFT
+        best = -1
+        best_distance = self.grid_width + self.grid_height
+        for ring in range(max(buckets_x, buckets_y)):
+            if best >= 0 and best_distance <= ((ring - 1) << BUCKET_SHIFT):
+                break
+            for by in range(bucket_y - ring, bucket_y + ring + 1):
+                if not 0 <= by < buckets_y:
+                    continue
+                edge = by == bucket_y - ring or by == bucket_y + ring
+                step = 1 if edge else 2 * ring
+                for bx in range(bucket_x - ring, bucket_x + ring + 1, step or 1):
+                    if not 0 <= bx < buckets_x:
+                        continue
+                    for index in buckets[by * buckets_x + bx]:
+                        distance = abs(index % width - x) + abs(index // width - y)
+                        if distance < best_distance:
+                            best = index
+                            best_distance = distance
+        return best
+
+    def _retarget(self, snake):
+        """目标被吃掉后换成最近的物品，写进视图的 food_pos / power_bean_pos"""
+        index = self.nearest_item(snake.snake[0])
+        snake.target = index
+        snake.food_pos = snake.power_bean_pos = None
+        if index < 0:
+            return
+        width = self.grid_width
+        pos = (index % width, index // width)
+        if self.items[index] == BEAN:
+            snake.power_bean_pos = pos
+        else:
+            snake.food_pos = pos
+
+    # ---- 节拍 ----
+
+    def step(self, actions=None):
+        """所有蛇同时推进一个节拍，返回这一拍死亡的蛇列表
+
+        actions 为 {蛇的 id: 方向}，给人工控制的蛇（或临时覆盖机器人）；其余的蛇
+        由各自的 pilot 决定方向，pilot 返回 None 时走向开阔处，人工的蛇保持方向。
+        """
+        self.ticks += 1
+        width = self.grid_width
+        height = self.grid_height
+        occupancy = self.occupancy
+        items = self.items
+        snakes = self.snakes
+
+        # 1. 每条活着的蛇选方向，按节拍开始时的棋盘判定新蛇头
+        moves = []  # (蛇, 新蛇头格子下标)，-1 表示撞墙或撞到蛇身
+        claims = {}  # 新蛇头格子下标 -> 蛇的 id，多条蛇争抢时为 HEAD_ON
+        for snake in snakes:
+            if snake.game_over:
+                continue
+            action = actions.get(snake.id) if actions else None
+            pilot = snake.pilot
+            if action is None and pilot is not None:
+                if snake.target < 0 or not items[snake.target]:
+                    self._retarget(snake)
+                action = pilot.next_direction(snake)
+                if action is None:
+                    action = open_direction(snake, snake.food_pos or snake.power_bean_pos)
+            if action is not None and action != OPPOSITE[snake.direction]:
+                snake.direction = action
+
+            head = snake.snake.head
+            dx, dy = snake.direction
+            x = head % width + dx
+            y = head // width + dy
+            if not (0 <= x < width and 0 <= y < height) or occupancy[y * width + x]:
+                moves.append((snake, -1))
+                continue
+            index = y * width + x
+            moves.append((snake, index))
+            claims[index] = HEAD_ON if index in claims else snake.id
+
+        # 2. 先移走死亡的蛇，再统一落子：幸存者的新蛇头在节拍开始时都是空格子
+        dead = []
+        for snake, index in moves:
+            if index < 0 or claims[index] == HEAD_ON:
+                if index >= 0:
+                    self.head_ons += 1
+                self.kill(snake)
+                dead.append(snake)
+        for snake, index in moves:
+            if snake.game_over:
+                continue
+            body = snake.snake
+            body.push_head(index)
+            occupancy[index] = 1
+            self._claim(index)
+            kind = self.take_item(index) if items[index] else 0
+            if kind == FOOD:
+                # 吃到食物时不删除尾部，蛇就变长了（增加1节）
+                self._add_score(snake, FOOD_SCORE)
+                self._refill()
+            elif kind == BEAN:
+                # 能量豆增加3节身体：不删除尾部，且额外复制2个尾节点
+                self._add_score(snake, POWER_BEAN_SCORE)
+                tail_index = body.tail
+                body.push_tail(tail_index)
+                body.push_tail(tail_index)
+                occupancy[tail_index] += 2
+            else:
+                tail_index = body.pop_tail()
+                occupancy[tail_index] -= 1
+                if not occupancy[tail_index]:
+                    self._release(tail_index)
+
+        # 棋盘挤满时没放下的食物，等死亡的蛇空出格子后补上
+        if self.foods < self.food_count:
+            self._top_up_food()
+
+        # 3. 上一拍死亡的蛇重生（死亡的蛇在死亡那一拍的棋盘上空出位置后再出现）
+        if self.respawn:
+            for snake in snakes:
+                if snake.game_over and snake not in dead:
+                    self.spawn(snake)
+        return dead
+
+    def _add_score(self, snake, points):
+        snake.score += points
+        if snake.score > snake.best_score:
+            snake.best_score = snake.score
+
+    def _refill(self):
+        """吃掉一个食物后补足食物，并像 generate_food() 一样以一定概率加一个能量豆"""
+        self._top_up_food()
+        if self.beans < self.max_beans and self.rng.random() < self.power_bean_spawn_chance:
+            self.place_item(BEAN)
+
+    def _top_up_food(self):
+        """把食物补到 food_count 个；没有位置时少放，之后有格子空出来再补"""
+        while self.foods < self.food_count and self.place_item(FOOD) >= 0:
+            pass
+
+    def kill(self, snake):
+        """蛇死亡：从占用网格中移走整条蛇"""
+        occupancy = self.occupancy
+        for view in snake.snake.views():
+            for index in view:
+                occupancy[index] -= 1
+                if not occupancy[index]:
+                    self._release(index)
+        snake.snake.clear()
+        snake.game_over = True
+        snake.deaths += 1
+        self.deaths += 1
+
+    @property
+    def alive(self):
+        return sum(1 for snake in self.snakes if not snake.game_over)
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless multi-snake arena load test")
+    parser.add_argument("--snakes", type=int, default=500, help="number of bot snakes (default: 500)")
+    parser.add_argument("--size", default="500x500", help="board size WxH (default: 500x500)")
+    parser.add_argument("--ticks", type=int, default=1000, help="ticks to simulate (default: 1000)")
+    parser.add_argument("--food", type=int, help="food items on the board (default: one per snake)")
+    parser.add_argument("--beans", type=int, help="maximum power beans (default: one per ten snakes)")
+    parser.add_argument("--algorithm", default="astar", choices=sorted(PATHFINDERS),
+                        help="pathfinding algorithm of the bots (default: astar)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    food = args.food if args.food is not None else args.snakes
+    beans = args.beans if args.beans is not None else max(1, args.snakes // 10)
+    arena = SnakeArena(width, height, seed=args.seed, food_count=food, max_beans=beans)
+    for _ in range(args.snakes):
+        arena.add_snake(BfsAutopilot(safe=False, algorithm=args.algorithm))
+
+    times = []
+    for _ in range(args.ticks):
+        start = time.perf_counter()
+        arena.step()
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    scores = sorted((snake.best_score for snake in arena.snakes), reverse=True)
+    print(f"{args.snakes} snakes on {width}x{height}, {args.ticks} ticks, algorithm {args.algorithm}")
+    print(f"tick ms: p50 {percentile(times, 50):.2f}  p99 {percentile(times, 99):.2f}  max {times[-1]:.2f}")
+    print(f"deaths {arena.deaths} (head-on {arena.head_ons}), alive {arena.alive}, "
+          f"top scores {scores[:5]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
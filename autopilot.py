@@ -0,0 +1,1179 @@
+'''
+自动模式寻路策略
+
+策略对象只读取 SnakeEngine 的状态并返回下一步方向，不修改引擎，
+因此同一套策略既可以驱动窗口中的游戏，也可以在无界面模拟里全速运行。
+'''
+import math
+import multiprocessing
+import sys
+from array import array
+from collections import deque
+from heapq import heappop, heappush
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, wait
+
+from snake_engine import SnakeEngine, UP, DOWN, LEFT, RIGHT
+
+
+def direction_between(from_pos, to_pos):
+    """返回从相邻格 from_pos 走到 to_pos 的方向"""
+    dx = to_pos[0] - from_pos[0]
+    dy = to_pos[1] - from_pos[1]
+    if dx == 1:
+        return RIGHT
+    elif dx == -1:
+        return LEFT
+    elif dy == 1:
+        return DOWN
+    elif dy == -1:
+        return UP
+    return None
+
+
+def movable_tail(engine):
+    """返回这一步会移走的蛇尾格子下标；蛇尾有重复节点（能量豆增长未完成）时返回 -1
+
+    相当于旧版 BFS 的 snake_set = set(snake[:-1])：排除蛇尾，但重复的尾节点仍是障碍。
+    """
+    tail_index = engine.snake.tail
+    return tail_index if engine.occupancy[tail_index] == 1 else -1
+
+
+def open_direction(engine, target=None):
+    """不搜索的 O(1) 走法：在相邻空格中优先选出口至少两个、离 target 更近、出口更多的，
+    都一样时保持方向；开阔的棋盘上这就是朝目标的一条最短路。没有相邻空格时返回 None
+    """
+    width = engine.grid_width
+    height = engine.grid_height
+    occupancy = engine.occupancy
+    head_x, head_y = engine.snake[0]
+    target_x, target_y = target if target else (head_x, head_y)
+    distance = abs(target_x - head_x) + abs(target_y - head_y)
+    best = None
+    best_key = None
+    for dx, dy in (engine.direction, UP, DOWN, LEFT, RIGHT):
+        x = head_x + dx
+        y = head_y + dy
+        if not (0 <= x < width and 0 <= y < height) or occupancy[y * width + x]:
+            continue
+        exits = 0
+        for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+            if 0 <= nx < width and 0 <= ny < height and not occupancy[ny * width + nx]:
+                exits += 1
+        key = (exits >= 2, abs(target_x - x) + abs(target_y - y) < distance, exits)
+        if best_key is None or key > best_key:
+            best = (dx, dy)
+            best_key = key
+    return best
+
+
+class GridPathfinder:
+    """扁平网格上的 BFS 寻路器
+
+    格子用整数下标 index = y * width + x 表示。邻居表、父指针数组、队列和访问标记
+    都在构造时按网格大小分配一次；访问标记使用代数（generation）计数，
+    每次搜索只需把代数加一即可“清空”，所以一次搜索是 O(格子数) 且不分配内存。
+    障碍直接读取引擎的占用网格（SnakeEngine.occupancy），不需要另建蛇身集合。
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        size = width * height
+        self.size = size
+
+        # 预计算邻居表，顺序为 右、左、下、上（与旧版 BFS 一致，保证路径相同）
+        cells = list(range(size))  # 共享整数对象，减少大网格上的内存占用
+        neighbors = []
+        for y in range(height):
+            row = y * width
+            for x in range(width):
+                index = row + x
+                adjacent = []
+                if x + 1 < width:
+                    adjacent.append(cells[index + 1])
+                if x > 0:
+                    adjacent.append(cells[index - 1])
+                if y + 1 < height:
+                    adjacent.append(cells[index + width])
+                if y > 0:
+                    adjacent.append(cells[index - width])
+                neighbors.append(tuple(adjacent))
+        self.neighbors = neighbors
+
+        self.parent = [-1] * size  # find_path 的父指针；distances_from 借用来存距离
+        self.queue = [0] * size  # 每个格子最多入队一次，定长数组即可
+        self.visited = [0] * size  # 值等于当前代数表示本次已访问
+        self.generation = 0
+        self.nodes_expanded = 0  # 最近一次搜索出队的节点数
+
+    def index(self, pos):
+        return pos[1] * self.width + pos[0]
+
+    def position(self, index):
+        return (index % self.width, index // self.width)
+
+    def find_path(self, start, target, occupancy, passable=-1):
+        """返回从 start 到 target 的最短路径（不含 start，元素为坐标）；不可达返回 []
+
+        occupancy 中非零的格子是障碍；passable 是虽被占用但允许通过的格子下标（通常是蛇尾）。
+        """
+        self.generation += 1
+        generation = self.generation
+        width = self.width
+
+        start_index = start[1] * width + start[0]
+        target_index = target[1] * width + target[0]
+        if start_index == target_index:
+            self.nodes_expanded = 0
+            return []
+
+        neighbors = self.neighbors
+        parent = self.parent
+        visited = self.visited
+        queue = self.queue
+        visited[start_index] = generation
+        queue[0] = start_index
+        head = 0
+        tail = 1
+
+        while head < tail:
+            current = queue[head]
+            head += 1
+            for nxt in neighbors[current]:
+                if visited[nxt] != generation and (not occupancy[nxt] or nxt == passable):
+                    visited[nxt] = generation
+                    parent[nxt] = current
+                    if nxt == target_index:
+                        self.nodes_expanded = head
+                        return self._trace(start_index, target_index)
+                    queue[tail] = nxt
+                    tail += 1
+
+        self.nodes_expanded = head
+        return []
+
+    def search(self, start, targets, occupancy, passable=-1):
+        """寻路策略接口：targets 按优先级排列，返回到选中目标的路径（不含 start）；不可达返回 []
+
+        BFS 和 A* 是单目标的，只找第一个目标；DistanceFieldPathfinder 一次搜索比较所有目标。
+        """
+        return self.find_path(start, targets[0], occupancy, passable)
+
+    def tail_reachable(self, body):
+        """虚拟蛇身 body（SnakeBody）的蛇头能否走到蛇尾
+
+        蛇身格子先用一个代数标成障碍，然后从蛇头和蛇尾旁的空格同时泛洪，两边轮流各展开一个格子：
+        两边相遇即可提前返回（至少两步才到蛇尾，那时蛇尾已经离开）；任一边先泛洪完说明不连通。
+        走不到时只会填满较小的那一块，而不是蛇头所在的整片空格。
+        两边的队列共用 queue：蛇头一侧从前往后放，蛇尾一侧从后往前放，每个格子最多入队一次。
+        """
+        self.generation += 3
+        body_generation = self.generation - 2
+        head_generation = self.generation - 1
+        tail_generation = self.generation
+        visited = self.visited
+        for view in body.views():
+            for index in view:
+                visited[index] = body_generation
+
+        head = body.head
+        tail = body.tail
+        if head == tail:
+            return True
+        neighbors = self.neighbors
+        queue = self.queue
+        queue[0] = head
+        head_pos = 0
+        head_end = 1
+        tail_pos = tail_end = len(queue)
+        for nxt in neighbors[tail]:
+            if visited[nxt] < body_generation:
+                visited[nxt] = tail_generation
+                tail_end -= 1
+                queue[tail_end] = nxt
+        while head_pos < head_end and tail_end < tail_pos:
+            current = queue[head_pos]
+            head_pos += 1
+            for nxt in neighbors[current]:
+                mark = visited[nxt]
+                if mark == tail_generation:
+                    self.nodes_expanded = head_pos + len(queue) - tail_pos
+                    return True
+                if mark < body_generation:
+                    visited[nxt] = head_generation
+                    queue[head_end] = nxt
+                    head_end += 1
+            tail_pos -= 1
+            current = queue[tail_pos]
+            for nxt in neighbors[current]:
+                mark = visited[nxt]
+                if mark == head_generation:
+                    self.nodes_expanded = head_pos + len(queue) - tail_pos
+                    return True
+                if mark < body_generation:
+                    visited[nxt] = tail_generation
+                    tail_end -= 1
+                    queue[tail_end] = nxt
+        self.nodes_expanded = head_pos + len(queue) - tail_pos
+        return False
+
+    def distances_from(self, start_index, occupancy, targets=()):
+        """从 start_index（可以是被占用的格子，例如蛇尾）出发在空格中做 BFS
+
+        返回本次的代数：visited[i] 等于它的格子可达，距离是 parent[i]。
+        给出 targets 时，它们都被访问到就提前结束。
+        """
+        self.generation += 1
+        generation = self.generation
+        neighbors = self.neighbors
+        distance = self.parent
+        visited = self.visited
+        queue = self.queue
+        visited[start_index] = generation
+        distance[start_index] = 0
+        queue[0] = start_index
+        remaining = len(targets)
+        head = 0
+        tail = 1
+        while head < tail:
+            current = queue[head]
+            head += 1
+            step = distance[current] + 1
+            for nxt in neighbors[current]:
+                if visited[nxt] != generation and not occupancy[nxt]:
+                    visited[nxt] = generation
+                    distance[nxt] = step
+                    queue[tail] = nxt
+                    tail += 1
+                    if nxt in targets:
+                        remaining -= 1
+                        if not remaining:
+                            self.nodes_expanded = head
+                            return generation
+        self.nodes_expanded = head
+        return generation
+
+    def reachable_area(self, start_index, occupancy):
+        """从空格 start_index 出发能到达的空格数（含自身）"""
+        self.distances_from(start_index, occupancy)
+        return self.nodes_expanded
+
+    def _trace(self, start_index, target_index):
+        """沿父指针从目标回溯到起点，生成路径"""
+        parent = self.parent
+        width = self.width
+        path = []
+        index = target_index
+        while index != start_index:
+            path.append((index % width, index // width))
+            index = parent[index]
+        path.reverse()
+        return path
+
+
+class AStarPathfinder(GridPathfinder):
+    """A* 寻路：曼哈顿距离作启发函数
+
+    f 相同时先展开离目标更近（h 更小）的格子，再优先偏离起点到目标连线更少的格子。
+    这样搜索沿着连线推进，展开的节点很少：目标就在附近时只展开寥寥几个格子，
+    而 BFS 要向四周铺开整个菱形。代价是路径贴着连线走成阶梯状，拐弯反而比 BFS 多
+    （空棋盘上从 (0, 0) 到 (6, 3)：A* 拐 6 次，BFS 拐 1 次）。
+    """
+
+    def __init__(self, width, height):
+        super().__init__(width, height)
+        self.cost = [0] * self.size  # 起点到各格子的步数 g
+        self.node_limit = self.size  # 展开这么多格子仍未到达目标就放弃（竞技场用来限制单次搜索）
+
+    def find_path(self, start, target, occupancy, passable=-1):
+        # 两个代数：入堆（代价已知）和已展开
+        self.generation += 2
+        open_generation = self.generation - 1
+        closed_generation = self.generation
+        width = self.width
+
+        start_x, start_y = start
+        target_x, target_y = target
+        start_index = start_y * width + start_x
+        target_index = target_y * width + target_x
+        if start_index == target_index:
+            self.nodes_expanded = 0
+            return []
+        line_x = target_x - start_x
+        line_y = target_y - start_y
+
+        neighbors = self.neighbors
+        parent = self.parent
+        visited = self.visited
+        cost = self.cost
+        visited[start_index] = open_generation
+        cost[start_index] = 0
+        heap = [(abs(line_x) + abs(line_y), 0, 0, start_index)]  # (f, h, 偏离连线的程度, 下标)
+        expanded = 0
+        node_limit = self.node_limit
+
+        while heap and expanded < node_limit:
+            current = heappop(heap)[3]
+            if visited[current] == closed_generation:
+                continue  # 同一格子较差的旧条目
+            visited[current] = closed_generation
+            expanded += 1
+            if current == target_index:
+                self.nodes_expanded = expanded
+                return self._trace(start_index, target_index)
+            step = cost[current] + 1
+            for nxt in neighbors[current]:
+                mark = visited[nxt]
+                if (mark == closed_generation or (occupancy[nxt] and nxt != passable)
+                        or (mark == open_generation and cost[nxt] <= step)):
+                    continue
+                visited[nxt] = open_generation
+                cost[nxt] = step
+                parent[nxt] = current
+                x = nxt % width
+                y = nxt // width
+                h = abs(target_x - x) + abs(target_y - y)
+                cross = abs((x - start_x) * line_y - (y - start_y) * line_x)
+                heappush(heap, (step + h, h, cross, nxt))
+
+        self.nodes_expanded = expanded
+        return []
+
+
+class DistanceFieldPathfinder(GridPathfinder):
+    """多目标距离场：从所有目标同时反向 BFS，一次搜索就比较出哪个目标最近
+
+    每个访问到的格子的 parent 指向离它最近的目标的下一步，搜索扩展到蛇头旁边为止，
+    再沿 parent 走到目标就是路径。距离相同时排在前面的目标（能量豆）先入队、胜出。
+    与单目标策略不同，能量豆更远或不可达时它直接去吃食物。
+    """
+
+    def find_path(self, start, target, occupancy, passable=-1):
+        return self.search(start, (target,), occupancy, passable)
+
+    def search(self, start, targets, occupancy, passable=-1):
+        self.generation += 1
+        generation = self.generation
+        width = self.width
+        start_index = start[1] * width + start[0]
+
+        parent = self.parent
+        visited = self.visited
+        queue = self.queue
+        tail = 0
+        for x, y in targets:
+            index = y * width + x
+            if index == start_index:
+                self.nodes_expanded = 0
+                return []
+            if visited[index] != generation:
+                visited[index] = generation
+                parent[index] = -1
+                queue[tail] = index
+                tail += 1
+
+        neighbors = self.neighbors
+        head = 0
+        while head < tail:
+            current = queue[head]
+            head += 1
+            for nxt in neighbors[current]:
+                if nxt == start_index:
+                    # 按 BFS 顺序，第一个挨着蛇头的格子离目标最近
+                    self.nodes_expanded = head
+                    return self._descend(current)
+                if visited[nxt] != generation and (not occupancy[nxt] or nxt == passable):
+                    visited[nxt] = generation
+                    parent[nxt] = current
+                    queue[tail] = nxt
+                    tail += 1
+
+        self.nodes_expanded = head
+        return []
+
+    def _descend(self, index):
+        """沿 parent 从蛇头的邻居走到目标"""
+        parent = self.parent
+        width = self.width
+        path = []
+        while index >= 0:
+            path.append((index % width, index // width))
+            index = parent[index]
+        return path
+
+
+# 可在运行时切换的寻路算法：名字 -> GridPathfinder 子类（按网格大小构造）
+PATHFINDERS = {
+    "bfs": GridPathfinder,
+    "astar": AStarPathfinder,
+    "field": DistanceFieldPathfinder,
+}
+
+
+def targets_of(engine):
+    """按优先级排列的目标：能量豆在前，其次食物"""
+    bean = engine.power_bean_pos
+    food = engine.food_pos
+    if bean:
+        return (bean, food) if food else (bean,)
+    return (food,) if food else ()
+
+
+class CachedPath:
+    """可消耗的缓存路径：格子下标数组 + 当前位置
+
+    cells[position] 是蛇头的下一格，蛇头走上去后 position 加一，消耗一个节点是 O(1) 的
+    （旧版 list.pop(0) 是 O(路径长度)）。每个节拍 next_cell() 只检查下一格是否仍与蛇头相邻
+    且为空格，也是 O(1)。路径前方的格子不会被这条蛇自己挡住（蛇身只跟在蛇头后面），
+    所以检查失败只发生在蛇头被别的逻辑带离路径、或局面被外部改动时，
+    这时 repair() 只重新接上断开的地方，保留后面仍然有效的部分。
+    """
+
+    REPAIR_NODES = 500  # repair() 的小 BFS 最多访问的格子数
+
+    def __init__(self):
+        self.width = 0
+        self.start = -1  # 路径起点（规划时的蛇头）的下标
+        self.cells = []
+        self.position = 0
+
+    def __bool__(self):
+        return self.position < len(self.cells)
+
+    def set(self, width, start, path):
+        """缓存从 start 出发的新路径（坐标序列，不含 start）"""
+        self.width = width
+        self.start = start[1] * width + start[0]
+        self.cells = [y * width + x for x, y in path]
+        self.position = 0
+
+    def clear(self):
+        self.cells = []
+        self.position = 0
+
+    @property
+    def target(self):
+        """路径终点的坐标；没有路径时为 None"""
+        if not self.cells:
+            return None
+        index = self.cells[-1]
+        return (index % self.width, index // self.width)
+
+    def remaining(self):
+        """还没走的部分（坐标列表）"""
+        width = self.width
+        return [(index % width, index // width) for index in self.cells[self.position:]]
+
+    def next_cell(self, engine):
+        """消耗蛇头已走上的节点，返回下一格的下标；蛇头不在路径上或下一格被占用时返回 -1"""
+        cells = self.cells
+        position = self.position
+        head_index = engine.snake.head
+        if position < len(cells) and cells[position] == head_index:
+            self.position = position = position + 1
+        elif (cells[position - 1] if position else self.start) != head_index:
+            return -1  # 蛇头被带离了路径
+        if position >= len(cells) or engine.occupancy[cells[position]]:
+            return -1
+        return cells[position]
+
+    def repair(self, engine):
+        """从蛇头做一次最多 REPAIR_NODES 个格子的小 BFS，接到剩余路径上最近的一点
+
+        接上后把接入点之后的原路径保留下来；这段路径上新被占用的格子会让修复失败。
+        返回是否修复成功。
+        """
+        width = engine.grid_width
+        height = engine.grid_height
+        occupancy = engine.occupancy
+        cells = self.cells
+        slots = {index: k for k, index in enumerate(cells) if k >= self.position}
+
+        head_x, head_y = engine.snake[0]
+        head_index = head_y * width + head_x
+        parent = {head_index: -1}
+        queue = deque([head_index])
+        join = -1
+        while queue and len(parent) <= self.REPAIR_NODES:
+            current = queue.popleft()
+            if current in slots:
+                join = current
+                break
+            x = current % width
+            y = current // width
+            for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+                if 0 <= nx < width and 0 <= ny < height:
+                    nxt = ny * width + nx
+                    if nxt not in parent and not occupancy[nxt]:
+                        parent[nxt] = current
+                        queue.append(nxt)
+        if join < 0:
+            return False
+
+        rest = cells[slots[join] + 1:]
+        for index in rest:
+            if occupancy[index]:
+                return False
+        route = []
+        index = join
+        while index != head_index:
+            route.append(index)
+            index = parent[index]
+        route.reverse()
+        route.extend(rest)
+        self.start = head_index
+        self.cells = route
+        self.position = 0
+        return bool(route)
+
+
+class BfsAutopilot:
+    """使用BFS寻路算法自动找到最短路径到食物或能量豆（优先能量豆）
+
+    current_path（CachedPath）缓存从蛇头到目标的路径（不包括头部），蛇每走一步消耗一个节点，
+    每个节拍 O(1) 地检查下一步。只在路径终点不再是首选目标（例如新出现了能量豆）或路径用完时
+    重新寻路；首选目标没变、只是另一个目标移动了（去吃能量豆的路上吃到了食物）时路径照用；
+    下一步走不通时先用 CachedPath.repair() 修复断开的部分。
+    寻路算法由 algorithm 从 PATHFINDERS 中选择，可以用 set_algorithm() 在运行时切换。
+
+    safe 为 True 时，新路径先经过安全检查才会缓存：让虚拟的蛇沿路径走完（吃到食物/能量豆
+    时照常增长），再用一次泛洪确认蛇头还能走到新的蛇尾。不安全或没有路径时改走
+    survival_direction()：沿最远的路绕向蛇尾，连蛇尾都到不了时走可达空格最多的一步。
+    棋盘快满时绕尾巴可能永远等不到安全的路径，连续求生超过格子数步后就冒险走向目标。
+    """
+
+    def __init__(self, safe=True, algorithm="bfs"):
+        self.safe = safe
+        self.algorithm = algorithm  # PATHFINDERS 中的名字
+        self.current_path = CachedPath()  # 当前路径缓存
+        self.target = None  # 上一次看到的 targets_of 结果
+        self.pathfinder = None  # 按网格大小和算法惰性创建的寻路器
+        self.searches = 0  # 累计 BFS 寻路次数（性能分析用）
+        self.repairs = 0  # 累计修复（而不是重算）路径的次数
+        self.fallbacks = 0  # 累计放弃目标、改走求生路线的次数
+        self.fallback_streak = 0  # 连续求生的步数
+
+    def reset(self):
+        self.current_path.clear()
+        self.target = None
+        self.fallback_streak = 0
+
+    def set_algorithm(self, algorithm):
+        """切换寻路算法（PATHFINDERS 中的名字），丢弃缓存的路径"""
+        self.algorithm = algorithm
+        self.pathfinder = None
+        self.reset()
+
+    def next_direction(self, engine):
+        """返回下一步方向；找不到路径又不做安全检查时返回 None（保持当前方向）"""
+        targets = targets_of(engine)
+        if not targets or engine.game_over:
+            return None
+
+        current_path = self.current_path
+        # 目标改变：路径终点不再是首选目标时（食物被吃掉重新生成、新出现了能量豆等）作废
+        if targets != self.target:
+            self.target = targets
+            if current_path.target != targets[0]:
+                current_path.clear()
+
+        head = engine.snake[0]
+        if current_path:
+            index = current_path.next_cell(engine)
+            if index < 0 and current_path and current_path.repair(engine):
+                if not self.safe or self.path_is_safe(engine, current_path.remaining()):
+                    self.repairs += 1
+                    index = current_path.next_cell(engine)
+            if index >= 0:
+                return direction_between(head, (index % engine.grid_width, index // engine.grid_width))
+            current_path.clear()
+
+        # 重新计算路径（路径为空、已走完或修复失败时）
+        path = self.find_path(engine, head, targets)
+        if path and (not self.safe or self.path_is_safe(engine, path)
+                     or self.fallback_streak > len(engine.occupancy)):
+            current_path.set(engine.grid_width, head, path)
+            self.fallback_streak = 0
+            return direction_between(head, path[0])
+        if self.safe:
+            self.fallbacks += 1
+            self.fallback_streak += 1
+            return self.survival_direction(engine)
+        return None
+
+    def find_path(self, engine, head, targets):
+        """用当前算法搜索从 head 到目标的最短路径，返回不含头部的节点列表"""
+        self.searches += 1
+        pathfinder = self.pathfinder
+        if (pathfinder is None or pathfinder.width != engine.grid_width
+                or pathfinder.height != engine.grid_height):
+            self.pathfinder = pathfinder = PATHFINDERS[self.algorithm](engine.grid_width, engine.grid_height)
+        return pathfinder.search(head, targets, engine.occupancy, movable_tail(engine))
+
+    def path_is_safe(self, engine, path):
+        """模拟蛇沿 path 走完，检查蛇头之后还能走到蛇尾"""
+        width = engine.grid_width
+        first = path[0][1] * width + path[0][0]
+        if engine.occupancy[first]:
+            return False  # 第一步就踩蛇尾：蛇尾在这一步还没离开
+        food = engine.food_pos
+        food_index = food[1] * width + food[0] if food else -1
+        bean = engine.power_bean_pos
+        bean_index = bean[1] * width + bean[0] if bean else -1
+
+        body = engine.snake.copy()  # 整块复制格子下标数组
+        for x, y in path:
+            index = y * width + x
+            body.push_head(index)
+            if index == food_index:
+                food_index = -1  # 吃到食物：不删尾部
+            elif index == bean_index:
+                bean_index = -1  # 能量豆：不删尾部，并复制两个尾节点
+                body.push_tail(body.tail)
+                body.push_tail(body.tail)
+            else:
+                body.pop_tail()
+        return self.pathfinder.tail_reachable(body)
+
+    def survival_direction(self, engine):
+        """不追目标时的求生走法：能绕到蛇尾的邻居中离蛇尾最远的；都不行时选可达空格最多的"""
+        pathfinder = self.pathfinder
+        occupancy = engine.occupancy
+        width = engine.grid_width
+        head_x, head_y = engine.snake[0]
+        tail_x, tail_y = engine.snake[-1]
+        candidates = [index for index in pathfinder.neighbors[head_y * width + head_x]
+                      if not occupancy[index]]
+        if not candidates:
+            return None
+
+        generation = pathfinder.distances_from(tail_y * width + tail_x, occupancy, candidates)
+        visited = pathfinder.visited
+        distance = pathfinder.parent
+        best = -1
+        best_distance = -1
+        for index in candidates:
+            if visited[index] == generation and distance[index] > best_distance:
+                best = index
+                best_distance = distance[index]
+        if best < 0:
+            # 同一片空格里的邻居可达空格数相同，每片只泛洪一次
+            best_area = -1
+            for index in candidates:
+                if visited[index] == generation:
+                    continue
+                area = pathfinder.reachable_area(index, occupancy)
+                generation = pathfinder.generation
+                if area > best_area:
+                    best = index
+                    best_area = area
+        return direction_between((head_x, head_y), (best % width, best // width))
+
+
+def advance_body(body, heads, length, copies, engine=None):
+    """把蛇身 body 推进到新的状态：依次走上 heads 中的格子，从蛇尾删到 length - copies 节，
+    再复制 copies 个尾节点（能量豆留下的重复节点）
+
+    给出 engine 时 body 是 engine.snake，同时更新它的占用网格和空格子数组。
+    """
+    occupancy = engine.occupancy if engine is not None else None
+    for index in heads:
+        body.push_head(index)
+        if occupancy is not None:
+            if not occupancy[index]:
+                engine._claim(index)
+            occupancy[index] += 1
+    while len(body) > length - copies:
+        index = body.pop_tail()
+        if occupancy is not None:
+            occupancy[index] -= 1
+            if not occupancy[index]:
+                engine._release(index)
+    tail = body.tail
+    for _ in range(copies):
+        body.push_tail(tail)
+    if occupancy is not None:
+        occupancy[tail] += copies
+
+
+_engine = None  # 工作进程内的引擎副本，按 BackgroundAutopilot.sync_update() 的消息同步
+_engine_sync = -1  # 副本对应的同步编号
+_planners = {}  # 工作进程内按 (safe, 算法) 缓存的 BfsAutopilot，寻路器随网格大小复用
+
+
+def sync_worker(update):
+    """后台工作进程：把同步消息应用到进程内的引擎副本；副本不是消息的基准时返回 False
+
+    update 为 (同步编号, 快照, 新蛇头, 蛇长, 尾部重复节点数, 食物, 能量豆, 方向)。
+    快照不为 None 时由它重建副本（O(格子数)），否则只按增量推进蛇身（O(新蛇头数)）。
+    """
+    global _engine, _engine_sync
+
+    sync_id, data, heads, length, copies, food_pos, power_bean_pos, direction = update
+    if data is not None:
+        _engine = SnakeEngine.from_snapshot(data)
+        _engine_sync = sync_id
+    elif _engine is None or sync_id != _engine_sync:
+        return False
+    else:
+        advance_body(_engine.snake, heads, length, copies, _engine)
+    _engine.food_pos = food_pos
+    _engine.power_bean_pos = power_bean_pos
+    _engine.direction = direction
+    return True
+
+
+def plan_path(update, safe=True, algorithm="bfs", lead=0):
+    """后台工作进程：同步引擎副本（见 sync_worker()），规划从蛇头到目标的路径
+
+    lead 是预计搜索在飞的节拍数：主进程在这段时间里按 open_direction() 走，副本先用 step()
+    照样试走最多 lead 步（下一步会吃到目标时停下），从那里规划，再用 undo() 撤回。
+    返回从蛇头出发、不含蛇头的路径（试走的部分在前）；没有路径，或 safe 为 True 而路径不安全时
+    返回 []；副本没能同步时返回 None，主进程下次改发完整快照。
+    """
+    if not sync_worker(update):
+        return None
+    planner = _planners.get((safe, algorithm))
+    if planner is None:
+        planner = _planners[safe, algorithm] = BfsAutopilot(safe, algorithm)
+    engine = _engine
+    targets = targets_of(engine)
+    if not targets:
+        return []
+    path = []
+    engine.journal = []
+    try:
+        for _ in range(lead):
+            direction = open_direction(engine, targets[0])
+            if direction is None:
+                break
+            head_x, head_y = engine.snake[0]
+            pos = (head_x + direction[0], head_y + direction[1])
+            if pos in targets:
+                break
+            engine.step(direction)
+            path.append(pos)
+        rest = planner.find_path(engine, engine.snake[0], targets)
+        if not rest or (safe and not planner.path_is_safe(engine, rest)):
+            return []
+        path.extend(rest)
+        return path
+    finally:
+        while engine.journal:
+            engine.undo()
+        engine.journal = None
+
+
+class BackgroundAutopilot:
+    """在后台进程里寻路的自动模式，主循环每个节拍只做 O(1) 的工作
+
+    棋盘不超过 sync_cells 个格子时一次寻路不到一毫秒，直接交给内部的 BfsAutopilot，
+    行为与它完全相同。更大的棋盘上需要寻路时，把局面交给工作进程的 plan_path()，最多等
+    wait 秒；结果没到就先走 default_direction()（open_direction），之后每个节拍检查一次。
+    同一时间只有一个搜索在进行。
+
+    工作进程保留一份引擎副本：开局（warm_up()）和读档等无法推算的变化后发送一次完整快照，
+    之后每次寻路只发送自上次同步以来的新蛇头和蛇尾变化（sync_update()），
+    所以主循环和工作进程每次寻路的额外开销都与棋盘面积无关。
+
+    搜索在飞的这些节拍里蛇还在按 default_direction() 走，所以提交时按上次搜索的速度估计
+    这次要在飞多少个节拍（lead_length()），工作进程先在副本上照同样的规则试走这么多步，
+    从预计的蛇头位置规划，返回的路径包含试走的部分。
+    结果到达时目标已经变了（食物被吃掉重新生成等）就丢弃；蛇头已经离开规划时的位置，
+    就用 CachedPath.repair() 把路径接到当前蛇头上（蛇头还在试走的部分上时直接接上），
+    接不上也丢弃，路径用完后重新提交。
+    工作进程用 spawn 方式启动，会重新导入主模块，所以启动游戏的脚本需要 __main__ 保护。
+    """
+
+    def __init__(self, safe=True, algorithm="bfs", sync_cells=10000, wait=0.002):
+        self.safe = safe
+        self.sync_cells = sync_cells  # None 表示后台进程不可用，一律同步寻路
+        self.wait = wait
+        self.planner = BfsAutopilot(safe, algorithm)  # 小棋盘上的同步寻路
+        self.executor = None  # 惰性创建的单进程 ProcessPoolExecutor
+        self.pending = None  # 正在进行的搜索（Future）
+        self.pending_target = None
+        self.pending_head = None
+        self.pending_ticks = None  # 提交时的节拍数；None 表示这次搜索不计时（排在启动或完整快照后面）
+        self.warming = None  # warm_up() 提交的同步任务
+        self.pending_distance = 0  # 预计的规划起点到首选目标的曼哈顿距离
+        self.ticks_per_area = 0.0  # 搜索在飞的节拍数 / 距离²（BFS 展开的格子数与距离²成正比）
+        self.current_path = CachedPath()
+        self.target = None
+        self.shadow = None  # 工作进程引擎副本的蛇身（SnakeBody）；None 表示下次发送完整快照
+        self.shadow_ticks = 0  # 副本同步时的节拍数
+        self.shadow_size = None  # 副本的 (宽, 高)
+        self.sync_id = 0  # 完整快照的编号，增量消息以它为基准
+        self.submitted = 0  # 累计提交的后台搜索次数
+        self.used = 0  # 被采用（蛇头在路径上或接得上）的结果数
+        self.discarded = 0  # 因目标改变或接不上蛇头而丢弃的结果数
+        self.fallbacks = 0  # 后台判定没有安全路径的次数
+        self.fallback_streak = 0
+
+    @property
+    def searches(self):
+        """累计寻路次数（同步 BFS + 后台提交）"""
+        return self.planner.searches + self.submitted
+
+    @property
+    def algorithm(self):
+        return self.planner.algorithm
+
+    def reset(self):
+        self.planner.reset()
+        self.pending = None  # 正在跑的搜索不能中断，结果到了也不再理会
+        self.current_path.clear()
+        self.target = None
+        self.fallback_streak = 0
+
+    def set_algorithm(self, algorithm):
+        """切换寻路算法（同步和后台寻路都使用它）"""
+        self.planner.set_algorithm(algorithm)
+        self.reset()
+
+    def warm_up(self, engine):
+        """大棋盘上提前启动工作进程，并把当前局面同步过去
+
+        ProcessPoolExecutor 要等到第一次 submit 才启动进程，这里提交的同步任务让进程在开局时
+        就启动、导入模块并由快照建好引擎副本（大棋盘上一两百毫秒，在后台进行，这里不等它），
+        对局中的寻路只需发送增量。
+        """
+        if self.sync_cells is None or engine.grid_width * engine.grid_height <= self.sync_cells:
+            return
+        if self.executor is None:
+            # spawn：不 fork 整个游戏进程（大棋盘上 fork 也要上百毫秒），各平台行为也一致
+            self.executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            self.warming = self.executor.submit(sync_worker, self.sync_update(engine))
+        except BrokenExecutor:
+            self.disable()
+
+    def close(self):
+        """关闭工作进程"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        self.pending = None
+        self.shadow = None
+
+    def next_direction(self, engine):
+        """返回下一步方向；没有任何可走的空格时返回 None"""
+        if self.sync_cells is None or engine.grid_width * engine.grid_height <= self.sync_cells:
+            return self.planner.next_direction(engine)
+
+        targets = targets_of(engine)
+        if not targets or engine.game_over:
+            return None
+        current_path = self.current_path
+        if targets != self.target:
+            self.target = targets
+            if current_path.target != targets[0]:
+                current_path.clear()
+
+        self.collect(engine)
+        if self.sync_cells is None:
+            return self.planner.next_direction(engine)  # 工作进程坏了，改为同步寻路
+        index = current_path.next_cell(engine) if current_path else -1
+        if index < 0 and current_path and current_path.repair(engine):
+            index = current_path.next_cell(engine)
+        if index < 0 and self.pending is None:
+            current_path.clear()
+            if self.submit(engine):
+                self.collect(engine, self.wait)
+            if self.sync_cells is None:
+                return self.planner.next_direction(engine)
+            index = current_path.next_cell(engine) if current_path else -1
+        if index >= 0:
+            return direction_between(engine.snake[0], (index % engine.grid_width, index // engine.grid_width))
+        return self.default_direction(engine)
+
+    def submit(self, engine):
+        """把当前局面交给工作进程寻路；工作进程不可用时返回 False"""
+        if self.executor is None:
+            self.warm_up(engine)
+            if self.executor is None:
+                return False
+        safe = self.safe and self.fallback_streak <= len(engine.occupancy)
+        head_x, head_y = engine.snake[0]
+        target_x, target_y = self.target[0]
+        distance = abs(target_x - head_x) + abs(target_y - head_y)
+        lead = self.lead_length(distance)
+        update = self.sync_update(engine)
+        try:
+            self.pending = self.executor.submit(plan_path, update, safe, self.planner.algorithm, lead)
+        except BrokenExecutor:
+            self.disable()
+            return False
+        self.pending_target = self.target
+        self.pending_head = engine.snake[0]
+        timed = update[1] is None and (self.warming is None or self.warming.done())
+        self.pending_ticks = engine.ticks if timed else None
+        self.pending_distance = distance - lead
+        self.submitted += 1
+        return True
+
+    def lead_length(self, distance):
+        """预计搜索在飞的节拍数 L：蛇头离目标 distance 格，先走 L 格后剩下的搜索按上次的速度
+        要在飞 ticks_per_area * (distance - L)² 个节拍，取两者相等的 L"""
+        rate = self.ticks_per_area
+        if not rate:
+            return 0
+        remaining = (math.sqrt(1 + 4 * rate * distance) - 1) / (2 * rate)
+        return max(0, distance - 1 - int(remaining))
+
+    def sync_update(self, engine):
+        """工作进程引擎副本的同步消息（格式见 sync_worker()）
+
+        蛇身能由副本推算出来时（上次同步以来只是走了几步、吃了食物或能量豆）只发新蛇头、
+        蛇长和尾部重复节点数：在本地的副本蛇身 shadow 上同样推进一遍，与当前蛇身比较确认。
+        新的一局、读档、换棋盘大小等推算不出来时发送完整快照。
+        """
+        snake = engine.snake
+        shadow = self.shadow
+        moves = engine.ticks - self.shadow_ticks
+        length = len(snake)
+        tail = snake.tail
+        copies = 0  # 能量豆带来的重复节点都在尾部
+        while copies + 1 < length and snake.index_at(-2 - copies) == tail:
+            copies += 1
+        self.shadow_ticks = engine.ticks
+        if (shadow is not None and self.shadow_size == (engine.grid_width, engine.grid_height)
+                and moves >= 0):
+            # 走过的步数超过蛇长时，整条蛇都是新蛇头，只需发最后 length 个
+            heads = array("I", [snake.index_at(i) for i in range(min(moves, length) - 1, -1, -1)])
+            advance_body(shadow, heads, length, copies)
+            if shadow == snake:
+                return (self.sync_id, None, heads, length, copies,
+                        engine.food_pos, engine.power_bean_pos, engine.direction)
+        self.shadow = snake.copy()
+        self.shadow_size = (engine.grid_width, engine.grid_height)
+        self.sync_id += 1
+        return (self.sync_id, engine.snapshot(include_rng=False), (), length, copies,
+                engine.food_pos, engine.power_bean_pos, engine.direction)
+
+    def collect(self, engine, timeout=0):
+        """取回已完成的搜索结果；结果过期时丢弃"""
+        future = self.pending
+        if future is None:
+            return
+        if timeout:
+            wait((future,), timeout)
+        if not future.done():
+            return
+        self.pending = None
+        try:
+            path = future.result()
+        except BrokenExecutor:
+            self.disable()
+            return
+        if self.pending_ticks is not None:
+            rate = (engine.ticks - self.pending_ticks) / max(1, self.pending_distance) ** 2
+            self.ticks_per_area = (self.ticks_per_area + rate) / 2 if self.ticks_per_area else rate
+        if path is None:
+            self.shadow = None  # 工作进程的副本没能同步，下次发送完整快照
+            self.discarded += 1
+            return
+        if not path:
+            if self.pending_target == self.target:
+                self.fallbacks += 1
+                self.fallback_streak += 1
+            return
+        current_path = self.current_path
+        current_path.set(engine.grid_width, self.pending_head, path)
+        # 目标已经变了（食物被吃掉等），或蛇头离开规划时的位置后接不回路径上：丢弃
+        if current_path.target != self.target[0] or (
+                engine.snake[0] != self.pending_head and not current_path.repair(engine)):
+            current_path.clear()
+            self.discarded += 1
+            return
+        self.used += 1
+        self.fallback_streak = 0
+
+    def disable(self):
+        """工作进程没能启动或中途退出（例如主模块缺少 __main__ 保护）：此后一律同步寻路"""
+        print("Background pathfinding failed; searching in the game loop instead", file=sys.stderr)
+        self.close()
+        self.sync_cells = None
+
+    def default_direction(self, engine):
+        """等结果时的 O(1) 走法，见 open_direction()"""
+        return open_direction(engine, self.target[0])
+
+
+def build_hamiltonian_cycle(width, height):
+    """为 width x height 网格构造哈密顿回路，返回按回路顺序排列的格子下标；无解时返回 None
+
+    高度为偶数时：第0行从左走到右，其余行在第1列到最后一列之间蛇形往返，
+    最后沿第0列回到起点。高度为奇数、宽度为偶数时转置构造。两边都为奇数时无解。
+    """
+    if width < 2 or height < 2 or (width % 2 and height % 2):
+        return None
+    transpose = height % 2 == 1
+    w, h = (height, width) if transpose else (width, height)
+
+    coords = [(x, 0) for x in range(w)]
+    for y in range(1, h):
+        xs = range(w - 1, 0, -1) if y % 2 else range(1, w)
+        coords.extend((x, y) for x in xs)
+    coords.extend((0, y) for y in range(h - 1, 0, -1))
+
+    if transpose:
+        return [x * width + y for x, y in coords]
+    return [y * width + x for x, y in coords]
+
+
+class HamiltonianAutopilot:
+    """哈密顿回路自动寻路：沿预计算的回路前进，安全时抄近路
+
+    只要蛇身按回路顺序排列（从蛇尾到蛇头序号递增），蛇头沿回路向前直到蛇尾之间的格子就全是空格。
+    因此每一步只需比较蛇头四个邻居的回路序号：落在这段空格里、又不越过目标的邻居可以直接走，
+    抄近路后仍保持蛇身有序。决策是 O(1) 的，不做任何搜索，回路在第一次使用时按网格大小计算一次。
+
+    抄近路后蛇头到蛇尾之间至少保留 SAFETY_GAP 个空格（再加上尚未消化的增长），
+    给吃食物/能量豆带来的增长留出余量；蛇身占满一半棋盘后只沿回路走，保证能填满棋盘。
+    蛇身不在回路顺序上（例如中途从手动切换过来）时，先沿回路或用 BFS 行走直到重新对齐。
+    两边都是奇数的网格没有哈密顿回路，此时完全退回 BFS。
+    """
+
+    SAFETY_GAP = 4  # 能量豆一次增长3节，再留1格
+    SHORTCUT_MAX_FILL = 0.5  # 蛇身超过棋盘这一比例后不再抄近路
+
+    def __init__(self):
+        self.fallback = BfsAutopilot()
+        self.width = None
+        self.height = None
+        self.cycle = None  # 回路上第 k 个格子的下标
+        self.order = None  # 格子下标 -> 回路序号
+        self.aligned = False  # 蛇身是否按回路顺序排列
+        self.last_head = None
+        self.expected_head = None  # 上一次决策选择的下一格
+
+    @property
+    def searches(self):
+        """累计 BFS 寻路次数（只有退回 BFS 时才会寻路）"""
+        return self.fallback.searches
+
+    def reset(self):
+        self.fallback.reset()
+        self.aligned = False
+        self.last_head = None
+        self.expected_head = None
+
+    def prepare(self, engine):
+        """按引擎网格大小构造回路；让回路方向与蛇当前的朝向一致"""
+        width = engine.grid_width
+        height = engine.grid_height
+        self.width = width
+        self.height = height
+        self.aligned = False
+        cycle = build_hamiltonian_cycle(width, height)
+        if cycle is None:
+            self.cycle = self.order = None
+            return
+
+        order = [0] * len(cycle)
+        for k, index in enumerate(cycle):
+            order[index] = k
+        # 蛇身若逆着回路方向排列，就把回路反过来
+        snake = engine.snake
+        if len(snake) > 1:
+            head_index = snake[0][1] * width + snake[0][0]
+            neck_index = snake[1][1] * width + snake[1][0]
+            if (order[neck_index] - order[head_index]) % len(cycle) == 1:
+                cycle.reverse()
+                for k, index in enumerate(cycle):
+                    order[index] = k
+        self.cycle = cycle
+        self.order = order
+
+    def next_direction(self, engine):
+        """返回下一步方向；回路不可用时交给 BFS"""
+        if engine.game_over:
+            return None
+        if engine.grid_width != self.width or engine.grid_height != self.height:
+            self.prepare(engine)
+        if self.cycle is None:
+            return self.fallback.next_direction(engine)
+
+        snake = engine.snake
+        head = snake[0]
+        # 蛇头不是按上次的决策移动的（例如刚从手动模式切换过来），需要重新确认蛇身是否有序
+        if head != self.last_head and head != self.expected_head:
+            self.aligned = False
+        if not self.aligned:
+            self.aligned = self.is_aligned(snake)
+
+        width = self.width
+        cycle = self.cycle
+        order = self.order
+        size = len(cycle)
+        head_order = order[head[1] * width + head[0]]
+        next_index = cycle[(head_order + 1) % size]
+        next_pos = (next_index % width, next_index // width)
+
+        if not self.aligned:
+            # 没对齐时沿回路走；回路下一格被蛇身挡住就改用 BFS
+            next_blocked = engine.occupancy[next_index] and next_index != movable_tail(engine)
+            if next_blocked:
+                direction = self.fallback.next_direction(engine)
+                self.last_head = head
+                self.expected_head = None
+                return direction
+        else:
+            next_pos = self.shortcut(engine, head, head_order, next_pos)
+
+        self.last_head = head
+        self.expected_head = next_pos
+        return direction_between(head, next_pos)
+
+    def shortcut(self, engine, head, head_order, next_pos):
+        """在安全的前提下选择回路上最远、且不越过目标的邻居"""
+        snake = engine.snake
+        size = len(self.cycle)
+        if len(snake) >= size * self.SHORTCUT_MAX_FILL:
+            return next_pos
+
+        target = engine.power_bean_pos if engine.power_bean_pos else engine.food_pos
+        if not target:
+            return next_pos
+
+        width = self.width
+        order = self.order
+        tail = snake[-1]
+        tail_distance = (order[tail[1] * width + tail[0]] - head_order) % size
+        target_distance = (order[target[1] * width + target[0]] - head_order) % size
+        # 尾部重复的节点表示还没消化完的能量豆增长，蛇尾会原地停留相应的步数
+        pending = 0
+        if len(snake) > 2 and snake[-2] == tail:
+            pending = 2 if snake[-3] == tail else 1
+        limit = min(target_distance, tail_distance - 1 - self.SAFETY_GAP - pending)
+
+        best = next_pos
+        best_distance = 1
+        x, y = head
+        for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+            if 0 <= nx < width and 0 <= ny < self.height:
+                distance = (order[ny * width + nx] - head_order) % size
+                if best_distance < distance <= limit:
+                    best = (nx, ny)
+                    best_distance = distance
+        return best
+
+    def is_aligned(self, snake):
+        """检查蛇身是否从蛇尾到蛇头按回路顺序排列（O(蛇长)，只在未对齐时调用）"""
+        width = self.width
+        order = self.order
+        size = len(self.cycle)
+        head = snake[0]
+        tail = snake[-1]
+        span = (order[head[1] * width + head[0]] - order[tail[1] * width + tail[0]]) % size
+        total = 0
+        previous = order[tail[1] * width + tail[0]]
+        for x, y in reversed(snake):
+            current = order[y * width + x]
+            total += (current - previous) % size
+            if total > span:
+                return False
+            previous = current
+        return total == span
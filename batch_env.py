@@ -0,0 +1,227 @@
+'''
+NumPy 向量化的批量贪吃蛇环境
+
+一次 step(actions) 同时推进 N 局游戏，规则与 SnakeEngine.step / generate_food 相同：
+撞墙或撞到蛇身（含蛇尾）结束；食物 +10 分、长 1 节；能量豆 +50 分、长 3 节
+（在尾部复制 2 个节点）；非无限模式下蛇长达到 WIN_LENGTH 后的下一步胜利；
+没有空格子放食物时棋盘已满，同样算胜利。结束的对局在同一次 step 中自动重置。
+
+每局的状态都是按局数堆叠的数组：
+    occupancy  (N, 格子数)   每个格子上的蛇身节点数
+    body       (N, 容量)     环形缓冲区，保存从蛇尾到蛇头的格子下标
+    head_ptr / tail_ptr (N,) 蛇头、蛇尾在环形缓冲区中的位置
+    food / bean (N,)         食物、能量豆的格子下标（-1 表示没有）
+    score / done / won (N,)
+
+动作是方向编号（与 snake_engine.DIRECTIONS 顺序一致：上、下、左、右），-1 表示保持方向。
+随机数使用 numpy 的 Generator，因此与 SnakeEngine 规则相同但随机序列不同。
+'''
+import numpy as np
+
+from snake_engine import (
+    DIRECTIONS, WIN_LENGTH, FOOD_SCORE, POWER_BEAN_SCORE, POWER_BEAN_SPAWN_CHANCE,
+)
+
+# 方向编号 -> (dx, dy)，以及每个方向的反方向编号
+DIRECTION_DX = np.array([d[0] for d in DIRECTIONS], dtype=np.int64)
+DIRECTION_DY = np.array([d[1] for d in DIRECTIONS], dtype=np.int64)
+OPPOSITE_INDEX = np.array([DIRECTIONS.index((-dx, -dy)) for dx, dy in DIRECTIONS], dtype=np.int64)
+RIGHT_INDEX = DIRECTIONS.index((1, 0))
+
+REJECTION_ROUNDS = 8  # 随机放置食物的向量化重试轮数，之后对剩下的局逐个精确抽样
+
+
+class BatchSnakeEnv:
+    """同时运行 num_envs 局贪吃蛇的向量化环境"""
+
+    def __init__(self, num_envs, grid_width=40, grid_height=30, seed=None, infinite_mode=False):
+        self.num_envs = num_envs
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.cells = grid_width * grid_height
+        self.infinite_mode = infinite_mode
+        self.power_bean_spawn_chance = POWER_BEAN_SPAWN_CHANCE
+        self.rng = np.random.default_rng(seed)
+
+        n = num_envs
+        # 环形缓冲区容量：非无限模式下蛇长最多 WIN_LENGTH - 1 + 3；
+        # 无限模式下每个能量豆之前至少吃过一个食物，重复尾节点不超过格子数 + 2
+        if infinite_mode:
+            self.capacity = 2 * self.cells + 3
+        else:
+            self.capacity = min(2 * self.cells + 3, WIN_LENGTH + 3)
+        self.occupancy = np.zeros((n, self.cells), dtype=np.int32)
+        self.body = np.zeros((n, self.capacity), dtype=np.int64)
+        self.head_ptr = np.zeros(n, dtype=np.int64)
+        self.tail_ptr = np.zeros(n, dtype=np.int64)
+        self.direction = np.full(n, RIGHT_INDEX, dtype=np.int64)
+        self.food = np.full(n, -1, dtype=np.int64)
+        self.bean = np.full(n, -1, dtype=np.int64)
+        self.score = np.zeros(n, dtype=np.int64)
+        self.ticks = np.zeros(n, dtype=np.int64)
+        self.done = np.zeros(n, dtype=bool)
+        self.won = np.zeros(n, dtype=bool)
+
+        # 最近一次结束的对局结果（自动重置前记录）
+        self.final_score = np.zeros(n, dtype=np.int64)
+        self.final_length = np.zeros(n, dtype=np.int64)
+        self.final_ticks = np.zeros(n, dtype=np.int64)
+        self.final_won = np.zeros(n, dtype=bool)
+        self.games_finished = 0
+
+        self._rows = np.arange(n)
+        self.reset()
+
+    @property
+    def length(self):
+        """每局蛇的长度（含能量豆的重复尾节点）"""
+        return (self.head_ptr - self.tail_ptr) % self.capacity + 1
+
+    def heads(self):
+        """每局蛇头的格子下标"""
+        return self.body[self._rows, self.head_ptr]
+
+    def reset(self, envs=None):
+        """重置指定的局（布尔掩码或下标数组），默认全部"""
+        if envs is None:
+            envs = self._rows
+        else:
+            envs = np.asarray(envs)
+            if envs.dtype == bool:
+                envs = np.flatnonzero(envs)
+        if not len(envs):
+            return
+
+        # 初始化蛇：头部在中间，加上3节身体，向右
+        center = (self.grid_height // 2) * self.grid_width + self.grid_width // 2
+        self.occupancy[envs] = 0
+        self.body[envs, :4] = [center - 3, center - 2, center - 1, center]
+        self.occupancy[envs[:, None], self.body[envs, :4]] = 1
+        self.tail_ptr[envs] = 0
+        self.head_ptr[envs] = 3
+        self.direction[envs] = RIGHT_INDEX
+        self.score[envs] = 0
+        self.ticks[envs] = 0
+        self.done[envs] = False
+        self.won[envs] = False
+        self.food[envs] = -1
+        self.bean[envs] = -1
+        self._generate_food(envs)
+
+    def step(self, actions):
+        """所有局同时前进一步，返回 (本步得分, 本步结束的局)
+
+        actions 为每局的方向编号数组，-1 表示保持当前方向；直接反向的方向会被忽略。
+        本步结束的局已自动重置，结果见 final_score / final_length / final_ticks / final_won。
+        """
+        actions = np.asarray(actions, dtype=np.int64)
+        width = self.grid_width
+        rows = self._rows
+        score_before = self.score.copy()
+
+        turn = (actions >= 0) & (actions != OPPOSITE_INDEX[self.direction])
+        self.direction = np.where(turn, actions, self.direction)
+        self.ticks += 1
+
+        head = self.body[rows, self.head_ptr]
+        nx = head % width + DIRECTION_DX[self.direction]
+        ny = head // width + DIRECTION_DY[self.direction]
+
+        # 检查是否撞墙、撞到自己（蛇尾也算）
+        dead = (nx < 0) | (nx >= width) | (ny < 0) | (ny >= self.grid_height)
+        new_head = np.where(dead, 0, ny * width + nx)
+        dead |= self.occupancy[rows, new_head] > 0
+
+        # 检查是否达到胜利长度（无限模式不结束）
+        if self.infinite_mode:
+            win = np.zeros_like(dead)
+        else:
+            win = ~dead & (self.length >= WIN_LENGTH)
+        move = np.flatnonzero(~dead & ~win)
+
+        # 添加新的头部
+        new_head = new_head[move]
+        self.head_ptr[move] = (self.head_ptr[move] + 1) % self.capacity
+        self.body[move, self.head_ptr[move]] = new_head
+        self.occupancy[move, new_head] += 1
+
+        ate_food = new_head == self.food[move]
+        ate_bean = ~ate_food & (new_head == self.bean[move])
+        grow_food = move[ate_food]
+        grow_bean = move[ate_bean]
+        plain = move[~ate_food & ~ate_bean]
+
+        # 没吃到东西：删除尾部
+        tail = self.body[plain, self.tail_ptr[plain]]
+        self.occupancy[plain, tail] -= 1
+        self.tail_ptr[plain] = (self.tail_ptr[plain] + 1) % self.capacity
+
+        # 能量豆：不删除尾部，并在尾部再复制 2 个节点（共长 3 节）
+        if len(grow_bean):
+            tail = self.body[grow_bean, self.tail_ptr[grow_bean]]
+            self.tail_ptr[grow_bean] = (self.tail_ptr[grow_bean] - 2) % self.capacity
+            self.body[grow_bean, self.tail_ptr[grow_bean]] = tail
+            self.body[grow_bean, (self.tail_ptr[grow_bean] + 1) % self.capacity] = tail
+            self.occupancy[grow_bean, tail] += 2
+            self.score[grow_bean] += POWER_BEAN_SCORE
+            self.bean[grow_bean] = -1
+
+        # 食物：不删除尾部（长 1 节），重新生成食物
+        if len(grow_food):
+            self.score[grow_food] += FOOD_SCORE
+            self._generate_food(grow_food)
+
+        self.done |= dead | win
+        self.won |= win
+        reward = self.score - score_before
+
+        finished = self.done.copy()
+        if finished.any():
+            envs = np.flatnonzero(finished)
+            self.final_score[envs] = self.score[envs]
+            self.final_length[envs] = self.length[envs]
+            self.final_ticks[envs] = self.ticks[envs]
+            self.final_won[envs] = self.won[envs]
+            self.games_finished += len(envs)
+            self.reset(envs)
+        return reward, finished
+
+    def _generate_food(self, envs):
+        """为指定的局在随机空格子上生成食物，并可能生成能量豆"""
+        food = self._random_free_cells(envs)
+        self.food[envs] = food
+        # 没有空格子：蛇已填满整个棋盘，算作胜利
+        full = envs[food < 0]
+        self.done[full] = True
+        self.won[full] = True
+
+        placed = envs[food >= 0]
+        spawn = placed[(self.bean[placed] < 0)
+                       & (self.rng.random(len(placed)) < self.power_bean_spawn_chance)]
+        if len(spawn):
+            self.bean[spawn] = self._random_free_cells(spawn, exclude=self.food[spawn])
+
+    def _random_free_cells(self, envs, exclude=None):
+        """为每个指定的局均匀抽取一个空格子（可排除一个格子），没有时为 -1
+
+        先做几轮向量化的拒绝采样；棋盘很满、仍未命中的局再逐个从空格子中精确抽样。
+        """
+        result = np.full(len(envs), -1, dtype=np.int64)
+        pending = np.arange(len(envs))
+        for _ in range(REJECTION_ROUNDS):
+            if not len(pending):
+                return result
+            candidates = self.rng.integers(0, self.cells, len(pending))
+            ok = self.occupancy[envs[pending], candidates] == 0
+            if exclude is not None:
+                ok &= candidates != exclude[pending]
+            result[pending[ok]] = candidates[ok]
+            pending = pending[~ok]
+
+        for k in pending:
+            free = np.flatnonzero(self.occupancy[envs[k]] == 0)
+            if exclude is not None:
+                free = free[free != exclude[k]]
+            if len(free):
+                result[k] = free[self.rng.integers(len(free))]
+        return result
@@ -0,0 +1,470 @@
+"""Benchmark suite for the game's hot paths, driven through tanchishe.py.
+
+tanchishe.py is imported with stub `screen` and `keyboard` objects and pgzero's
+`keys` / `Rect` (pgzrun.go() only runs under __main__), so the benchmarks time
+the same functions the game loop calls:
+
+- auto_eat_food() with a cold path cache (full BFS) and a warm one
+- BackgroundAutopilot on a 1000x1000 board: handing a search to the worker
+  process, and the per-tick decision while that search is still running
+- BfsAutopilot decisions with and without the tail-reachability safety check,
+  on states sampled from seeded infinite-mode games
+- move_snake() at snake lengths from 4 to 10,000
+- generate_food() on nearly full boards
+- SnakeEngine.clone() / snapshot() / restore() and a journaled step() + undo() for a
+  long snake
+- draw() on a call-counting screen: full repaint, incremental frames, start screen,
+  and a full repaint of the scrolling viewport on a 2000x2000 board
+
+Each result is the best per-call time over several samples. --save writes the
+results as a JSON baseline. --compare exits with status 1 if a benchmark is more
+than --threshold slower than the baseline, or if a frame makes more screen calls.
+
+If fonts/simhei.ttf is missing, text is rendered with pygame's default font.
+
+Usage:
+    python bench_game.py --save baseline.json
+    python bench_game.py --compare baseline.json --threshold 0.25
+    python bench_game.py --only move_snake draw
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from collections import Counter
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import pygame  # noqa: E402
+import pgzero.loaders  # noqa: E402  (patches ptext.getfont to use the fonts/ loader)
+from pgzero import ptext  # noqa: E402
+from pgzero.constants import keys  # noqa: E402
+from pgzero.rect import Rect  # noqa: E402
+from pgzero.screen import Screen  # noqa: E402
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+GAME_FILE = os.path.join(ROOT, "tanchishe.py")
+sys.path.insert(0, ROOT)
+
+import tanchishe as game  # noqa: E402
+from snake_engine import SnakeBody, SnakeEngine, UP  # noqa: E402
+from autopilot import BackgroundAutopilot, BfsAutopilot  # noqa: E402
+
+MOVE_BOARD = (200, 200)
+MOVE_LENGTHS = (4, 100, 1000, 10000)
+NEAR_FULL_FREE_CELLS = (100, 10, 1)
+DRAW_SNAKE_LENGTH = 100
+LARGE_BOARD = (2000, 2000)
+LARGE_SNAKE_LENGTH = 20000  # ten full rows; only the segments near the head are visible
+SNAPSHOT_SNAKE_LENGTH = 1000
+BACKGROUND_BOARD = (1000, 1000)
+SAFETY_SEEDS = (0, 1)
+SAFETY_MAX_TICKS = 20000  # per sampled game; snakes reach a few hundred segments
+SAFETY_SAMPLE_EVERY = 50
+DEFAULT_THRESHOLD = 0.25
+
+
+class StubKeyboard:
+    """keyboard stand-in: no key is ever held down."""
+
+    def __getattr__(self, name):
+        return False
+
+
+class CallCounter:
+    """Proxy that counts calls to the wrapped object's methods."""
+
+    def __init__(self, target, counts, prefix):
+        self._target = target
+        self._counts = counts
+        self._prefix = prefix
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+        key = self._prefix + name
+        counts = self._counts
+
+        def counted(*args, **kwargs):
+            counts[key] += 1
+            return attr(*args, **kwargs)
+        return counted
+
+
+class CountingSurface(CallCounter):
+    """Counting proxy for screen.surface that also counts items passed to blits()."""
+
+    def blits(self, blit_sequence, doreturn=True):
+        self._counts["surface.blits"] += 1
+        self._counts["surface.blits items"] += len(blit_sequence)
+        return self._target.blits(blit_sequence, doreturn=doreturn)
+
+
+class CountingScreen:
+    """pgzero Screen over the (dummy-driver) display that counts every drawing call."""
+
+    def __init__(self, width, height):
+        self.counts = Counter()
+        surface = pygame.display.set_mode((width, height))
+        self._screen = Screen(surface)
+        self.surface = CountingSurface(surface, self.counts, "surface.")
+        self.draw = CallCounter(self._screen.draw, self.counts, "draw.")
+
+    def blit(self, image, pos):
+        self.counts["blit"] += 1
+        self._screen.blit(image, pos)
+
+    def fill(self, color):
+        self.counts["fill"] += 1
+        self._screen.fill(color)
+
+    def clear(self):
+        self.counts["clear"] += 1
+        self._screen.clear()
+
+
+def install_stubs():
+    """Point tanchishe's pgzero builtins at the stubs; return the counting screen."""
+    pygame.init()
+    pgzero.loaders.set_root(GAME_FILE)
+    if not os.path.exists(os.path.join(ROOT, "fonts", "simhei.ttf")):
+        print("[WARN] fonts/simhei.ttf not found; text uses pygame's default font.",
+              file=sys.stderr)
+        loader_getfont = ptext.getfont
+        ptext.getfont = lambda fontname=None, fontsize=None, *args, **kwargs: \
+            loader_getfont(None, fontsize, *args, **kwargs)
+
+    screen = CountingScreen(game.WIDTH, game.HEIGHT)
+    game.screen = screen
+    game.keyboard = StubKeyboard()
+    game.keys = keys
+    game.Rect = Rect
+    return screen
+
+
+def lay_snake(width, height, length, seed=0):
+    """Return a fresh engine holding a `length`-segment serpentine snake.
+
+    The body fills rows from the bottom up, alternating direction, and the head
+    is the last cell laid. Every row above the head is empty, so the snake can
+    move UP until it reaches the top wall. The food goes in a top corner outside
+    the head's column, and there is no power bean. Infinite mode is on so long
+    snakes do not end the game by reaching the win length.
+    """
+    engine = SnakeEngine(width, height, seed=seed, infinite_mode=True)
+    cells = []
+    for k in range(length):
+        row, col = divmod(k, width)
+        x = col if row % 2 == 0 else width - 1 - col
+        cells.append((x, height - 1 - row))
+    for x, y in cells:
+        index = y * width + x
+        engine.occupancy[index] = 1
+        engine._claim(index)
+    engine.snake = SnakeBody(width, (y * width + x for x, y in reversed(cells)))
+    for i, index in enumerate(engine.snake.indices()):
+        engine.entry_tick[index] = -i
+    engine.direction = UP
+    head_x = engine.snake[0][0]
+    engine.food_pos = (0, 0) if head_x != 0 else (width - 1, 0)
+    return engine
+
+
+def start_game(engine):
+    """Install `engine` as the running game, as reset_game() would leave it."""
+    game.engine = engine
+    game.game_started = True
+    game.auto_mode = True
+    game.next_direction = engine.direction
+    game.tick_accumulator = 0.0
+    game.full_repaint_needed = True
+    for _, pilot in game.AUTOPILOTS:
+        pilot.reset()
+
+
+def measure(fn, number, repeat, setup=None):
+    """Return (best, mean) seconds per call over `repeat` samples of `number` calls."""
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+    return min(samples), sum(samples) / len(samples)
+
+
+def result(best, mean, **extra):
+    row = {"best_us": round(best * 1e6, 3), "mean_us": round(mean * 1e6, 3)}
+    row.update(extra)
+    return row
+
+
+def bench_auto_eat_food(results, repeat):
+    """BFS autopilot decision: path cache cleared every call vs. reused."""
+    width, height = game.GRID_WIDTH, game.GRID_HEIGHT
+    start_game(lay_snake(width, height, 50))
+    game.engine.food_pos = (width - 1, 0)
+
+    def cold():
+        game.autopilot.reset()
+        game.auto_eat_food()
+    best, mean = measure(cold, 200, repeat)
+    results["auto_eat_food cold"] = result(best, mean)
+
+    game.auto_eat_food()
+    best, mean = measure(game.auto_eat_food, 5000, repeat)
+    results["auto_eat_food warm"] = result(best, mean)
+
+
+def bench_background_autopilot(results, repeat):
+    """Main-process cost of the background BFS on a board too large to search per tick.
+
+    "submit" snapshots the engine and hands it to the worker; "waiting" is a decision
+    while that search is still running (poll the future, O(1) default move).
+    """
+    engine = lay_snake(*BACKGROUND_BOARD, 50)
+    engine.food_pos = (BACKGROUND_BOARD[0] - 1, BACKGROUND_BOARD[1] - 1)
+    pilot = BackgroundAutopilot(wait=0)
+    pilot.warm_up(engine)
+    try:
+        start = time.perf_counter()
+        pilot.next_direction(engine)
+        submit = time.perf_counter() - start
+        best, mean = measure(lambda: pilot.next_direction(engine), 2000, repeat)
+        results["background bfs waiting"] = result(best, mean, submit_us=round(submit * 1e6, 3))
+    finally:
+        pilot.close()
+
+
+def bench_autopilot_safety(results, repeat):
+    """Cold BFS decisions (path cache cleared) with and without the safety check.
+
+    States are clones taken every SAFETY_SAMPLE_EVERY ticks of seeded infinite-mode
+    games on the game board, so they cover short and long snakes. Times are per
+    decision. Every state is also timed alone `repeat` times: worst_us is the slowest
+    single decision of all those runs, p99_us the 99th percentile, and
+    worst_state_us the slowest state's best run (its cost without timer noise).
+    Single-run outliers come mostly from the scheduler and the garbage collector:
+    greedy decisions show the same spikes.
+    """
+    width, height = game.GRID_WIDTH, game.GRID_HEIGHT
+    states = []
+    for seed in SAFETY_SEEDS:
+        engine = SnakeEngine(width, height, seed=seed, infinite_mode=True)
+        engine.reset()
+        pilot = BfsAutopilot()
+        while engine.ticks < SAFETY_MAX_TICKS and engine.step(pilot.next_direction(engine)):
+            if engine.ticks % SAFETY_SAMPLE_EVERY == 0:
+                states.append(engine.clone())
+
+    for name, pilot in (("safe", BfsAutopilot()), ("greedy", BfsAutopilot(safe=False))):
+        def decide_all():
+            for state in states:
+                pilot.reset()
+                pilot.next_direction(state)
+        pilot.fallbacks = 0
+        best, mean = measure(decide_all, 1, repeat)
+        fallback_rate = pilot.fallbacks / (len(states) * repeat)
+
+        samples = []
+        worst_state = 0.0
+        for state in states:
+            runs = []
+            for _ in range(repeat):
+                pilot.reset()
+                start = time.perf_counter()
+                pilot.next_direction(state)
+                runs.append(time.perf_counter() - start)
+            samples.extend(runs)
+            worst_state = max(worst_state, min(runs))
+        samples.sort()
+        results[f"bfs decision {name}"] = result(
+            best / len(states), mean / len(states), worst_us=round(samples[-1] * 1e6, 3),
+            p99_us=round(samples[int(len(samples) * 0.99)] * 1e6, 3),
+            worst_state_us=round(worst_state * 1e6, 3),
+            states=len(states), fallback_rate=round(fallback_rate, 3))
+
+
+def bench_move_snake(results, repeat):
+    """One movement tick at several snake lengths on a large board."""
+    width, height = MOVE_BOARD
+    for length in MOVE_LENGTHS:
+        moves = min(100, height - 2 - (length - 1) // width)
+
+        def setup():
+            start_game(lay_snake(width, height, length))
+            game.next_direction = UP
+        best, mean = measure(game.move_snake, moves, repeat, setup)
+        assert not game.engine.game_over and len(game.engine.snake) == length
+        results[f"move_snake len={length}"] = result(best, mean)
+
+
+def bench_generate_food(results, repeat):
+    """Food (and power bean) placement when only a few cells are free."""
+    width, height = game.GRID_WIDTH, game.GRID_HEIGHT
+    for free in NEAR_FULL_FREE_CELLS:
+        engine = lay_snake(width, height, width * height - free)
+        best, mean = measure(engine.generate_food, 2000, repeat)
+        assert engine.food_pos is not None
+        results[f"generate_food free={free}"] = result(best, mean)
+
+
+def bench_snapshot(results, repeat):
+    """Lookahead and save/load primitives on the game board with a long snake."""
+    width, height = game.GRID_WIDTH, game.GRID_HEIGHT
+    engine = lay_snake(width, height, SNAPSHOT_SNAKE_LENGTH)
+    best, mean = measure(engine.clone, 2000, repeat)
+    results["clone"] = result(best, mean)
+    engine.journal = []
+
+    def step_undo():
+        engine.step(UP)
+        engine.undo()
+    best, mean = measure(step_undo, 2000, repeat)
+    results["step + undo"] = result(best, mean)
+    engine.journal = None
+    data = engine.snapshot()
+    best, mean = measure(engine.snapshot, 1000, repeat)
+    results["snapshot"] = result(best, mean, bytes=len(data))
+    best, mean = measure(lambda: engine.snapshot(include_rng=False), 1000, repeat)
+    results["snapshot without rng"] = result(
+        best, mean, bytes=len(engine.snapshot(include_rng=False)))
+    target = SnakeEngine(width, height)
+    best, mean = measure(lambda: target.restore(data), 1000, repeat)
+    results["restore"] = result(best, mean)
+
+
+def bench_draw(results, repeat, screen):
+    """draw() on the counting screen; also records screen calls per frame."""
+    width, height = game.GRID_WIDTH, game.GRID_HEIGHT
+
+    def counted(name, fn, number, setup=None):
+        screen.counts.clear()
+        best, mean = measure(fn, number, repeat, setup)
+        calls = {k: round(v / (number * repeat), 2) for k, v in sorted(screen.counts.items())}
+        results[name] = result(best, mean, calls_per_frame=calls)
+
+    def setup_static():
+        game.incremental_mode = False
+        start_game(lay_snake(width, height, DRAW_SNAKE_LENGTH))
+    counted("draw full", game.draw, 200, setup_static)
+
+    def setup_incremental():
+        setup_static()
+        game.incremental_mode = True
+        game.engine.events = []
+        game.draw()
+
+    def frame():
+        game.update()
+        game.draw()
+    counted("frame incremental (update+draw)", frame, 160, setup_incremental)
+    game.incremental_mode = False
+    game.engine.events = None
+
+    def setup_start():
+        game.game_started = False
+    counted("draw start screen", game.draw, 200, setup_start)
+
+    large = lay_snake(*LARGE_BOARD, LARGE_SNAKE_LENGTH)
+
+    def setup_large():
+        game.incremental_mode = False
+        start_game(large)
+        game.center_camera()
+    counted(f"draw full {LARGE_BOARD[0]}x{LARGE_BOARD[1]} viewport", game.draw, 200, setup_large)
+
+
+BENCHMARKS = {
+    "auto_eat_food": bench_auto_eat_food,
+    "autopilot_safety": bench_autopilot_safety,
+    "background_autopilot": bench_background_autopilot,
+    "move_snake": bench_move_snake,
+    "generate_food": bench_generate_food,
+    "snapshot": bench_snapshot,
+    "draw": bench_draw,
+}
+
+
+def compare(results, baseline, threshold):
+    """Print current vs. baseline; return the names of regressed benchmarks."""
+    regressions = []
+    print(f"\n{'benchmark':<34} {'base us':>10} {'now us':>10} {'ratio':>7}")
+    for name, row in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<34} {'-':>10} {row['best_us']:10.2f}     new")
+            continue
+        ratio = row["best_us"] / base["best_us"] if base["best_us"] else 1.0
+        status = ""
+        if ratio > 1 + threshold:
+            status = "  REGRESSED"
+        base_calls = sum(base.get("calls_per_frame", {}).values())
+        calls = sum(row.get("calls_per_frame", {}).values())
+        if calls > base_calls:
+            status += f"  calls/frame {base_calls:g} -> {calls:g}"
+        if status:
+            regressions.append(name)
+        print(f"{name:<34} {base['best_us']:10.2f} {row['best_us']:10.2f} {ratio:7.2f}{status}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS),
+                        help="run only these benchmark groups")
+    parser.add_argument("--repeat", type=int, default=5, help="samples per benchmark")
+    parser.add_argument("--save", help="write results to this JSON baseline")
+    parser.add_argument("--compare", help="compare against this JSON baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown before failing (default: %(default)s = 25%%)")
+    args = parser.parse_args(argv)
+
+    screen = install_stubs()
+    results = {}
+    for name, bench in BENCHMARKS.items():
+        if args.only and name not in args.only:
+            continue
+        if bench is bench_draw:
+            bench(results, args.repeat, screen)
+        else:
+            bench(results, args.repeat)
+
+    print(f"{'benchmark':<34} {'best us':>10} {'mean us':>10}")
+    for name, row in results.items():
+        print(f"{name:<34} {row['best_us']:10.2f} {row['mean_us']:10.2f}")
+        for call, count in row.get("calls_per_frame", {}).items():
+            print(f"{'':<4}{call:<30} {count:10g} / frame")
+        if "worst_us" in row:
+            print(f"{'':<4}{'worst state (best run)':<30} {row['worst_state_us']:10.2f}")
+            print(f"{'':<4}{'p99 single decision':<30} {row['p99_us']:10.2f}")
+            print(f"{'':<4}{'worst single decision':<30} {row['worst_us']:10.2f}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "results": results,
+            }, f, indent=2)
+        print(f"\nSaved baseline to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n[FAIL] {len(regressions)} regression(s): {', '.join(regressions)}")
+            return 1
+        print("\n[OK] No regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""Micro-benchmark: flat-grid BFS (`GridPathfinder`) vs. the old list-path BFS.
+
+The old `auto_eat_food()` search kept a full copy of the path in every queue
+entry (`path + [next_pos]`), so one search cost O(cells x path length).
+`legacy_find_path` below is that search, kept here only as the reference.
+
+Each board places a 50-segment snake across the middle, the head at the centre
+and the target in the far corner, so both searches explore most of the grid.
+
+A second table compares the pathfinding algorithms in `autopilot.PATHFINDERS`
+(BFS, A*, and the multi-target distance field) by nodes expanded per decision:
+- "far": the board above, the target in the far corner;
+- "game": states sampled every GAME_SAMPLE_EVERY ticks from seeded BFS-autopilot
+  games, searched toward the engine's own power bean and food (boards up to
+  --game-max-cells only).
+
+Usage:
+    python bench_pathfinding.py                  # 40x30, 200x200, 1000x1000
+    python bench_pathfinding.py --sizes 40x30 --repeat 200
+"""
+import argparse
+import os
+import sys
+import time
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from autopilot import PATHFINDERS, BfsAutopilot, GridPathfinder, movable_tail, targets_of  # noqa: E402
+from snake_engine import SnakeEngine  # noqa: E402
+
+DEFAULT_SIZES = ["40x30", "200x200", "1000x1000"]
+SNAKE_LENGTH = 50
+GAME_SEEDS = (0, 1)
+GAME_MAX_TICKS = 3000
+GAME_SAMPLE_EVERY = 10
+
+
+def legacy_find_path(head, target_pos, snake_set, grid_width, grid_height):
+    """The pre-flat-grid BFS from `auto_eat_food()` (path copied per queue entry)."""
+    queue = deque([(head, [head])])
+    visited = {head}
+    while queue:
+        current_pos, path = queue.popleft()
+        current_x, current_y = current_pos
+        if current_pos == target_pos:
+            return path[1:]
+        for nx, ny in [(current_x + 1, current_y), (current_x - 1, current_y),
+                       (current_x, current_y + 1), (current_x, current_y - 1)]:
+            if 0 <= nx < grid_width and 0 <= ny < grid_height:
+                next_pos = (nx, ny)
+                if next_pos not in visited and next_pos not in snake_set:
+                    visited.add(next_pos)
+                    queue.append((next_pos, path + [next_pos]))
+    return []
+
+
+def make_board(width, height):
+    """Return (head, target, snake) for a board of the given size."""
+    cx, cy = width // 2, height // 2
+    length = min(SNAKE_LENGTH, cx + 1)
+    snake = [(cx - i, cy) for i in range(length)]
+    return snake[0], (width - 1, height - 1), snake
+
+
+def sample_game_states(width, height):
+    """Clones of seeded infinite-mode games, one every GAME_SAMPLE_EVERY ticks."""
+    states = []
+    for seed in GAME_SEEDS:
+        engine = SnakeEngine(width, height, seed=seed, infinite_mode=True)
+        engine.reset()
+        pilot = BfsAutopilot()
+        while engine.ticks < GAME_MAX_TICKS and engine.step(pilot.next_direction(engine)):
+            if engine.ticks % GAME_SAMPLE_EVERY == 0:
+                states.append(engine.clone())
+    return states
+
+
+def compare_algorithms(width, height, scenario, searches, repeat):
+    """Print one row per algorithm: mean nodes expanded, time and path length per search.
+
+    `searches` is a list of (start, targets, occupancy, passable) tuples.
+    """
+    reference = None
+    for name, cls in PATHFINDERS.items():
+        pathfinder = cls(width, height)
+        nodes = 0
+        length = 0
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for args in searches:
+                pathfinder.search(*args)
+            best = min(best, time.perf_counter() - start)
+        for args in searches:
+            length += len(pathfinder.search(*args))
+            nodes += pathfinder.nodes_expanded
+        count = len(searches)
+        if reference is None:
+            reference = nodes
+        print(f"{f'{width}x{height}':>11} {scenario:>8} {name:>6} {count:6d} {nodes / count:12.1f}"
+              f" {reference / max(nodes, 1):8.2f}x {best / count * 1000:10.4f} {length / count:8.1f}")
+
+
+def time_calls(fn, repeat):
+    best = float("inf")
+    total = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        total += elapsed
+        best = min(best, elapsed)
+    return result, best, total / repeat
+
+
+def parse_size(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES,
+                        help="board sizes as WxH (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=0,
+                        help="searches per size (default: scaled to board area)")
+    parser.add_argument("--legacy-max-cells", type=int, default=1000 * 1000,
+                        help="skip the legacy search on boards larger than this")
+    parser.add_argument("--game-max-cells", type=int, default=200 * 200,
+                        help="skip the sampled game states on boards larger than this")
+    args = parser.parse_args(argv)
+
+    print(f"{'board':>11} {'impl':>7} {'best ms':>10} {'mean ms':>10} {'path':>6} {'speedup':>8}")
+    for text in args.sizes:
+        width, height = parse_size(text)
+        cells = width * height
+        repeat = args.repeat or max(3, 200000 // cells)
+        head, target, snake = make_board(width, height)
+        obstacles = snake[:-1]
+        occupancy = [0] * cells
+        for x, y in snake:
+            occupancy[y * width + x] += 1
+        tail_index = snake[-1][1] * width + snake[-1][0]
+
+        build_start = time.perf_counter()
+        pathfinder = GridPathfinder(width, height)
+        build_ms = (time.perf_counter() - build_start) * 1000
+        path, best, mean = time_calls(
+            lambda: pathfinder.find_path(head, target, occupancy, tail_index), repeat)
+        print(f"{text:>11} {'flat':>7} {best * 1000:10.3f} {mean * 1000:10.3f} {len(path):6d}"
+              f" {'':>8}   (tables built in {build_ms:.1f} ms)")
+
+        if cells > args.legacy_max_cells:
+            print(f"{text:>11} {'legacy':>7} {'skipped':>10}")
+            continue
+        snake_set = set(obstacles)
+        legacy_repeat = max(1, repeat // 10) if cells > 100000 else repeat
+        legacy_path, legacy_best, legacy_mean = time_calls(
+            lambda: legacy_find_path(head, target, snake_set, width, height), legacy_repeat)
+        if legacy_path != path:
+            print(f"[FAIL] paths differ on {text}")
+            return 1
+        print(f"{text:>11} {'legacy':>7} {legacy_best * 1000:10.3f} {legacy_mean * 1000:10.3f}"
+              f" {len(legacy_path):6d} {legacy_best / best:7.1f}x")
+
+    print()
+    print(f"{'board':>11} {'scenario':>8} {'algo':>6} {'states':>6} {'nodes/search':>12}"
+          f" {'vs bfs':>9} {'best ms':>10} {'path':>8}")
+    for text in args.sizes:
+        width, height = parse_size(text)
+        cells = width * height
+        repeat = args.repeat or max(3, 200000 // cells)
+        head, target, snake = make_board(width, height)
+        occupancy = [0] * cells
+        for x, y in snake:
+            occupancy[y * width + x] += 1
+        tail_index = snake[-1][1] * width + snake[-1][0]
+        compare_algorithms(width, height, "far", [(head, (target,), occupancy, tail_index)], repeat)
+
+        if cells > args.game_max_cells:
+            continue
+        searches = [(state.snake[0], targets_of(state), state.occupancy, movable_tail(state))
+                    for state in sample_game_states(width, height)]
+        compare_algorithms(width, height, "game", searches, max(1, repeat // 20))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+'''
+逐帧性能分析
+
+FrameProfiler 按名字记录每次调用的耗时，每个名字一个 Histogram：
+    samples  最近 window 个样本（滚动窗口），用于计算 p50 / p99
+    buckets  开启以来全部样本的对数直方图，第 k 桶统计 [2^(k-1), 2^k) 微秒
+
+用 timed(name) 装饰要测的函数；关闭时每次调用只多一次属性判断。
+dump(path) 把统计、直方图和窗口内的原始样本写成 JSON。
+'''
+import json
+import time
+from collections import deque
+from functools import wraps
+
+PROFILE_WINDOW = 600  # 滚动窗口样本数（60fps 下约 10 秒）
+PROFILE_REFRESH_FRAMES = 30  # 每隔多少帧重新计算一次 report()
+
+
+class Histogram:
+    """一个计时项：滚动窗口样本 + 累计对数直方图"""
+
+    def __init__(self, window=PROFILE_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+        bucket = int(seconds * 1e6).bit_length()
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def percentile(self, p):
+        """滚动窗口内的第 p 百分位（秒），没有样本时为 0"""
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+class FrameProfiler:
+    """按名字收集耗时样本；enabled 为 False 时不记录"""
+
+    def __init__(self, window=PROFILE_WINDOW):
+        self.enabled = False
+        self.used = False  # 是否开启过（退出时只在开启过时导出）
+        self.window = window
+        self.histograms = {}
+        self.frames = 0
+        self.last_frame = None
+        self.report_cache = None
+        self.report_frame = 0
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.last_frame = None  # 关闭期间的间隔不算作帧时间
+        if self.enabled:
+            self.used = True
+        return self.enabled
+
+    def record(self, name, seconds):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram(self.window)
+        histogram.add(seconds)
+
+    def mark_frame(self):
+        """每帧调用一次，记录与上一帧的间隔（帧时间）"""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if self.last_frame is not None:
+            self.record("frame", now - self.last_frame)
+        self.last_frame = now
+        self.frames += 1
+
+    def timed(self, name):
+        """装饰器：开启时把函数每次调用的耗时记到 name 下"""
+        def decorate(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.record(name, time.perf_counter() - start)
+            return wrapper
+        return decorate
+
+    def ratio(self, name, other):
+        """name 的累计调用次数占 name + other 的比例"""
+        count = self.histograms[name].count if name in self.histograms else 0
+        total = count + (self.histograms[other].count if other in self.histograms else 0)
+        return count / total if total else 0.0
+
+    def report(self):
+        """[(名字, p50 秒, p99 秒)]，每 PROFILE_REFRESH_FRAMES 帧重新计算一次"""
+        if self.report_cache is None or self.frames - self.report_frame >= PROFILE_REFRESH_FRAMES:
+            names = sorted(self.histograms, key=lambda name: name != "frame")  # 帧时间排在最前
+            self.report_cache = [(name, self.histograms[name].percentile(50),
+                                  self.histograms[name].percentile(99)) for name in names]
+            self.report_frame = self.frames
+        return self.report_cache
+
+    def dump(self, path, extra=None):
+        """把每个计时项的统计、直方图和窗口样本写入 JSON 文件"""
+        data = {}
+        for name, h in self.histograms.items():
+            data[name] = {
+                "count": h.count,
+                "total_ms": round(h.total * 1000, 3),
+                "mean_us": round(h.total / h.count * 1e6, 3) if h.count else 0,
+                "p50_us": round(h.percentile(50) * 1e6, 3),
+                "p99_us": round(h.percentile(99) * 1e6, 3),
+                "histogram_us": {f"<{1 << k}": n for k, n in sorted(h.buckets.items())},
+                "samples_us": [round(s * 1e6, 3) for s in h.samples],
+            }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"timings": data, **(extra or {})}, f, ensure_ascii=False, indent=1)
@@ -0,0 +1,227 @@
+'''
+对局录像：确定性录制与回放
+
+一局游戏完全由随机数种子和每个移动节拍传给 SnakeEngine.step 的方向决定，
+所以录像只保存种子和“变化”：
+
+    文件头  magic "SNKR"、版本、网格宽高、种子、初始状态标志
+            （无限模式、自动模式、寻路策略序号、蛇身颜色序号）
+    事件流  每个事件一个变长整数：(距上一个事件的节拍数 << 3) | 事件码
+            事件码 0~3 为新方向（DIRECTIONS 中的序号），4/5/6 为按 A/B/C 键，
+            7 为结束，后面再跟一个变长整数记录最终分数用于校验
+
+方向只在真正改变时记录；一局几千个节拍通常只有几百字节。
+事件的节拍号是事件发生时引擎已走过的节拍数，回放时在走下一步之前应用。
+
+    recorder = GameRecorder(40, 30, seed)
+    ...每步之后 recorder.record_step(tick, old_direction, engine.direction)
+    data = recorder.finish(engine.ticks, engine.score)
+
+    engine = replay(Recording.from_bytes(data))   # 无界面全速重放
+
+命令行：python recording.py 录像文件...  逐个全速重放并校验最终节拍数和分数。
+'''
+import os
+import struct
+import sys
+import time
+
+from snake_engine import SnakeEngine, DIRECTIONS
+
+MAGIC = b"SNKR"
+VERSION = 1
+HEADER = struct.Struct("<4sBHHQB")  # magic, 版本, 宽, 高, 种子, 标志
+
+# 事件码
+CODE_AUTOPILOT = 4  # A 键：切换自动模式 / 寻路策略
+CODE_INFINITE = 5  # B 键：切换无限模式
+CODE_COLOR = 6  # C 键：切换蛇身颜色
+CODE_END = 7  # 录像结束，后跟最终分数
+CODE_BITS = 3
+
+# 文件头标志位
+FLAG_INFINITE = 0x01
+FLAG_AUTO = 0x02
+AUTOPILOT_SHIFT = 2  # 2 位寻路策略序号
+COLOR_SHIFT = 4  # 3 位蛇身颜色序号
+
+
+def write_varint(buffer, value):
+    """把非负整数按 LEB128 变长编码追加到 buffer"""
+    while value >= 0x80:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def read_varint(data, offset):
+    """从 data[offset:] 读一个变长整数，返回 (值, 新的 offset)"""
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+class GameRecorder:
+    """边玩边录：事件直接编码进 bytearray"""
+
+    def __init__(self, grid_width, grid_height, seed, infinite_mode=False,
+                 auto_mode=False, autopilot_index=0, color_index=0):
+        flags = ((FLAG_INFINITE if infinite_mode else 0) | (FLAG_AUTO if auto_mode else 0)
+                 | (autopilot_index << AUTOPILOT_SHIFT) | (color_index << COLOR_SHIFT))
+        self.buffer = bytearray(HEADER.pack(MAGIC, VERSION, grid_width, grid_height, seed, flags))
+        self.last_tick = 0
+        self.finished = False
+
+    def record(self, tick, code):
+        write_varint(self.buffer, (tick - self.last_tick) << CODE_BITS | code)
+        self.last_tick = tick
+
+    def record_step(self, tick, old_direction, new_direction):
+        """记录第 tick 步（从 0 开始）实际采用的方向；方向没变时不写任何东西"""
+        if new_direction != old_direction:
+            self.record(tick, DIRECTIONS.index(new_direction))
+
+    def finish(self, tick, score):
+        """写入结束标记和最终分数，返回录像的 bytes"""
+        if not self.finished:
+            self.record(tick, CODE_END)
+            write_varint(self.buffer, score)
+            self.finished = True
+        return bytes(self.buffer)
+
+
+class Recording:
+    """解码后的录像：文件头字段 + [(节拍号, 事件码)]"""
+
+    def __init__(self, grid_width, grid_height, seed, flags, events, end_tick, score):
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.seed = seed
+        self.infinite_mode = bool(flags & FLAG_INFINITE)
+        self.auto_mode = bool(flags & FLAG_AUTO)
+        self.autopilot_index = (flags >> AUTOPILOT_SHIFT) & 0x3
+        self.color_index = (flags >> COLOR_SHIFT) & 0x7
+        self.events = events
+        self.end_tick = end_tick
+        self.score = score
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, version, width, height, seed, flags = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError("not a snake recording (bad magic)")
+        if version != VERSION:
+            raise ValueError(f"unsupported recording format version {version} (expected {VERSION})")
+        events = []
+        tick = 0
+        offset = HEADER.size
+        while True:
+            value, offset = read_varint(data, offset)
+            tick += value >> CODE_BITS
+            code = value & ((1 << CODE_BITS) - 1)
+            if code == CODE_END:
+                score, offset = read_varint(data, offset)
+                return cls(width, height, seed, flags, events, tick, score)
+            events.append((tick, code))
+
+
+class Replayer:
+    """按录像逐步驱动引擎；按键事件交给 on_toggle 处理"""
+
+    def __init__(self, recording):
+        self.recording = recording
+        self.position = 0  # 下一个未应用的事件
+
+    def new_engine(self):
+        """按录像的网格创建引擎，并从录像开头开始"""
+        engine = SnakeEngine(self.recording.grid_width, self.recording.grid_height)
+        self.start(engine)
+        return engine
+
+    def start(self, engine):
+        """用录像的种子和初始无限模式重置 engine，从录像开头开始"""
+        engine.infinite_mode = self.recording.infinite_mode
+        engine.reset(seed=self.recording.seed)
+        self.position = 0
+
+    @property
+    def finished(self):
+        return self.position >= len(self.recording.events)
+
+    def step(self, engine, on_toggle=None):
+        """应用本节拍的事件并走一步，返回游戏是否仍在进行（录像到结尾时为 False）"""
+        if engine.game_over or engine.ticks >= self.recording.end_tick:
+            return False
+        events = self.recording.events
+        action = None
+        tick = engine.ticks
+        while self.position < len(events) and events[self.position][0] == tick:
+            code = events[self.position][1]
+            self.position += 1
+            if code < len(DIRECTIONS):
+                action = DIRECTIONS[code]
+            elif on_toggle is not None:
+                on_toggle(code)
+            elif code == CODE_INFINITE:
+                toggle_infinite_mode(engine)
+        return engine.step(action)
+
+
+def toggle_infinite_mode(engine):
+    """与游戏中按B键相同的规则效果（无界面回放用）"""
+    engine.infinite_mode = not engine.infinite_mode
+    if engine.infinite_mode:
+        engine.wingame = False
+
+
+def replay(recording):
+    """无界面全速重放整局，返回结束时的引擎"""
+    replayer = Replayer(recording)
+    engine = replayer.new_engine()
+    while replayer.step(engine):
+        pass
+    return engine
+
+
+def save(path, data):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def load(path):
+    with open(path, "rb") as f:
+        return Recording.from_bytes(f.read())
+
+
+def main(paths):
+    """全速重放每个录像，校验节拍数和分数；有不一致时返回 1"""
+    failed = 0
+    for path in paths:
+        try:
+            recording = load(path)
+        except (OSError, ValueError) as error:
+            failed += 1
+            print(f"FAIL {path}: {error}")
+            continue
+        start = time.perf_counter()
+        engine = replay(recording)
+        elapsed = time.perf_counter() - start
+        ok = engine.ticks == recording.end_tick and engine.score == recording.score
+        failed += not ok
+        print(f"{'OK  ' if ok else 'FAIL'} {path}: {engine.ticks} ticks, score {engine.score}"
+              f" (recorded {recording.end_tick} / {recording.score}),"
+              f" {os.path.getsize(path)} bytes, {elapsed * 1000:.1f} ms")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,22 +1,48 @@
 """Headless smoke-test for SnakeGame.
 
-Performs static checks only (no imports of `tanchishe.py` to avoid launching `pgzrun.go()`).
+Performs static checks on `tanchishe.py` and a short headless run of the simulation
+core. The game module is only imported by the rendering check, through bench_game.py's
+stubs and SDL's dummy video driver, so no window is opened.
 Checks performed:
-- Syntax check (compile)
+- Syntax check (compile) of the game and its helper modules
 - AST checks: presence of `update`, `draw`, `on_key_down` functions
 - Presence of `pgzrun.go()` call (warns but does not execute)
 - Fonts referenced exist in `fonts/` (if any literal strings found)
+- Headless run: `SnakeEngine` driven by the BFS autopilot for a few games; the
+  free-cell index and occupancy counts stay consistent throughout
+- Hamiltonian autopilot: fills small even boards without dying; odd boards use BFS
+- Batch environment: BatchSnakeEnv steps in lockstep with SnakeEngine
+- Arena: head-on collisions, shared occupancy and a steady food count
+- Tournament: a registered strategy runs in spawned workers; CSV/JSONL rows and
+  percentiles match the games
+- Recording: a recorded game replays to the same final state
+- Spectator: decoded delta frames keep a mirror engine equal to the game
+- Rendering: incremental (dirty-rectangle) frames drawn from the sprite atlas match
+  a full redraw
+- Snapshots: a game saved mid-way, restored and continued ends like the original
+- Lookahead: clones diverge independently; step() + undo() restores the state
+- Background autopilot: most worker results reach the game; a broken worker pool
+  falls back to in-loop search
 
 Exit codes: 0=pass, 1=fail
 """
 import ast
+import contextlib
+import csv
+import io
+import json
 import os
 import sys
 import re
+import tempfile
+import time
+from concurrent.futures import wait
 
 ROOT = os.path.dirname(__file__)
 GAME_FILE = os.path.join(ROOT, "tanchishe.py")
 FONTS_DIR = os.path.join(ROOT, "fonts")
+HELPER_MODULES = ["snake_engine.py", "autopilot.py", "batch_env.py", "tournament.py", "profiler.py", "recording.py",
+                  "arena.py", "spectator.py", "bench_game.py", "bench_pathfinding.py"]
 
 
 def read_source(path):
@@ -59,6 +85,545 @@ def find_font_literals(source):
     return sorted(fonts)
 
 
+def check_free_cells(engine, where):
+    """Check the engine's free-cell index against its occupancy counts and snake body.
+
+    free_cells must hold exactly the unoccupied cells, free_slot must point back
+    into it, and occupancy must count the body nodes on each cell.
+    """
+    free_cells, free_slot, occupancy = engine.free_cells, engine.free_slot, engine.occupancy
+    for slot, index in enumerate(free_cells):
+        if free_slot[index] != slot:
+            raise RuntimeError(f"{where}: free_slot[{index}] is {free_slot[index]}, expected {slot}")
+    occupied = sum(1 for count in occupancy if count)
+    if len(free_cells) + occupied != len(occupancy):
+        raise RuntimeError(f"{where}: {len(free_cells)} free + {occupied} occupied cells"
+                           f" != {len(occupancy)}")
+    counts = [0] * len(occupancy)
+    for index in engine.snake.indices():
+        counts[index] += 1
+    if counts != occupancy:
+        raise RuntimeError(f"{where}: occupancy does not match the snake body")
+    if any(free_slot[index] >= 0 for index, count in enumerate(occupancy) if count):
+        raise RuntimeError(f"{where}: an occupied cell is still in free_cells")
+
+
+def headless_run(games=3, seed=0, check_every=250):
+    """Play a few seeded games with the BFS autopilot; return (ticks, scores).
+
+    The free-cell index is checked every `check_every` ticks and at the end of each game.
+    """
+    sys.path.insert(0, ROOT)
+    from snake_engine import SnakeEngine
+    from autopilot import BfsAutopilot
+
+    engine = SnakeEngine(40, 30, seed=seed)
+    pilot = BfsAutopilot()
+    ticks = 0
+    scores = []
+    for _ in range(games):
+        engine.reset()
+        pilot.reset()
+        while engine.step(pilot.next_direction(engine)):
+            ticks += 1
+            if ticks > 1000000:
+                raise RuntimeError("headless game did not terminate")
+            if engine.ticks % check_every == 0:
+                check_free_cells(engine, f"tick {engine.ticks}")
+        check_free_cells(engine, f"end of game at tick {engine.ticks}")
+        scores.append(engine.score)
+    return ticks, scores
+
+
+def hamiltonian_check(boards=((10, 8), (12, 10)), seeds=5, odd_board=(9, 9), odd_ticks=200):
+    """Play infinite-mode games with HamiltonianAutopilot until the board is full.
+
+    Every game must end in a win (a full board), so shortcuts never kill the
+    snake; some moves must actually be shortcuts. On an odd x odd board there
+    is no cycle and the autopilot must search with BFS instead.
+    Returns (games won, shortcuts taken).
+    """
+    sys.path.insert(0, ROOT)
+    from snake_engine import SnakeEngine
+    from autopilot import HamiltonianAutopilot
+
+    won = shortcuts = 0
+    for width, height in boards:
+        for seed in range(seeds):
+            engine = SnakeEngine(width, height, seed=seed, infinite_mode=True)
+            engine.reset()
+            pilot = HamiltonianAutopilot()
+            while not engine.game_over:
+                direction = pilot.next_direction(engine)
+                head = engine.snake.head
+                following = pilot.cycle[(pilot.order[head] + 1) % len(pilot.cycle)]
+                engine.step(direction)
+                if pilot.aligned and not engine.game_over and engine.snake.head != following:
+                    shortcuts += 1
+                if engine.ticks > 100 * width * height:
+                    raise RuntimeError(f"{width}x{height} seed {seed} did not finish")
+            if not engine.wingame or len(engine.snake) < width * height:
+                raise RuntimeError(f"{width}x{height} seed {seed} died at tick {engine.ticks} "
+                                   f"with length {len(engine.snake)}")
+            won += 1
+    if not shortcuts:
+        raise RuntimeError("no shortcut was taken")
+
+    width, height = odd_board
+    engine = SnakeEngine(width, height, seed=0)
+    engine.reset()
+    pilot = HamiltonianAutopilot()
+    for _ in range(odd_ticks):
+        if not engine.step(pilot.next_direction(engine)):
+            break
+    if pilot.cycle is not None or not pilot.searches:
+        raise RuntimeError(f"{width}x{height} board did not fall back to BFS")
+    return won, shortcuts
+
+
+def batch_lockstep_check(boards=((40, 30, False, 4), (12, 10, False, 3), (16, 12, True, 2)),
+                         max_ticks=5000):
+    """Drive BatchSnakeEnv and one SnakeEngine per game with the same BFS moves.
+
+    The batch copies food and bean positions from the engines after every
+    step (the two use different random generators); body, score and the end
+    of each game must then agree.  Returns the number of games compared.
+    """
+    sys.path.insert(0, ROOT)
+    import numpy as np
+    from snake_engine import SnakeEngine, DIRECTIONS
+    from autopilot import BfsAutopilot
+    from batch_env import BatchSnakeEnv
+
+    def cell(pos, width):
+        return -1 if pos is None else pos[1] * width + pos[0]
+
+    compared = 0
+    for width, height, infinite, games in boards:
+        engines = []
+        for seed in range(games):
+            engine = SnakeEngine(width, height, seed=seed, infinite_mode=infinite)
+            engine.reset()
+            engines.append(engine)
+        pilots = [BfsAutopilot() for _ in engines]
+        env = BatchSnakeEnv(games, width, height, seed=0, infinite_mode=infinite)
+        env.food[:] = [cell(e.food_pos, width) for e in engines]
+        env.bean[:] = [cell(e.power_bean_pos, width) for e in engines]
+        live = set(range(games))
+        for _ in range(max_ticks):
+            if not live:
+                break
+            actions = np.full(games, -1)
+            for i in live:
+                direction = pilots[i].next_direction(engines[i])
+                if direction is not None:
+                    actions[i] = DIRECTIONS.index(direction)
+                engines[i].step(direction)
+            _, finished = env.step(actions)
+            for i in sorted(live):
+                engine = engines[i]
+                label = f"{width}x{height} seed {i} tick {engine.ticks}"
+                if bool(finished[i]) != engine.game_over:
+                    raise RuntimeError(f"{label}: batch done={bool(finished[i])}, engine game_over={engine.game_over}")
+                if engine.game_over:
+                    if (env.final_score[i], env.final_length[i], bool(env.final_won[i])) != (
+                            engine.score, len(engine.snake), engine.wingame):
+                        raise RuntimeError(f"{label}: final score/length/win differ")
+                    live.discard(i)
+                    compared += 1
+                    continue
+                length = int(env.length[i])
+                body = env.body[i, (env.tail_ptr[i] + np.arange(length)) % env.capacity][::-1]
+                if body.tolist() != list(engine.snake.indices()) or env.score[i] != engine.score:
+                    raise RuntimeError(f"{label}: body or score differ")
+                env.food[i] = cell(engine.food_pos, width)
+                env.bean[i] = cell(engine.power_bean_pos, width)
+        compared += len(live)
+    return compared
+
+
+def arena_check(ticks=300):
+    """Check the multi-snake arena: a head-on collision kills both snakes, the
+    shared occupancy grid and free-cell index always equal the sum of the
+    bodies, and a crowded board keeps food_count food items.
+
+    Returns the number of deaths in the crowded run.
+    """
+    sys.path.insert(0, ROOT)
+    from collections import Counter
+    from arena import SnakeArena, SPAWN_LENGTH
+
+    # Two human snakes meet head-on in column 4
+    arena = SnakeArena(9, 3, seed=0, food_count=0, respawn=False)
+    left = arena.add_snake(bot=False)
+    right = arena.add_snake(bot=False)
+    for snake in (left, right):
+        if len(set(snake.snake.indices())) != SPAWN_LENGTH:
+            raise RuntimeError("a snake spawned with stacked segments on an empty board")
+        arena.kill(snake)
+    arena.spawn(left, [12, 11, 10, 9], (1, 0))
+    arena.spawn(right, [14, 15, 16, 17], (-1, 0))
+    dead = arena.step()
+    if set(dead) != {left, right} or arena.head_ons != 2:
+        raise RuntimeError(f"head-on collision killed {len(dead)} snakes, counted {arena.head_ons}")
+    if any(arena.occupancy) or len(arena.free_cells) != 27:
+        raise RuntimeError("dead snakes left cells occupied")
+
+    # A crowded board: so much food that random probes often land on items
+    arena = SnakeArena(12, 12, seed=1, food_count=60, max_beans=5)
+    for _ in range(8):
+        arena.add_snake()
+    cells = arena.grid_width * arena.grid_height
+    for tick in range(ticks):
+        arena.step()
+        counts = Counter()
+        for snake in arena.snakes:
+            for view in snake.snake.views():
+                counts.update(view)
+        if any(arena.occupancy[i] != counts[i] for i in range(cells)):
+            raise RuntimeError(f"occupancy differs from the snake bodies at tick {tick}")
+        free = [i for i in range(cells) if not counts[i]]
+        if sorted(arena.free_cells) != free or any(arena.free_slot[i] != k
+                                                   for k, i in enumerate(arena.free_cells)):
+            raise RuntimeError(f"free-cell index is inconsistent at tick {tick}")
+        empty = sum(1 for i in free if not arena.items[i])
+        if arena.foods != arena.food_count and empty:
+            raise RuntimeError(f"{arena.foods} food items at tick {tick} with {empty} empty cells")
+    return arena.deaths
+
+
+def tournament_check(seeds=2):
+    """Run a tiny tournament under spawn with a strategy added by register_strategy().
+
+    Spawned workers do not inherit the registration, so this fails with a KeyError
+    unless the pool passes registered strategies to its workers. Both output formats
+    must hold one row per game, and the printed percentiles must match the rows.
+    Returns the scores of the games.
+    """
+    sys.path.insert(0, ROOT)
+    import tournament
+
+    tournament.register_strategy("smoke-bfs", "autopilot:BfsAutopilot")
+    scores = None
+    with tempfile.TemporaryDirectory() as tmp:
+        for ext in (".csv", ".jsonl"):
+            path = os.path.join(tmp, "results" + ext)
+            stdout = io.StringIO()
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(io.StringIO()):
+                tournament.main(["--strategies", "smoke-bfs", "--sizes", "12x10",
+                                 "--seeds", str(seeds), "--workers", "2",
+                                 "--start-method", "spawn", "--output", path])
+            with open(path, newline="") as f:
+                if ext == ".csv":
+                    rows = list(csv.DictReader(f))
+                else:
+                    rows = [json.loads(line) for line in f]
+            if len(rows) != seeds or sorted(int(r["seed"]) for r in rows) != list(range(seeds)):
+                raise RuntimeError(f"{ext}: expected one row per seed, got {rows}")
+            if set(rows[0]) != set(tournament.FIELDS) or any(r["strategy"] != "smoke-bfs" for r in rows):
+                raise RuntimeError(f"{ext}: unexpected row {rows[0]}")
+            row_scores = sorted(int(r["score"]) for r in rows)
+            if scores is not None and row_scores != scores:
+                raise RuntimeError(f"{ext}: scores {row_scores} differ from {scores}")
+            scores = row_scores
+            # One summary line: strategy, board, games, win %, then score p50/p90/p99.
+            line = next(l for l in stdout.getvalue().splitlines() if l.split()[0] == "smoke-bfs")
+            expected = [str(tournament.percentile(scores, p)) for p in tournament.PERCENTILES]
+            if line.split()[4:7] != expected:
+                raise RuntimeError(f"{ext}: score percentiles {line.split()[4:7]}, expected {expected}")
+    return scores
+
+
+def replay_check(seed=3):
+    """Record a seeded autopilot game, decode the recording and replay it;
+    the replay must end in the same state as the recorded game.
+
+    Returns (ticks, bytes) of the recording.
+    """
+    sys.path.insert(0, ROOT)
+    from snake_engine import SnakeEngine
+    from autopilot import BfsAutopilot
+    from recording import GameRecorder, Recording, replay
+
+    engine = SnakeEngine(40, 30, seed=seed)
+    engine.reset()
+    recorder = GameRecorder(40, 30, seed)
+    pilot = BfsAutopilot()
+    while not engine.game_over:
+        tick = engine.ticks
+        direction = engine.direction
+        engine.step(pilot.next_direction(engine))
+        recorder.record_step(tick, direction, engine.direction)
+        if engine.ticks > 1000000:
+            raise RuntimeError("recorded game did not terminate")
+    data = recorder.finish(engine.ticks, engine.score)
+
+    replayed = replay(Recording.from_bytes(data))
+    if (replayed.ticks, replayed.score) != (engine.ticks, engine.score):
+        raise RuntimeError(f"replay ended at tick {replayed.ticks} with score {replayed.score}, "
+                           f"recorded tick {engine.ticks} with score {engine.score}")
+    if replayed.snapshot() != engine.snapshot():
+        raise RuntimeError("replay ended in a different state")
+    return engine.ticks, len(data)
+
+
+def spectator_delta_check(seed=5):
+    """Play a seeded game, encode its events as spectator delta frames and
+    apply them to a mirror started from a keyframe; after every tick the
+    mirror must match the engine.
+
+    Returns (ticks, bytes) of delta payload.
+    """
+    sys.path.insert(0, ROOT)
+    from snake_engine import SnakeEngine
+    from autopilot import BfsAutopilot
+    from spectator import SpectatorClient, MSG_KEYFRAME, MSG_DELTA, encode_delta
+
+    engine = SnakeEngine(40, 30, seed=seed)
+    engine.events = []
+    engine.reset()
+    engine.events.clear()
+    client = SpectatorClient()
+    client.apply(MSG_KEYFRAME, 0, engine.ticks, engine.snapshot(include_rng=False))
+    mirror = client.mirrors[0]
+    pilot = BfsAutopilot()
+    size = 0
+    while not engine.game_over:
+        engine.step(pilot.next_direction(engine))
+        payload = encode_delta(engine.events, engine.grid_width)
+        engine.events.clear()
+        size += len(payload)
+        client.apply(MSG_DELTA, 0, engine.ticks, payload)
+        if (mirror.ticks != engine.ticks or list(mirror.snake) != list(engine.snake)
+                or mirror.occupancy != engine.occupancy or mirror.food_pos != engine.food_pos
+                or mirror.power_bean_pos != engine.power_bean_pos or mirror.score != engine.score):
+            raise RuntimeError(f"mirror diverged from the game at tick {engine.ticks}")
+        if engine.ticks > 1000000:
+            raise RuntimeError("game did not terminate")
+    return engine.ticks, size
+
+
+def render_check(rounds=8, frames=40, seed=3):
+    """Compare incremental frames with a full redraw of the same state.
+
+    tanchishe.py is driven through bench_game.py's stub screen (dummy SDL driver).
+    After `frames` incremental frames the screen is captured, a full repaint is
+    forced and every board cell outside the HUD text is compared. Body cells only
+    have to hold a body-gradient tile in both images, since the incremental
+    renderer keeps old segment colours until its periodic full repaint.
+    Returns (cells compared, game ticks played).
+    """
+    sys.path.insert(0, ROOT)
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        import pygame
+        import bench_game
+        bench_game.install_stubs()
+    from bench_game import game
+    from snake_engine import SnakeEngine
+
+    engine = SnakeEngine(game.GRID_WIDTH, game.GRID_HEIGHT, seed=seed)
+    engine.reset()
+    bench_game.start_game(engine)
+    game.incremental_mode = True
+    engine.events = []
+    display = pygame.display.get_surface()
+    size = game.CELL_SIZE
+    body_tiles = {bytes(color) * (size * size)
+                  for color in game.get_color_gradient(game.snake_color_index)[1]}
+
+    def capture():
+        return {(x, y): pygame.image.tostring(display.subsurface((x * size, y * size, size, size)), "RGB")
+                for y in range(game.VIEW_ROWS) for x in range(game.VIEW_COLUMNS)}
+
+    compared = 0
+    try:
+        game.draw()
+        for _ in range(rounds):
+            for _ in range(frames):
+                game.update(game.TICK_SECONDS)
+                game.draw()
+            if engine.game_over or not game.frames_since_full_repaint:
+                raise RuntimeError(f"no incremental frame to compare at tick {engine.ticks}")
+            incremental = capture()
+            hud = [rect for _, rect in game.hud_drawn]
+            game.full_repaint_needed = True
+            game.draw()
+            full = capture()
+            hud += [rect for _, rect in game.hud_drawn]
+            head = engine.snake[0]
+            for (x, y), pixels in incremental.items():
+                if pygame.Rect(x * size, y * size, size, size).collidelist(hud) != -1:
+                    continue
+                if engine.is_occupied((x, y)) and (x, y) != head:
+                    same = pixels in body_tiles and full[(x, y)] in body_tiles
+                else:
+                    same = pixels == full[(x, y)]
+                if not same:
+                    raise RuntimeError(f"cell {(x, y)} differs from a full redraw at tick {engine.ticks}")
+                compared += 1
+    finally:
+        game.incremental_mode = False
+        engine.events = None
+    return compared, engine.ticks
+
+
+def snapshot_roundtrip_check(seed=2, split=400):
+    """Snapshot a seeded game mid-way, restore it (in memory and through a file)
+    and play both copies to the end; they must finish in the same state.
+
+    Returns (ticks, score) of the finished game.
+    """
+    sys.path.insert(0, ROOT)
+    from snake_engine import SnakeEngine
+    from autopilot import BfsAutopilot
+
+    engine = SnakeEngine(40, 30, seed=seed)
+    engine.reset()
+    pilot = BfsAutopilot()
+    for _ in range(split):
+        engine.step(pilot.next_direction(engine))
+    if engine.game_over:
+        raise RuntimeError("game ended before the snapshot")
+
+    restored = SnakeEngine.from_snapshot(engine.snapshot())
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "roundtrip.snks")
+        engine.save(path)
+        loaded = SnakeEngine(10, 10)
+        loaded.load(path)
+
+    finals = []
+    for copy in (engine, restored, loaded):
+        pilot = BfsAutopilot()
+        while copy.step(pilot.next_direction(copy)):
+            if copy.ticks > 1000000:
+                raise RuntimeError("restored game did not terminate")
+        finals.append(copy.snapshot())
+    if finals[1] != finals[0] or finals[2] != finals[0]:
+        raise RuntimeError("restored game diverged from the original")
+    return engine.ticks, engine.score
+
+
+def lookahead_check(seed=4):
+    """Check clone() independence and journaled step()/undo() on a seeded game.
+
+    Returns the number of ticks played before the checks.
+    """
+    sys.path.insert(0, ROOT)
+    from snake_engine import SnakeEngine, DOWN, UP
+    from autopilot import BfsAutopilot
+
+    engine = SnakeEngine(40, 30, seed=seed)
+    engine.reset()
+    pilot = BfsAutopilot()
+    for _ in range(300):
+        engine.step(pilot.next_direction(engine))
+    if engine.game_over:
+        raise RuntimeError("game ended before the lookahead checks")
+
+    # A clone and the original must not affect each other.
+    before = engine.snapshot()
+    clone = engine.clone()
+    for _ in range(20):
+        clone.step(pilot.next_direction(clone))
+    if engine.snapshot() != before:
+        raise RuntimeError("stepping a clone changed the original")
+    moved = clone.snapshot()
+    engine.step(UP if engine.direction != DOWN else DOWN)
+    if clone.snapshot() != moved:
+        raise RuntimeError("stepping the original changed a clone")
+
+    # Clones replay the same moves to the same state, including the RNG.
+    first, second = engine.clone(), engine.clone()
+    pilot.reset()
+    for _ in range(200):
+        direction = pilot.next_direction(first)
+        first.step(direction)
+        second.step(direction)
+    if first.snapshot() != second.snapshot():
+        raise RuntimeError("two clones given the same moves diverged")
+
+    # Journaled steps undo back to the exact starting state.
+    before = engine.snapshot()
+    engine.journal = []
+    pilot.reset()
+    for _ in range(200):
+        if not engine.step(pilot.next_direction(engine)):
+            break
+    while engine.journal:
+        engine.undo()
+    if engine.snapshot() != before:
+        raise RuntimeError("undo() did not restore the snapshot")
+    check_free_cells(engine, "after undo()")
+    return engine.ticks
+
+
+def background_plans_check(size=300, ticks=4000, seed=1):
+    """Play a large board with the background autopilot and count used results.
+
+    Each search is planned from where the head will be when it finishes, so most
+    results must be used rather than discarded as stale. The short sleep per tick
+    stands in for frame pacing and gives the worker CPU time on one core.
+    Returns (submitted, used, discarded).
+    """
+    sys.path.insert(0, ROOT)
+    from snake_engine import SnakeEngine
+    from autopilot import BackgroundAutopilot
+
+    engine = SnakeEngine(size, size, seed=seed, infinite_mode=True)
+    engine.reset()
+    pilot = BackgroundAutopilot(wait=0)
+    try:
+        pilot.warm_up(engine)
+        for _ in range(ticks):
+            if not engine.step(pilot.next_direction(engine)):
+                break
+            time.sleep(0.0002)
+    finally:
+        pilot.close()
+    if pilot.used < 5 or pilot.used < 2 * pilot.discarded:
+        raise RuntimeError(f"{pilot.used} of {pilot.submitted} plans used, {pilot.discarded} discarded")
+    return pilot.submitted, pilot.used, pilot.discarded
+
+
+def background_fallback_check(ticks=200):
+    """Break the background autopilot's worker pool and check the game keeps moving.
+
+    The pool is broken once before the first search is submitted and once while
+    it is queued. The game must then play `ticks` more ticks.
+    Returns the total ticks played in each case.
+    """
+    sys.path.insert(0, ROOT)
+    from snake_engine import SnakeEngine
+    from autopilot import BackgroundAutopilot
+
+    played = []
+    for break_first in (True, False):
+        engine = SnakeEngine(120, 100, seed=1, infinite_mode=True)
+        engine.reset()
+        pilot = BackgroundAutopilot()
+        pilot.warm_up(engine)
+        crash = pilot.executor.submit(os._exit, 1)
+        if break_first:
+            wait((crash,))
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            engine.step(pilot.next_direction(engine))  # submits the first search
+            wait((crash,))
+            for _ in range(ticks):
+                if not engine.step(pilot.next_direction(engine)):
+                    break
+        pilot.close()
+        if pilot.sync_cells is not None:
+            raise RuntimeError(f"no fallback after {engine.ticks} ticks (break_first={break_first})")
+        if engine.game_over:
+            raise RuntimeError(f"game stopped at tick {engine.ticks} (break_first={break_first})")
+        if stderr.getvalue().count("Background pathfinding failed") != 1:
+            raise RuntimeError(f"expected one fallback warning, got {stderr.getvalue()!r}")
+        played.append(engine.ticks)
+    return played
+
+
 def main():
     if not os.path.exists(GAME_FILE):
         print(f"ERROR: {GAME_FILE} not found.")
@@ -70,6 +635,12 @@ def main():
     if not ok:
         print("[FAIL] Syntax check failed:", err)
         sys.exit(1)
+    for name in HELPER_MODULES:
+        path = os.path.join(ROOT, name)
+        ok, err = syntax_check(read_source(path), path)
+        if not ok:
+            print(f"[FAIL] Syntax check failed for {name}:", err)
+            sys.exit(1)
     print("[OK] Syntax check passed.")
 
     missing, has_pgzrun = ast_checks(src)
@@ -91,6 +662,90 @@ def main():
     else:
         print("[INFO] No font file literals found in source.")
 
+    try:
+        ticks, scores = headless_run()
+    except Exception as e:
+        print("[FAIL] Headless run failed:", e)
+        sys.exit(1)
+    print(f"[OK] Headless run: {len(scores)} games, {ticks} ticks, scores {scores}.")
+
+    try:
+        won, shortcuts = hamiltonian_check()
+    except Exception as e:
+        print("[FAIL] Hamiltonian autopilot check failed:", e)
+        sys.exit(1)
+    print(f"[OK] Hamiltonian autopilot: {won} boards filled with {shortcuts} shortcuts; 9x9 falls back to BFS.")
+
+    try:
+        games = batch_lockstep_check()
+    except Exception as e:
+        print("[FAIL] Batch environment check failed:", e)
+        sys.exit(1)
+    print(f"[OK] Batch environment: {games} games match SnakeEngine tick for tick.")
+
+    try:
+        deaths = arena_check()
+    except Exception as e:
+        print("[FAIL] Arena check failed:", e)
+        sys.exit(1)
+    print(f"[OK] Arena: head-on collision, shared occupancy and food count hold ({deaths} deaths).")
+
+    try:
+        scores = tournament_check()
+    except Exception as e:
+        print("[FAIL] Tournament check failed:", e)
+        sys.exit(1)
+    print(f"[OK] Tournament: spawned workers ran a registered strategy, scores {scores}.")
+
+    try:
+        ticks, size = replay_check()
+    except Exception as e:
+        print("[FAIL] Replay check failed:", e)
+        sys.exit(1)
+    print(f"[OK] Replay: a {size}-byte recording reproduces all {ticks} ticks.")
+
+    try:
+        ticks, size = spectator_delta_check()
+    except Exception as e:
+        print("[FAIL] Spectator delta check failed:", e)
+        sys.exit(1)
+    print(f"[OK] Spectator: {size} bytes of delta frames mirror all {ticks} ticks.")
+
+    try:
+        compared, ticks = render_check()
+    except Exception as e:
+        print("[FAIL] Rendering check failed:", e)
+        sys.exit(1)
+    print(f"[OK] Rendering: incremental frames match a full redraw ({compared} cells over {ticks} ticks).")
+
+    try:
+        ticks, score = snapshot_roundtrip_check()
+    except Exception as e:
+        print("[FAIL] Snapshot round trip failed:", e)
+        sys.exit(1)
+    print(f"[OK] Snapshot round trip: restored games finish at tick {ticks}, score {score}.")
+
+    try:
+        ticks = lookahead_check()
+    except Exception as e:
+        print("[FAIL] Lookahead check failed:", e)
+        sys.exit(1)
+    print(f"[OK] Lookahead: clones diverge independently and undo() restores tick {ticks}.")
+
+    try:
+        submitted, used, discarded = background_plans_check()
+    except Exception as e:
+        print("[FAIL] Background autopilot plans check failed:", e)
+        sys.exit(1)
+    print(f"[OK] Background autopilot: {used} of {submitted} plans used ({discarded} discarded).")
+
+    try:
+        played = background_fallback_check()
+    except Exception as e:
+        print("[FAIL] Background autopilot fallback failed:", e)
+        sys.exit(1)
+    print(f"[OK] Background autopilot fell back to in-loop search after a broken pool ({played} ticks).")
+
     print("Smoke test completed successfully.")
     sys.exit(0)
 
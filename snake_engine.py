@@ -0,0 +1,677 @@
+'''
+贪吃蛇无界面模拟核心
+
+SnakeEngine 保存一局游戏的全部状态（蛇身、方向、食物、能量豆、分数等），
+不依赖 pgzero 的 screen / keyboard，可以脱离窗口和帧率限制全速运行：
+
+    engine = SnakeEngine(40, 30, seed=1)
+    engine.reset()
+    while engine.step(RIGHT):
+        pass
+
+tanchishe.py 中的 update() / draw() 只是这个类的薄适配层。
+
+蛇身保存在 SnakeBody 环形缓冲区中（格子下标，每节 4 字节；snake[0] 是蛇头），
+另外维护一个扁平的占用网格 occupancy：
+occupancy[y * grid_width + x] 是该格子上蛇身节点的数量（能量豆会在尾部追加重复节点，
+所以用计数而不是布尔值）。每次移动、增长只增量更新头尾两个格子，
+碰撞检测和食物放置都是 O(1)，与蛇的长度无关。
+
+空格子另外保存在稠密数组 free_cells 中，free_slot 记录每个格子在数组里的位置，
+格子被占用时与末尾元素交换后删除。食物和能量豆从 free_cells 中均匀抽取，
+无论棋盘多满都是 O(1)；没有空格子时即判定棋盘已被填满。
+
+entry_tick[index] 记录蛇头最近一次进入该格子时的节拍数，被占用格子上的节点序号
+（0 为蛇头）就是 ticks - entry_tick[index]。大棋盘的视野渲染据此只扫描可见的格子，
+不必遍历整条蛇。所有每步操作都与棋盘面积无关，只有 reset() 等整局操作是 O(格子数)。
+
+把 engine.events 设为列表即可开启事件记录：每一步的变化（新蛇头、移走的蛇尾、
+食物/能量豆移动、分数）按顺序追加进去，增量渲染等使用者读完后自行清空。
+默认是 None，不记录，无界面模拟不受影响。
+
+clone() 复制整局状态（含随机数状态），副本与原引擎互不影响，但要复制整个网格，是 O(格子数)。
+前瞻搜索改在同一个引擎上试走再撤销：把 engine.journal 设为列表，step() 每步追加一条撤销记录，
+undo() 撤销最近一步，都是 O(1)（吃到食物的那一步另存一次随机数状态）。
+snapshot() / restore() 把状态编码成紧凑的 bytes，可写入磁盘暂停后继续：
+蛇身按从蛇尾到蛇头的相对方向每节 2 位打包，能量豆留在尾部的重复节点只记一个数；
+食物、能量豆为格子下标，另有分数、节拍数、标志位，以及可选的种子和随机数状态。
+'''
+import random
+import struct
+from array import array
+
+# 方向常量
+UP = (0, -1)
+DOWN = (0, 1)
+LEFT = (-1, 0)
+RIGHT = (1, 0)
+DIRECTIONS = (UP, DOWN, LEFT, RIGHT)
+OPPOSITE = {UP: DOWN, DOWN: UP, LEFT: RIGHT, RIGHT: LEFT}
+
+# 规则常量
+WIN_LENGTH = 100  # 蛇长达到100即胜利（无限模式除外）
+FOOD_SCORE = 10
+POWER_BEAN_SCORE = 50
+POWER_BEAN_SPAWN_CHANCE = 0.3  # 每次生成食物时，30%概率同时生成能量豆
+
+# 事件类型（engine.events 开启时记录）
+EVENT_RESET = 'reset'  # (EVENT_RESET,) 新的一局
+EVENT_HEAD = 'head'  # (EVENT_HEAD, 新蛇头位置)
+EVENT_TAIL = 'tail'  # (EVENT_TAIL, 移走的尾节点位置)
+EVENT_FOOD = 'food'  # (EVENT_FOOD, 旧位置, 新位置)
+EVENT_BEAN = 'bean'  # (EVENT_BEAN, 旧位置, 新位置)，被吃掉时新位置为 None
+EVENT_SCORE = 'score'  # (EVENT_SCORE, 新分数)
+
+# 快照格式
+SNAPSHOT_MAGIC = b"SNKS"
+SNAPSHOT_VERSION = 1
+# magic, 版本, 宽, 高, 分数, 最高分, 节拍数, 标志, 食物, 能量豆, 蛇长, 蛇尾格子, 尾部重复节点数, 种子
+SNAPSHOT_HEADER = struct.Struct("<4sBHHIIIBiiIIHQ")
+SNAPSHOT_RNG = struct.Struct("<625I?d")  # Mersenne Twister 状态（624 字 + 位置）和 gauss 缓存
+FLAG_GAME_OVER = 0x01
+FLAG_WINGAME = 0x02
+FLAG_INFINITE = 0x04
+FLAG_HAS_SEED = 0x08
+FLAG_HAS_RNG = 0x10
+DIRECTION_SHIFT = 5  # 标志字节高位存当前方向的序号
+
+
+class SnakeBody:
+    """蛇身的环形缓冲区：array('I') 中按从蛇尾到蛇头的顺序存放格子下标，每节 4 字节
+
+    容量是 2 的幂，满了才翻倍（整段复制一次，均摊 O(1)）；蛇头进、蛇尾出都只移动下标。
+    作为只读序列时与原来的 deque 相同：body[0] 是蛇头、body[-1] 是蛇尾，元素和迭代都是 (x, y)。
+    热路径改用按格子下标的接口：head / tail、push_head() / pop_tail() / push_tail()，
+    以及 views()：按从蛇尾到蛇头的顺序返回一到两段 memoryview，直接读缓冲区，不复制。
+    """
+    __slots__ = ("width", "cells", "mask", "start", "length")
+
+    def __init__(self, width, indices=(), capacity=16):
+        """indices 为蛇头在前的格子下标序列"""
+        indices = list(indices)
+        while capacity < len(indices):
+            capacity *= 2
+        self.width = width
+        self.cells = array("I", bytes(4 * capacity))
+        self.mask = capacity - 1
+        self.start = 0  # 蛇尾在缓冲区中的位置
+        self.length = len(indices)
+        self.cells[:self.length] = array("I", reversed(indices))
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, i):
+        length = self.length
+        if i < 0:
+            i += length
+        if not 0 <= i < length:
+            raise IndexError("snake segment index out of range")
+        index = self.cells[(self.start + length - 1 - i) & self.mask]
+        return (index % self.width, index // self.width)
+
+    def __iter__(self):
+        """从蛇头到蛇尾依次给出 (x, y)"""
+        width = self.width
+        cells = self.cells
+        mask = self.mask
+        end = self.start + self.length - 1
+        for k in range(end, self.start - 1, -1):
+            index = cells[k & mask]
+            yield (index % width, index // width)
+
+    def __reversed__(self):
+        """从蛇尾到蛇头依次给出 (x, y)"""
+        width = self.width
+        for view in self.views():
+            for index in view:
+                yield (index % width, index // width)
+
+    def index_at(self, i):
+        """第 i 节（0 为蛇头，负数从蛇尾数起）的格子下标"""
+        length = self.length
+        if i < 0:
+            i += length
+        if not 0 <= i < length:
+            raise IndexError("snake segment index out of range")
+        return self.cells[(self.start + length - 1 - i) & self.mask]
+
+    @property
+    def head(self):
+        return self.cells[(self.start + self.length - 1) & self.mask]
+
+    @property
+    def tail(self):
+        return self.cells[self.start]
+
+    def push_head(self, index):
+        """蛇头前进到格子 index"""
+        if self.length > self.mask:
+            self._grow()
+        self.cells[(self.start + self.length) & self.mask] = index
+        self.length += 1
+
+    def pop_head(self):
+        """移走蛇头，返回它的格子下标（撤销 push_head）"""
+        self.length -= 1
+        return self.cells[(self.start + self.length) & self.mask]
+
+    def pop_tail(self):
+        """移走蛇尾，返回它的格子下标"""
+        index = self.cells[self.start]
+        self.start = (self.start + 1) & self.mask
+        self.length -= 1
+        return index
+
+    def push_tail(self, index):
+        """在蛇尾之后追加一节（能量豆复制尾节点）"""
+        if self.length > self.mask:
+            self._grow()
+        self.start = (self.start - 1) & self.mask
+        self.cells[self.start] = index
+        self.length += 1
+
+    def _grow(self):
+        cells = array("I", bytes(8 * (self.mask + 1)))
+        length = self.length
+        cells[:length] = array("I", self.tobytes())
+        self.cells = cells
+        self.mask = 2 * self.mask + 1
+        self.start = 0
+
+    def views(self):
+        """从蛇尾到蛇头的格子下标，一到两段 memoryview（零拷贝，缓冲区扩容或修改后失效）"""
+        start = self.start
+        end = start + self.length
+        buffer = memoryview(self.cells)
+        if end <= self.mask + 1:
+            return (buffer[start:end],)
+        return (buffer[start:], buffer[:end - self.mask - 1])
+
+    def indices(self):
+        """从蛇头到蛇尾依次给出格子下标"""
+        cells = self.cells
+        mask = self.mask
+        for k in range(self.start + self.length - 1, self.start - 1, -1):
+            yield cells[k & mask]
+
+    def tobytes(self):
+        """从蛇尾到蛇头的格子下标，打包成 bytes"""
+        return b"".join(view.tobytes() for view in self.views())
+
+    def __eq__(self, other):
+        if not isinstance(other, SnakeBody):
+            return NotImplemented
+        return self.length == other.length and self.tobytes() == other.tobytes()
+
+    def copy(self):
+        other = SnakeBody.__new__(SnakeBody)
+        other.width = self.width
+        other.cells = array("I", self.cells)
+        other.mask = self.mask
+        other.start = self.start
+        other.length = self.length
+        return other
+
+    def clear(self):
+        self.start = 0
+        self.length = 0
+
+
+def _cell_code(size):
+    """快照中格子下标的 struct 类型：能放进 16 位就用 H"""
+    return "H" if size <= 0x10000 else "I"
+
+
+class SnakeEngine:
+    """一局贪吃蛇的状态与规则，使用独立的随机数生成器，结果可按种子复现"""
+
+    def __init__(self, grid_width=40, grid_height=30, seed=None, infinite_mode=False):
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.infinite_mode = infinite_mode
+        self.power_bean_spawn_chance = POWER_BEAN_SPAWN_CHANCE
+        self.high_score = 0
+
+        self.snake = SnakeBody(grid_width)
+        size = grid_width * grid_height
+        self.occupancy = [0] * size  # 每个格子上的蛇身节点数
+        self.free_cells = list(range(size))  # 空格子下标（无序）
+        # 格子下标 -> 在 free_cells 中的位置，-1 表示被占用；复制 free_cells 以共用整数对象，
+        # 大棋盘（如 2000x2000）上省下一百多 MB
+        self.free_slot = self.free_cells[:]
+        self.entry_tick = [0] * size  # 格子下标 -> 蛇头进入该格子时的节拍数
+        self.direction = RIGHT
+        self.food_pos = None
+        self.power_bean_pos = None
+        self.score = 0
+        self.ticks = 0  # 已推进的移动节拍数
+        self.game_over = False
+        self.wingame = False
+        self.events = None  # 事件记录列表；None 表示不记录
+        self.journal = None  # 撤销记录列表（见 undo()）；None 表示不记录
+
+    def reset(self, seed=None):
+        """重置为新的一局；给出 seed 时重新设定随机数种子"""
+        if seed is not None:
+            self.seed = seed
+            self.rng.seed(seed)
+
+        # 空格子数组按下标顺序重建：free_cells 的排列影响食物位置，
+        # 必须与上一局无关，同一个种子才能在任何引擎上复现同一局
+        size = self.grid_width * self.grid_height
+        self.occupancy = occupancy = [0] * size
+        self.free_cells = list(range(size))
+        self.free_slot = self.free_cells[:]
+        self.entry_tick = entry_tick = [0] * size
+        width = self.grid_width
+
+        # 初始化蛇：头部在中间，加上3节身体
+        center_x = self.grid_width // 2
+        center_y = self.grid_height // 2
+        self.snake = SnakeBody(width, (center_y * width + center_x - i for i in range(4)))
+        for i, index in enumerate(self.snake.indices()):
+            if not occupancy[index]:
+                self._claim(index)
+            occupancy[index] += 1
+            entry_tick[index] = -i
+
+        self.direction = RIGHT
+        self.score = 0
+        self.ticks = 0
+        self.game_over = False
+        self.wingame = False
+        self.power_bean_pos = None
+        if self.events is not None:
+            self.events.append((EVENT_RESET,))
+        if self.journal is not None:
+            self.journal.clear()  # 新的一局不能再撤销回上一局
+        self.generate_food()
+
+    def clone(self):
+        """复制整局状态（不含事件和撤销记录），副本与原引擎互不影响，随机数序列也相同
+
+        要复制整个网格，是 O(格子数)；逐步试走的前瞻搜索用 journal 和 undo()。
+        """
+        other = SnakeEngine.__new__(SnakeEngine)
+        other.grid_width = self.grid_width
+        other.grid_height = self.grid_height
+        other.seed = self.seed
+        other.rng = random.Random()
+        other.rng.setstate(self.rng.getstate())
+        other.infinite_mode = self.infinite_mode
+        other.power_bean_spawn_chance = self.power_bean_spawn_chance
+        other.high_score = self.high_score
+        other.snake = self.snake.copy()
+        other.occupancy = self.occupancy[:]
+        other.free_cells = self.free_cells[:]
+        other.free_slot = self.free_slot[:]
+        other.entry_tick = self.entry_tick[:]
+        other.direction = self.direction
+        other.food_pos = self.food_pos
+        other.power_bean_pos = self.power_bean_pos
+        other.score = self.score
+        other.ticks = self.ticks
+        other.game_over = self.game_over
+        other.wingame = self.wingame
+        other.events = None
+        other.journal = None
+        return other
+
+    def snapshot(self, include_rng=True):
+        """把当前状态编码成 bytes
+
+        include_rng 为 True 时附带随机数状态和 free_cells 的排列（约 2.5KB + 每个空格子
+        2 字节），恢复后的对局与原对局完全一致；为 False 时只保存局面本身。
+        """
+        width = self.grid_width
+        snake = self.snake
+        tail = snake.tail
+        # 能量豆带来的重复节点都在尾部
+        pending = 0
+        while pending + 1 < len(snake) and snake.index_at(-2 - pending) == tail:
+            pending += 1
+
+        flags = DIRECTIONS.index(self.direction) << DIRECTION_SHIFT
+        if self.game_over:
+            flags |= FLAG_GAME_OVER
+        if self.wingame:
+            flags |= FLAG_WINGAME
+        if self.infinite_mode:
+            flags |= FLAG_INFINITE
+        seed = self.seed if isinstance(self.seed, int) and 0 <= self.seed < 1 << 64 else None
+        if seed is not None:
+            flags |= FLAG_HAS_SEED
+        if include_rng:
+            flags |= FLAG_HAS_RNG
+        food = self.food_pos[1] * width + self.food_pos[0] if self.food_pos else -1
+        bean = self.power_bean_pos[1] * width + self.power_bean_pos[0] if self.power_bean_pos else -1
+        data = bytearray(SNAPSHOT_HEADER.pack(
+            SNAPSHOT_MAGIC, SNAPSHOT_VERSION, width, self.grid_height, self.score,
+            self.high_score, self.ticks, flags, food, bean, len(snake),
+            tail, pending, seed or 0))
+
+        # 从蛇尾往蛇头，每节相对前一节的方向占 2 位，每字节 4 节；重复的尾节点差为 0，跳过
+        step_index = {dy * width + dx: i for i, (dx, dy) in enumerate(DIRECTIONS)}
+        byte = 0
+        count = 0
+        previous = tail
+        for view in snake.views():
+            for index in view:
+                if index == previous:
+                    continue
+                byte |= step_index[index - previous] << (2 * count)
+                previous = index
+                count += 1
+                if count == 4:
+                    data.append(byte)
+                    byte = 0
+                    count = 0
+        if count:
+            data.append(byte)
+
+        if include_rng:
+            _, state, gauss = self.rng.getstate()
+            data += SNAPSHOT_RNG.pack(*state, gauss is not None, gauss or 0.0)
+            data += struct.pack(f"<{len(self.free_cells)}{_cell_code(width * self.grid_height)}",
+                                *self.free_cells)
+        return bytes(data)
+
+    def restore(self, data):
+        """从 snapshot() 的结果恢复状态（原地修改，网格大小可以不同）"""
+        (magic, version, width, height, score, high_score, ticks, flags, food, bean,
+         length, tail_index, pending, seed) = SNAPSHOT_HEADER.unpack_from(data)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError("not a snake snapshot (bad magic or version)")
+
+        # 从蛇尾沿打包的方向走到蛇头
+        x, y = tail_index % width, tail_index // width
+        cells = [tail_index] * (pending + 1)
+        offset = SNAPSHOT_HEADER.size
+        for k in range(length - 1 - pending):
+            dx, dy = DIRECTIONS[(data[offset + k // 4] >> (2 * (k % 4))) & 0x3]
+            x += dx
+            y += dy
+            if not (0 <= x < width and 0 <= y < height):
+                raise ValueError("corrupt snapshot: snake leaves the board")
+            cells.append(y * width + x)
+        offset += (length - 1 - pending + 3) // 4
+
+        self.grid_width = width
+        self.grid_height = height
+        size = width * height
+        self.occupancy = occupancy = [0] * size
+        self.free_cells = list(range(size))
+        self.free_slot = self.free_cells[:]
+        self.entry_tick = entry_tick = [0] * size
+        # cells 从蛇尾到蛇头：靠近蛇头的节点后写入，重复的尾节点记最靠近蛇头的那一节
+        for i, index in zip(range(len(cells) - 1, -1, -1), cells):
+            if not occupancy[index]:
+                self._claim(index)
+            occupancy[index] += 1
+            entry_tick[index] = ticks - i
+        cells.reverse()
+        self.snake = SnakeBody(width, cells)
+
+        self.direction = DIRECTIONS[flags >> DIRECTION_SHIFT]
+        self.food_pos = (food % width, food // width) if food >= 0 else None
+        self.power_bean_pos = (bean % width, bean // width) if bean >= 0 else None
+        self.score = score
+        self.high_score = high_score
+        self.ticks = ticks
+        self.game_over = bool(flags & FLAG_GAME_OVER)
+        self.wingame = bool(flags & FLAG_WINGAME)
+        self.infinite_mode = bool(flags & FLAG_INFINITE)
+        self.seed = seed if flags & FLAG_HAS_SEED else None
+        if flags & FLAG_HAS_RNG:
+            *state, has_gauss, gauss = SNAPSHOT_RNG.unpack_from(data, offset)
+            self.rng.setstate((3, tuple(state), gauss if has_gauss else None))
+            # 恢复原来的空格子排列，食物位置才会与原对局一致
+            free_cells = list(struct.unpack_from(
+                f"<{len(self.free_cells)}{_cell_code(size)}", data, offset + SNAPSHOT_RNG.size))
+            free_slot = [-1] * size
+            for slot, index in enumerate(free_cells):
+                if occupancy[index] or free_slot[index] >= 0:
+                    raise ValueError("corrupt snapshot: bad free cell list")
+                free_slot[index] = slot
+            self.free_cells = free_cells
+            self.free_slot = free_slot
+        if self.events is not None:
+            self.events.append((EVENT_RESET,))
+        if self.journal is not None:
+            self.journal.clear()
+
+    @classmethod
+    def from_snapshot(cls, data):
+        """由快照创建新的引擎"""
+        engine = cls(1, 1)
+        engine.restore(data)
+        return engine
+
+    def save(self, path):
+        """把快照（含随机数状态）写入文件"""
+        with open(path, "wb") as f:
+            f.write(self.snapshot())
+
+    def load(self, path):
+        """从文件恢复 save() 保存的状态"""
+        with open(path, "rb") as f:
+            self.restore(f.read())
+
+    def is_occupied(self, pos):
+        """格子 pos 上是否有蛇身（O(1)）"""
+        return self.occupancy[pos[1] * self.grid_width + pos[0]] > 0
+
+    def _claim(self, index):
+        """格子被蛇身占用：从 free_cells 中交换删除"""
+        free_cells = self.free_cells
+        free_slot = self.free_slot
+        slot = free_slot[index]
+        last = free_cells.pop()
+        if last != index:
+            free_cells[slot] = last
+            free_slot[last] = slot
+        free_slot[index] = -1
+
+    def _release(self, index):
+        """格子上的蛇身全部离开：放回 free_cells"""
+        self.free_slot[index] = len(self.free_cells)
+        self.free_cells.append(index)
+
+    def _random_free_cell(self, exclude=-1):
+        """从空格子中均匀随机取一个（可排除一个格子），没有可用格子时返回 None"""
+        free_cells = self.free_cells
+        count = len(free_cells)
+        if exclude >= 0 and self.free_slot[exclude] >= 0:
+            # 在除最后一个以外的位置中抽取，抽中被排除的格子就换成最后一个
+            count -= 1
+            if count <= 0:
+                return None
+            index = free_cells[self.rng.randrange(count)]
+            if index == exclude:
+                index = free_cells[count]
+        else:
+            if not count:
+                return None
+            index = free_cells[self.rng.randrange(count)]
+        width = self.grid_width
+        return (index % width, index // width)
+
+    def generate_food(self):
+        """在随机空格子上生成食物，并可能生成能量豆"""
+        old_food_pos = self.food_pos
+        food_pos = self._random_free_cell()
+        if self.events is not None:
+            self.events.append((EVENT_FOOD, old_food_pos, food_pos))
+        if food_pos is None:
+            # 没有空格子：蛇已填满整个棋盘
+            self.food_pos = None
+            self.wingame = True
+            self.game_over = True
+            return
+        self.food_pos = food_pos
+
+        # 随机生成能量豆（不在蛇身上，也不在食物位置上）
+        if self.power_bean_pos is None and self.rng.random() < self.power_bean_spawn_chance:
+            self.power_bean_pos = self._random_free_cell(food_pos[1] * self.grid_width + food_pos[0])
+            if self.events is not None and self.power_bean_pos is not None:
+                self.events.append((EVENT_BEAN, None, self.power_bean_pos))
+
+    def step(self, action=None):
+        """推进一个移动节拍，返回游戏是否仍在进行
+
+        action 为新方向，None 表示保持当前方向；直接反向的方向会被忽略。
+        """
+        if self.game_over:
+            return False
+        if self.journal is not None:
+            self.journal.append(self._undo_record(action))
+
+        if action is not None and action != OPPOSITE[self.direction]:
+            self.direction = action
+        self.ticks += 1
+
+        snake = self.snake
+        occupancy = self.occupancy
+        events = self.events
+        width = self.grid_width
+        # 环形缓冲区的读写直接内联（每个节拍都会执行，省去方法调用）
+        cells = snake.cells
+        start = snake.start
+        mask = snake.mask
+        length = snake.length
+        head = cells[(start + length - 1) & mask]
+        head_x = head % width
+        head_y = head // width
+        dx, dy = self.direction
+        new_x = head_x + dx
+        new_y = head_y + dy
+
+        # 检查是否撞墙
+        if not (0 <= new_x < width and 0 <= new_y < self.grid_height):
+            self.game_over = True
+            return False
+
+        # 检查是否撞到自己（蛇尾也算，与原规则一致）
+        new_index = new_y * width + new_x
+        if occupancy[new_index]:
+            self.game_over = True
+            return False
+
+        # 检查蛇的长度是否达到胜利条件（无限模式不结束）
+        if length >= WIN_LENGTH and not self.infinite_mode:
+            self.wingame = True
+            self.game_over = True
+            return False
+
+        new_head = (new_x, new_y)
+        if length > mask:
+            snake.push_head(new_index)  # 缓冲区已满，由 push_head 扩容
+            cells, start, mask = snake.cells, snake.start, snake.mask
+        else:
+            cells[(start + length) & mask] = new_index
+            snake.length = length + 1
+        occupancy[new_index] = 1
+        self.entry_tick[new_index] = self.ticks
+        self._claim(new_index)
+        if events is not None:
+            events.append((EVENT_HEAD, new_head))
+
+        if new_head == self.food_pos:
+            # 吃到食物时不删除尾部，蛇就变长了（增加1节）
+            self._add_score(FOOD_SCORE)
+            self.generate_food()
+        elif new_head == self.power_bean_pos:
+            # 能量豆增加3节身体：不删除尾部，且额外复制2个尾节点
+            self._add_score(POWER_BEAN_SCORE)
+            self.power_bean_pos = None
+            if events is not None:
+                events.append((EVENT_BEAN, new_head, None))
+            tail_index = snake.tail
+            snake.push_tail(tail_index)
+            snake.push_tail(tail_index)
+            occupancy[tail_index] += 2
+        else:
+            tail_index = cells[start]
+            snake.start = (start + 1) & mask
+            snake.length = length
+            occupancy[tail_index] -= 1
+            if not occupancy[tail_index]:
+                self._release(tail_index)
+            if events is not None:
+                events.append((EVENT_TAIL, (tail_index % width, tail_index // width)))
+
+        return not self.game_over
+
+    def _undo_record(self, action):
+        """step() 改动状态之前，记下撤销这一步所需的一切"""
+        snake = self.snake
+        width = self.grid_width
+        head = snake.head
+        dx, dy = action if action is not None and action != OPPOSITE[self.direction] else self.direction
+        x = head % width + dx
+        y = head // width + dy
+        index = y * width + x if 0 <= x < width and 0 <= y < self.grid_height else -1
+        # 只有吃到食物时 generate_food() 才会用到随机数
+        rng_state = self.rng.getstate() if (x, y) == self.food_pos else None
+        return (self.direction, self.ticks, self.score, self.high_score, self.food_pos,
+                self.power_bean_pos, self.wingame, rng_state, len(snake), head, snake.tail,
+                self.free_slot[index] if index >= 0 else -1,
+                self.entry_tick[index] if index >= 0 else 0)
+
+    def undo(self):
+        """撤销最近一次 step()，恢复包括随机数状态在内的全部状态（事件记录除外）
+
+        需要先把 journal 设为列表；每次撤销 O(1)。供前瞻搜索试走：
+        engine.journal = []; engine.step(move); ...; engine.undo()
+        """
+        (direction, ticks, score, high_score, food_pos, power_bean_pos, wingame, rng_state,
+         length, head, tail, slot, entry) = self.journal.pop()
+        snake = self.snake
+        if snake.head != head or len(snake) != length:
+            # 这一步走成了：按 step() 的相反顺序先恢复蛇尾，再撤掉新蛇头
+            occupancy = self.occupancy
+            free_cells = self.free_cells
+            free_slot = self.free_slot
+            grown = len(snake) - length  # 0 移动，1 吃到食物，3 吃到能量豆
+            if not grown:
+                if not occupancy[tail]:
+                    free_cells.pop()  # _release() 把蛇尾放在了末尾
+                    free_slot[tail] = -1
+                occupancy[tail] += 1
+                snake.push_tail(tail)
+            elif grown == 3:
+                snake.pop_tail()
+                snake.pop_tail()
+                occupancy[tail] -= 2
+            new_index = snake.pop_head()
+            occupancy[new_index] = 0
+            self.entry_tick[new_index] = entry
+            # 撤销 _claim()：换到它位置上的末尾元素放回末尾，它自己放回原位
+            if slot < len(free_cells):
+                last = free_cells[slot]
+                free_slot[last] = len(free_cells)
+                free_cells.append(last)
+                free_cells[slot] = new_index
+            else:
+                free_cells.append(new_index)
+            free_slot[new_index] = slot
+        if rng_state is not None:
+            self.rng.setstate(rng_state)
+        self.direction = direction
+        self.ticks = ticks
+        self.score = score
+        self.high_score = high_score
+        self.food_pos = food_pos
+        self.power_bean_pos = power_bean_pos
+        self.game_over = False
+        self.wingame = wingame
+
+    def _add_score(self, points):
+        self.score += points
+        if self.events is not None:
+            self.events.append((EVENT_SCORE, self.score))
+        if self.score > self.high_score:
+            self.high_score = self.score
@@ -0,0 +1,416 @@
+'''
+旁观服务器：把多局游戏的每个节拍以增量帧推送给本机的观众
+
+模拟线程（无界面对局的循环，或游戏的 update()）每个节拍调用 SpectatorServer.publish()：
+它把 engine.events 里的变化（新蛇头、移走的蛇尾、食物/能量豆移动、分数）编码成增量帧，
+放进发送队列就返回，从不等待网络。asyncio 事件循环在后台线程里每 flush_interval 秒
+取出队列，把这一批消息拼成一段 bytes，原样写给所有跟上进度的观众。
+
+关键帧是 SnakeEngine.snapshot(include_rng=False)：新的一局（EVENT_RESET）、对局结束、
+以及每 keyframe_interval 个节拍发送一次。服务器记住每局最近的关键帧和之后的增量帧，
+新连上的观众先收到这些，立即得到所有对局的当前局面。
+
+背压按观众分别处理：某个观众的发送缓冲超过 high_water 字节时，这一批直接丢给它，
+标记为失步；缓冲降下来之后先补发各局的关键帧和增量帧，再继续接收新的批次。
+慢观众只会少看到一些帧，既不拖慢其他观众，也不会卡住模拟。
+
+协议是普通的 TCP（只监听本机），服务器单向推送，每条消息为：
+    HEADER（类型、对局编号、节拍数、载荷长度） + 载荷
+增量帧的载荷是若干 OP（操作码 + 32 位的值：格子下标、NO_CELL 或分数），每个节拍通常
+只有新蛇头和蛇尾两项，连同消息头共 21 字节。SpectatorClient 把收到的消息还原成
+每局一个 SnakeEngine 镜像。
+
+    python spectator.py serve --games 200               # 200 局 BFS 自动对局
+    python spectator.py watch                           # 另一个终端里观看并校验
+    python tanchishe.py --spectate 8765                 # 旁观窗口中的游戏
+'''
+import argparse
+import asyncio
+import struct
+import sys
+import threading
+import time
+from collections import deque
+
+from snake_engine import (
+    SnakeEngine, EVENT_RESET, EVENT_HEAD, EVENT_TAIL, EVENT_FOOD, EVENT_BEAN, EVENT_SCORE,
+)
+
+MSG_KEYFRAME = 1  # 载荷为 SnakeEngine.snapshot(include_rng=False)
+MSG_DELTA = 2  # 载荷为若干 OP
+HEADER = struct.Struct("<BHII")  # 类型、对局编号、节拍数、载荷长度
+OP = struct.Struct("<BI")  # 操作码、值
+OP_HEAD = 1  # 新蛇头的格子下标
+OP_TAIL = 2  # 移走的尾节点的格子下标
+OP_FOOD = 3  # 食物的新格子下标（NO_CELL 表示没有）
+OP_BEAN = 4  # 能量豆的新格子下标（NO_CELL 表示被吃掉）
+OP_SCORE = 5  # 新分数
+NO_CELL = 0xFFFFFFFF
+EVENT_OPS = {EVENT_HEAD: OP_HEAD, EVENT_TAIL: OP_TAIL, EVENT_FOOD: OP_FOOD, EVENT_BEAN: OP_BEAN}
+
+DEFAULT_PORT = 8765
+KEYFRAME_INTERVAL = 300  # 两个关键帧之间最多的节拍数
+HIGH_WATER = 256 * 1024  # 观众发送缓冲超过这么多字节就丢帧
+FLUSH_INTERVAL = 1 / 60  # 事件循环发送一批消息的间隔（秒）
+STATS_INTERVAL = 5.0  # 命令行模式打印统计的间隔（秒）
+
+
+def encode_delta(events, width):
+    """把一段引擎事件编码成增量帧载荷（不含 EVENT_RESET，新的一局发关键帧）"""
+    pack = OP.pack
+    parts = []
+    for event in events:
+        kind = event[0]
+        if kind == EVENT_SCORE:
+            parts.append(pack(OP_SCORE, event[1]))
+            continue
+        op = EVENT_OPS.get(kind)
+        if op is None:
+            continue
+        pos = event[1] if op == OP_HEAD or op == OP_TAIL else event[2]
+        parts.append(pack(op, NO_CELL if pos is None else pos[1] * width + pos[0]))
+    return b"".join(parts)
+
+
+def apply_delta(engine, payload, tick):
+    """把增量帧应用到镜像引擎上，规则与 SnakeEngine.step 的事件顺序一致
+
+    能量豆变为 NO_CELL 且就在新蛇头上时是被吃掉了，镜像照引擎的做法复制两个尾节点。
+    """
+    width = engine.grid_width
+    snake = engine.snake
+    occupancy = engine.occupancy
+    for op, value in OP.iter_unpack(payload):
+        if op == OP_HEAD:
+            engine.ticks += 1
+            if not occupancy[value]:
+                engine._claim(value)
+            occupancy[value] += 1
+            engine.entry_tick[value] = engine.ticks
+            snake.push_head(value)
+        elif op == OP_TAIL:
+            snake.pop_tail()
+            occupancy[value] -= 1
+            if not occupancy[value]:
+                engine._release(value)
+        elif op == OP_FOOD:
+            engine.food_pos = None if value == NO_CELL else (value % width, value // width)
+        elif op == OP_BEAN:
+            if value != NO_CELL:
+                engine.power_bean_pos = (value % width, value // width)
+                continue
+            if snake and engine.power_bean_pos == snake[0]:
+                tail = snake.tail
+                snake.push_tail(tail)
+                snake.push_tail(tail)
+                occupancy[tail] += 2
+            engine.power_bean_pos = None
+        elif op == OP_SCORE:
+            engine.score = value
+    engine.ticks = tick
+
+
+class Viewer:
+    """一个连接的观众"""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.transport = writer.transport
+        self.synced = False  # False 时下一批先补发关键帧（新连接或刚丢过帧）
+        self.dropped = 0  # 丢给它的消息数
+
+
+class SpectatorServer:
+    """在后台线程里运行 asyncio 服务器；publish() 可在任意（单个）模拟线程中调用"""
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, keyframe_interval=KEYFRAME_INTERVAL,
+                 high_water=HIGH_WATER, flush_interval=FLUSH_INTERVAL):
+        self.host = host
+        self.port = port  # 为 0 时 start() 之后是系统分配的端口
+        self.keyframe_interval = keyframe_interval
+        self.high_water = high_water
+        self.flush_interval = flush_interval
+
+        # 模拟线程：对局编号 -> [上一个关键帧的节拍数（None 表示还没发过）, 当时是否已结束]
+        self.games = []
+        self.outbox = deque()  # 模拟线程 -> 事件循环：(对局编号, 类型, 消息)
+        # 事件循环线程：对局编号 -> 最近的关键帧消息 / 其后的增量消息
+        self.keyframes = {}
+        self.backlogs = {}
+        self.viewers = set()
+
+        self.loop = None
+        self.thread = None
+        self.running = False
+        self.ready = threading.Event()
+        self.error = None
+        self.messages = 0  # 已发布的消息数
+        self.bytes_sent = 0  # 写给所有观众的字节数
+        self.dropped = 0  # 因背压丢给观众的消息数（按观众累计）
+        self.resyncs = 0  # 补发关键帧的次数
+
+    def add_game(self):
+        """登记一局游戏，返回对局编号（publish 时使用）"""
+        self.games.append([None, False])
+        return len(self.games) - 1
+
+    def publish(self, game_id, engine):
+        """发布 engine.events 中的变化；不清空事件列表（由调用者在下一个节拍前清空）"""
+        state = self.games[game_id]
+        events = engine.events
+        ticks = engine.ticks
+        if state[0] is None or any(event[0] == EVENT_RESET for event in events):
+            self.publish_keyframe(game_id, engine)
+            return
+        if events:
+            payload = encode_delta(events, engine.grid_width)
+            if payload:
+                self.outbox.append(
+                    (game_id, MSG_DELTA, HEADER.pack(MSG_DELTA, game_id, ticks, len(payload)) + payload))
+                self.messages += 1
+        if ticks - state[0] >= self.keyframe_interval or engine.game_over != state[1]:
+            self.publish_keyframe(game_id, engine)
+
+    def publish_keyframe(self, game_id, engine):
+        """发布整局快照"""
+        state = self.games[game_id]
+        state[0] = engine.ticks
+        state[1] = engine.game_over
+        payload = engine.snapshot(include_rng=False)
+        self.outbox.append(
+            (game_id, MSG_KEYFRAME, HEADER.pack(MSG_KEYFRAME, game_id, engine.ticks, len(payload)) + payload))
+        self.messages += 1
+
+    # ---- 事件循环线程 ----
+
+    def start(self):
+        """在后台线程中开始监听，返回实际的端口；监听失败时抛出 OSError"""
+        self.running = True
+        self.thread = threading.Thread(target=asyncio.run, args=(self.serve(),),
+                                       name="spectator", daemon=True)
+        self.thread.start()
+        self.ready.wait()
+        if self.error is not None:
+            raise self.error
+        return self.port
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(1.0)
+            self.thread = None
+
+    async def serve(self):
+        try:
+            server = await asyncio.start_server(self.handle_viewer, self.host, self.port)
+        except OSError as error:
+            self.error = error
+            self.ready.set()
+            return
+        self.loop = asyncio.get_running_loop()
+        self.port = server.sockets[0].getsockname()[1]
+        self.ready.set()
+        async with server:
+            while self.running:
+                self.pump()
+                await asyncio.sleep(self.flush_interval)
+            for viewer in self.viewers:
+                viewer.transport.close()
+            for _ in range(10):
+                if not self.viewers:
+                    break
+                await asyncio.sleep(0.01)  # 让 handle_viewer 读到 EOF 后自行结束
+
+    async def handle_viewer(self, reader, writer):
+        viewer = Viewer(writer)
+        self.viewers.add(viewer)
+        try:
+            while await reader.read(4096):
+                pass  # 观众不发送数据，读到 EOF 即断开
+        except OSError:
+            pass
+        finally:
+            self.viewers.discard(viewer)
+            writer.close()
+
+    def pump(self):
+        """取出发送队列中的消息，写给各个观众"""
+        outbox = self.outbox
+        keyframes = self.keyframes
+        backlogs = self.backlogs
+        messages = []
+        while outbox:
+            game_id, kind, message = outbox.popleft()
+            messages.append(message)
+            if kind == MSG_KEYFRAME:
+                keyframes[game_id] = message
+                backlogs[game_id] = []
+            else:
+                backlogs[game_id].append(message)
+        batch = b"".join(messages)
+
+        resync = None
+        for viewer in self.viewers:
+            transport = viewer.transport
+            if transport.is_closing():
+                continue
+            if transport.get_write_buffer_size() > self.high_water:
+                # 背压：这一批丢给它，缓冲降下来后补发关键帧
+                viewer.synced = False
+                viewer.dropped += len(messages)
+                self.dropped += len(messages)
+                continue
+            if viewer.synced:
+                data = batch
+            else:
+                if resync is None:
+                    resync = b"".join(keyframes[game_id] + b"".join(backlogs[game_id])
+                                      for game_id in sorted(keyframes))
+                data = resync
+                viewer.synced = True
+                self.resyncs += 1
+            if data:
+                transport.write(data)
+                self.bytes_sent += len(data)
+
+
+class SpectatorClient:
+    """观众：把收到的消息还原成每局一个 SnakeEngine 镜像
+
+    收到关键帧时，如果镜像正好停在同一个节拍，就先比较两者的蛇身、食物、能量豆和分数，
+    用来校验增量帧。
+    """
+
+    def __init__(self):
+        self.mirrors = {}  # 对局编号 -> SnakeEngine
+        self.messages = 0
+        self.bytes_received = 0
+        self.checked = 0  # 与关键帧比较过的次数
+        self.mismatches = 0  # 其中不一致的次数
+
+    def apply(self, kind, game_id, tick, payload):
+        self.messages += 1
+        self.bytes_received += HEADER.size + len(payload)
+        mirror = self.mirrors.get(game_id)
+        if kind == MSG_KEYFRAME:
+            keyframe = SnakeEngine.from_snapshot(payload)
+            if mirror is not None and mirror.ticks == tick:
+                self.checked += 1
+                if (list(mirror.snake) != list(keyframe.snake) or mirror.food_pos != keyframe.food_pos
+                        or mirror.power_bean_pos != keyframe.power_bean_pos
+                        or mirror.score != keyframe.score):
+                    self.mismatches += 1
+            self.mirrors[game_id] = keyframe
+        elif kind == MSG_DELTA and mirror is not None and tick > mirror.ticks:
+            apply_delta(mirror, payload, tick)
+
+    async def watch(self, host="127.0.0.1", port=DEFAULT_PORT, delay=0.0):
+        """连接服务器并持续接收；delay 模拟慢观众：每条消息之后等待的秒数"""
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            while True:
+                kind, game_id, tick, length = HEADER.unpack(await reader.readexactly(HEADER.size))
+                self.apply(kind, game_id, tick, await reader.readexactly(length))
+                if delay:
+                    await asyncio.sleep(delay)
+        except asyncio.IncompleteReadError:
+            pass  # 服务器关闭
+        finally:
+            writer.close()
+
+
+def serve_games(server, games, width, height, rate, duration=0.0, seed=0):
+    """运行 games 局 BFS 自动对局，每秒 rate 个节拍，每个节拍发布一次；结束的对局自动重开"""
+    from autopilot import BfsAutopilot
+
+    tables = []
+    for i in range(games):
+        engine = SnakeEngine(width, height, seed=seed + i, infinite_mode=True)
+        engine.events = []
+        engine.reset()
+        tables.append((server.add_game(), engine, BfsAutopilot()))
+
+    interval = 1.0 / rate
+    started = time.perf_counter()
+    next_tick = started
+    next_stats = started + STATS_INTERVAL
+    ticks = 0
+    busy = 0.0
+    while not duration or time.perf_counter() - started < duration:
+        tick_start = time.perf_counter()
+        for game_id, engine, pilot in tables:
+            if engine.game_over:
+                engine.reset()
+                pilot.reset()
+            else:
+                engine.step(pilot.next_direction(engine))
+            server.publish(game_id, engine)
+            engine.events.clear()
+        ticks += 1
+        now = time.perf_counter()
+        busy += now - tick_start
+        if now >= next_stats:
+            print(f"{ticks} ticks, {busy / ticks * 1000:.2f} ms/tick for {games} games, "
+                  f"{len(server.viewers)} viewers, {server.bytes_sent / 1e6:.1f} MB sent, "
+                  f"{server.dropped} messages dropped, {server.resyncs} resyncs")
+            next_stats = now + STATS_INTERVAL
+        next_tick += interval
+        if next_tick > now:
+            time.sleep(next_tick - now)
+        else:
+            next_tick = now  # 跟不上时不补走，保持节拍间隔
+    return ticks
+
+
+async def watch_games(host, port, duration=0.0, delay=0.0):
+    """连接服务器观看，定期打印收到的数据量和校验结果"""
+    client = SpectatorClient()
+    task = asyncio.ensure_future(client.watch(host, port, delay))
+    started = time.perf_counter()
+    while not task.done() and (not duration or time.perf_counter() - started < duration):
+        await asyncio.sleep(min(STATS_INTERVAL, duration) if duration else STATS_INTERVAL)
+        print(f"{client.messages} messages, {client.bytes_received / 1e6:.2f} MB, "
+              f"{len(client.mirrors)} games, {client.checked} keyframes checked, "
+              f"{client.mismatches} mismatches")
+    task.cancel()
+    return client
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Localhost spectator server for headless games")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="run headless autopilot games and stream them")
+    serve.add_argument("--games", type=int, default=200, help="number of games (default: 200)")
+    serve.add_argument("--size", default="40x30", help="board size WxH (default: 40x30)")
+    serve.add_argument("--rate", type=float, default=7.5,
+                       help="ticks per second (default: 7.5, the game's speed)")
+    serve.add_argument("--keyframe-interval", type=int, default=KEYFRAME_INTERVAL)
+    serve.add_argument("--duration", type=float, default=0.0, help="seconds to run (default: forever)")
+    watch = sub.add_parser("watch", help="connect, mirror every game and check against keyframes")
+    watch.add_argument("--delay", type=float, default=0.0,
+                       help="seconds to sleep after each message, to act as a slow viewer")
+    watch.add_argument("--duration", type=float, default=0.0, help="seconds to watch (default: forever)")
+    for command in (serve, watch):
+        command.add_argument("--host", default="127.0.0.1")
+        command.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args(argv)
+
+    if args.command == "watch":
+        client = asyncio.run(watch_games(args.host, args.port, args.duration, args.delay))
+        return 1 if client.mismatches else 0
+
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    server = SpectatorServer(args.host, args.port, keyframe_interval=args.keyframe_interval)
+    port = server.start()
+    print(f"Serving {args.games} games of {width}x{height} on {args.host}:{port}")
+    try:
+        serve_games(server, args.games, width, height, args.rate, args.duration)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
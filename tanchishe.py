@@ -13,110 +13,71 @@
     减少路径列表大小
 4.导入优化 📥
     将 deque 移到文件顶部导入，避免函数内重复导入
+5.背景图层预渲染 🖼️
+    背景色和网格线只画一次到离屏 Surface，每帧一次 blit
+    窗口或格子大小改变时才重建
+6.蛇身颜色查表 🎨
+    每种颜色的头部颜色和量化渐变只用 colorsys 计算一次
+    每节颜色按（颜色索引, 蛇长）缓存，绘制时只查表
+7.文字 Surface 缓存 🔤
+    HUD 和菜单文字按 (文字, 字体, 字号, 颜色) 缓存渲染结果，LRU 淘汰
+    只有分数等数值变化时才重新光栅化中文字体
+8.增量渲染（按D键开关）🧩
+    根据引擎事件（新蛇头、移走的蛇尾、食物/能量豆移动）只重绘变化的格子和 HUD 行
+    身体渐变每 FULL_REPAINT_INTERVAL 帧整屏重绘一次校正
+9.精灵图集 + 批量 blit 🗂️
+    蛇头（四个方向）、食物、能量豆和身体渐变方块按格子大小和颜色预渲染到一张图集
+    食物、能量豆和整条蛇用一次 Surface.blits 画完，每节只是一次内存拷贝
+10.后台寻路 🧵
+    大棋盘上 BFS 自动模式把引擎快照交给工作进程寻路（见 autopilot.BackgroundAutopilot），
+    结果到达前先沿缓存路径或 O(1) 的默认走法前进，再慢的搜索也不会卡住一帧
+11.可切换的寻路算法 🧭
+    按F键在 BFS、A*（曼哈顿启发、偏好直线）和多目标距离场（一次反向 BFS 比较能量豆和食物）
+    之间切换；A* 在大棋盘上展开的节点比 BFS 少两三个数量级
 
 性能提升效果：
     ❌ 之前：每一帧（60fps）都运行完整 BFS，处理 40×30=1200 网格，非常卡顿
     ✅ 现在：路径缓存复用，寻路次数减少 90% 以上，游戏流畅运行
+    按P键开启性能分析：HUD 右侧显示各函数耗时的 p50/p99 和实际的寻路率，
+    退出时把样本导出到 PROFILE_DUMP_FILE
     现在自动模式应该性能良好，不会出现明显的卡顿！
 
+对局录像：每局记录种子和方向/按键变化（见 recording.py），结束时写入 RECORDING_DIR；
+python tanchishe.py --replay 录像文件 --speed 4 以 4 倍速回放
+
+定时：update(dt) 按真实经过的时间累积，每 TICK_SECONDS 走一个节拍（帧率掉了会补走，
+单帧最多补 MAX_FRAME_SECONDS）；自动寻路在每个节拍之前决策，不再每帧都跑。
+按T键切换加速档位 TURBO_LEVELS：每帧走 K 个节拍，超过 TURBO_FRAME_BUDGET 就留到下一帧
+
+大棋盘：python tanchishe.py --board 2000x2000 使用比窗口大的棋盘，画面跟随蛇头滚动，
+只绘制视野内的格子；录像和存档记录各自的棋盘大小，回放/读档时自动切换
+
+旁观：python tanchishe.py --spectate 8765 在本机端口上推送每一帧的增量（见 spectator.py），
+python spectator.py watch --port 8765 可在另一个进程里观看
+
+存档：对局中按S键把引擎快照（见 SnakeEngine.snapshot）写入 SAVE_FILE，
+按L键读档继续；读档后的对局不再录像
+
 '''
-import pgzrun
-import random
+import os
 import math
-from collections import deque
+import time
+import random
+import atexit
 import colorsys
+from collections import OrderedDict
 
-#增加无限模式
-infinite_mode = False
-
+import pygame
+from pgzero import ptext
 
-# 自动模式相关变量
-last_pathfind = 0  # 上次寻路的时间
-current_path = []  # 当前路径缓存
-snake_set = set()  # 蛇身位置集合，避免重复创建列表
-# 能量豆相关变量
-power_bean_pos = None  # 能量豆位置（None表示没有生成）
-power_bean_spawn_chance = 0.3  # 每次生成食物时，30%概率同时生成能量豆
-
-#实现贪吃蛇自动吃食物的功能
-def auto_eat_food():
-    """使用BFS寻路算法自动找到最短路径到食物或能量豆（优先能量豆）"""
-    global direction, next_direction, last_pathfind, current_path, snake_set
-    
-    # 优先选择能量豆，其次食物
-    target_pos = power_bean_pos if power_bean_pos else food_pos
-    
-    if not target_pos or game_over or not game_started:
-        return
-    
-    head = snake[0]
-    
-    # 只在必要时重新计算路径（每3帧计算一次）
-    if len(current_path) > 0:
-        # 使用缓存的路径
-        if current_path[0] == head:
-            # 蛇头已移动，移除已走过的路径点
-            current_path.pop(0)
-        
-        if len(current_path) > 0:
-            next_pos = current_path[0]
-            next_x, next_y = next_pos
-            head_x, head_y = head
-            dx, dy = next_x - head_x, next_y - head_y
-            
-            if dx == 1:
-                next_direction = RIGHT
-            elif dx == -1:
-                next_direction = LEFT
-            elif dy == 1:
-                next_direction = DOWN
-            elif dy == -1:
-                next_direction = UP
-            return
-    
-    # 重新计算路径（路径为空或头部不匹配时）
-    # 更新蛇身集合（缓存，避免每次都创建列表切片）
-    snake_set = set(snake[:-1])  # 排除蛇尾
-    
-    # BFS寻路
-    queue = deque([(head, [head])])
-    visited = {head}
-    
-    while queue:
-        current_pos, path = queue.popleft()
-        current_x, current_y = current_pos
-        
-        # 找到目标（食物或能量豆）
-        if current_pos == target_pos:
-            if len(path) >= 2:
-                # 提取从头到食物的路径（不包括头部）
-                current_path = path[1:]
-                
-                next_pos = current_path[0]
-                next_x, next_y = next_pos
-                head_x, head_y = head
-                dx, dy = next_x - head_x, next_y - head_y
-                
-                if dx == 1:
-                    next_direction = RIGHT
-                elif dx == -1:
-                    next_direction = LEFT
-                elif dy == 1:
-                    next_direction = DOWN
-                elif dy == -1:
-                    next_direction = UP
-            return
-        
-        # 探索四个方向
-        for nx, ny in [(current_x+1, current_y), (current_x-1, current_y), 
-                       (current_x, current_y+1), (current_x, current_y-1)]:
-            # 检查边界
-            if 0 <= nx < GRID_WIDTH and 0 <= ny < GRID_HEIGHT:
-                next_pos = (nx, ny)
-                # 检查是否已访问和是否在蛇身上
-                if next_pos not in visited and next_pos not in snake_set:
-                    visited.add(next_pos)
-                    queue.append((next_pos, path + [next_pos]))
+from snake_engine import (
+    SnakeEngine, UP, DOWN, LEFT, RIGHT,
+    EVENT_RESET, EVENT_HEAD, EVENT_TAIL, EVENT_FOOD, EVENT_BEAN,
+)
+from autopilot import BackgroundAutopilot, HamiltonianAutopilot
+from profiler import FrameProfiler
+from spectator import SpectatorServer
+import recording
 
 # 窗口设置
 WIDTH = 800
@@ -125,10 +86,20 @@ TITLE = '贪吃蛇游戏'
 
 # 游戏常量
 CELL_SIZE = 20
+# 棋盘大小（格子数）与窗口无关：默认正好铺满窗口，--board WxH 可设成 2000x2000 这样的大棋盘，
+# 这时画面跟随蛇头滚动（见 update_camera），只绘制视野内的格子、蛇身和食物
 GRID_WIDTH = WIDTH // CELL_SIZE
 GRID_HEIGHT = HEIGHT // CELL_SIZE
+VIEW_COLUMNS = WIDTH // CELL_SIZE  # 视野（窗口）内的格子数
+VIEW_ROWS = HEIGHT // CELL_SIZE
+CAMERA_MARGIN = 8  # 蛇头离视野边缘少于这么多格时滚动
 FPS = 10
-MOVEMENT_INTERVAL = 8  # 每8帧移动一次，控制蛇的速度
+MOVEMENT_INTERVAL = 8  # 每8帧（按60帧/秒计）移动一次，控制蛇的速度
+FRAME_SECONDS = 1 / 60
+TICK_SECONDS = MOVEMENT_INTERVAL * FRAME_SECONDS  # 一个移动节拍的时长，与实际帧率无关
+MAX_FRAME_SECONDS = 0.25  # 单帧最多补这么多时间的节拍（窗口被拖动等长时间卡住后不会突然狂奔）
+TURBO_LEVELS = (1, 10, 100)  # 按T键循环：每帧走的节拍数（1 为正常速度）
+TURBO_FRAME_BUDGET = 0.012  # 加速时每帧最多用于走节拍的秒数，保证画面和按键仍然流畅
 
 # 颜色定义
 BACKGROUND_COLOR = (20, 30, 20)
@@ -147,161 +118,275 @@ snake_color_index = 0  # 当前蛇身颜色索引
 SNAKE_BODY_COLOR = SNAKE_BODY_COLORS[snake_color_index]
 FOOD_COLOR = (220, 0, 0)
 GRID_COLOR = (40, 50, 40)
+OUTSIDE_COLOR = (8, 12, 8)  # 棋盘比窗口小时，窗口里棋盘以外的区域
 TEXT_COLOR = (220, 220, 220)
 GAME_OVER_COLOR = (220, 50, 50)
 
-# 方向常量
-UP = (0, -1)
-DOWN = (0, 1)
-LEFT = (-1, 0)
-RIGHT = (1, 0)
-
-# 游戏状态
-game_over = False
-score = 0
-high_score = 0
-frame_count = 0
+# 蛇身颜色缓存
+GRADIENT_STEPS = 256  # 身体渐变的量化级数
+gradient_cache = {}  # 颜色索引 -> (头部颜色, GRADIENT_STEPS 级身体渐变)
+snake_colors = []  # 当前蛇每一节的颜色，[0] 为头部
+snake_colors_key = None  # snake_colors 对应的 (snake_color_index, 蛇长)
+
+# 文字 Surface 缓存（LRU）
+TEXT_CACHE_SIZE = 64
+text_cache = OrderedDict()  # (文字, 字体, 字号, 颜色) -> 渲染好的 Surface
+text_cache_hits = 0
+text_cache_misses = 0
+
+# 预渲染的背景层（背景色 + 网格线）及其对应的 (WIDTH, HEIGHT, CELL_SIZE, 可见的棋盘宽高)
+background_layer = None
+background_key = None
+
+# 视野左上角的格子坐标；棋盘不大于窗口时总是 (0, 0)
+camera_x = 0
+camera_y = 0
+
+# 精灵图集（蛇头四个方向、食物、能量豆、身体渐变方块），按 (CELL_SIZE, 颜色索引) 缓存
+ATLAS_COLUMNS = 16
+sprite_atlas = None
+sprite_areas = {}
+sprite_atlas_key = None
+# 身体方块的批量 blit 条目：{颜色: [视野格子 -> (图集, 屏幕位置, 区域) 或 None]}，随图集和视野大小作废
+body_blits = {}
+body_blits_key = None
+
+# 增量渲染（脏矩形）状态
+FULL_REPAINT_INTERVAL = 60  # 增量模式下每隔多少帧整屏重绘一次，校正身体渐变
+incremental_mode = False  # 增量渲染开关
+full_repaint_needed = True  # 下一帧必须整屏重绘
+frames_since_full_repaint = 0
+cell_colors = {}  # 增量模式下每个蛇身格子最后一次绘制的颜色
+drawn_head = None  # 屏幕上当前画着蛇头的格子
+hud_drawn = []  # 屏幕上当前的 HUD 行：[(行内容, 所占矩形), ...]
+
+# 性能分析（按P键开关）
+PROFILE_DUMP_FILE = "profile_samples.json"  # 退出时导出样本的文件
+PROFILE_COLOR = (180, 255, 180)
+profiler = FrameProfiler()
+
+# 游戏状态：对局状态都在 engine 中，这里只保留界面相关的状态
+engine = SnakeEngine(GRID_WIDTH, GRID_HEIGHT)
+background_autopilot = BackgroundAutopilot()  # 大棋盘上在后台进程寻路，不卡帧
+# 自动模式可选的寻路策略（按A键依次切换：关闭 → BFS → 哈密顿回路 → 关闭）
+AUTOPILOTS = [
+    ("BFS", background_autopilot),
+    ("哈密顿回路", HamiltonianAutopilot()),
+]
+autopilot_index = 0  # 当前使用的寻路策略
+# BFS 自动模式可选的寻路算法（按F键切换，见 autopilot.PATHFINDERS）
+PATHFINDING_ALGORITHMS = [("bfs", "BFS"), ("astar", "A*"), ("field", "距离场")]
+algorithm_index = 0
+autopilot = AUTOPILOTS[autopilot_index][1]
+engine.generate_food = profiler.timed("generate_food")(engine.generate_food)
+tick_accumulator = 0.0  # 累计的、还没走成节拍的时间（秒）
+turbo_index = 0  # TURBO_LEVELS 中的当前档位
 auto_mode = False  # 自动模式开关
-direction = RIGHT
+infinite_mode = False  # 无限模式开关
 next_direction = RIGHT
-snake = []
-food_pos = None
 game_started = False
-wingame = False
+
+# 对局录像：每局结束（或中途放弃）时写入 RECORDING_DIR
+RECORDING_DIR = "recordings"
+recording_enabled = True
+recorder = None  # 当前对局的 GameRecorder
+replayer = None  # 回放模式下的 Replayer；None 表示正常游戏
+replay_speed = 1.0  # 回放速度倍数
+
+# 存档（S 保存 / L 读取）
+SAVE_FILE = "savegame.snks"
+
+# 旁观（--spectate 端口）：每帧把引擎事件以增量帧推送给本机的观众，见 spectator.py
+spectator = None  # SpectatorServer；None 表示不旁观
+spectator_game = 0
+
+
+#实现贪吃蛇自动吃食物的功能
+def auto_eat_food():
+    """自动模式：由 autopilot 寻路给出下一步方向"""
+    global next_direction
+
+    if engine.game_over or not game_started:
+        return
+
+    if profiler.enabled:
+        # 分别统计命中路径缓存和重新寻路的耗时
+        searches = autopilot.searches
+        start = time.perf_counter()
+        new_direction = autopilot.next_direction(engine)
+        name = "auto_eat_food:bfs" if autopilot.searches != searches else "auto_eat_food:cached"
+        profiler.record(name, time.perf_counter() - start)
+    else:
+        new_direction = autopilot.next_direction(engine)
+    if new_direction is not None:
+        next_direction = new_direction
 
 
 def reset_game():
     """重置游戏"""
-    global snake, food_pos, direction, next_direction, score, game_over, game_started, current_path, snake_set, wingame, power_bean_pos
-    
-    # 初始化蛇：头部在中间，加上3节身体
-    center_x = GRID_WIDTH // 2
-    center_y = GRID_HEIGHT // 2
-    snake = [
-        (center_x, center_y),      # 头部
-        (center_x - 1, center_y),  # 第1节身体
-        (center_x - 2, center_y),  # 第2节身体
-        (center_x - 3, center_y)   # 第3节身体
-    ]
-    
-    direction = RIGHT
+    global next_direction, game_started, recorder
+
+    finish_recording()  # 上一局中途放弃时也保存
+    engine.infinite_mode = infinite_mode
+    seed = random.getrandbits(63)  # 记下种子，录像可按种子重现食物位置
+    engine.reset(seed=seed)
+    center_camera()
+    for _, pilot in AUTOPILOTS:
+        pilot.reset()  # 重置路径缓存
+    background_autopilot.warm_up(engine)
     next_direction = RIGHT
-    score = 0
-    game_over = False
     game_started = True
-    current_path = []  # 重置路径缓存
-    snake_set = set()  # 重置蛇身集合
-    wingame = False # 重置胜利标志
-    power_bean_pos = None  # 重置能量豆
-    generate_food()
-
-def generate_food():
-    """在随机位置生成食物，并可能生成能量豆"""
-    global food_pos, current_path, power_bean_pos
-    max_attempts = 100  # 最大尝试次数
-    attempts = 0
-    
-    while attempts < max_attempts:
-        # 随机生成食物位置
-        x = random.randint(0, GRID_WIDTH - 1)
-        y = random.randint(0, GRID_HEIGHT - 1)
-        food_pos = (x, y)
-        
-        # 确保食物不在蛇身上
-        if food_pos not in snake:
-            break
-        attempts += 1
-    else:
-        # 如果尝试次数超过限制，游戏结束
-        global game_over
-        game_over = True
-    
-    # 随机生成能量豆（30%概率）
-    if power_bean_pos is None and random.random() < power_bean_spawn_chance:
-        attempts = 0
-        while attempts < max_attempts:
-            x = random.randint(0, GRID_WIDTH - 1)
-            y = random.randint(0, GRID_HEIGHT - 1)
-            bean_pos = (x, y)
-            # 确保能量豆不在蛇身上，也不在食物位置上
-            if bean_pos not in snake and bean_pos != food_pos:
-                power_bean_pos = bean_pos
-                break
-            attempts += 1
-    
-    # 清除缓存的路径，因为食物位置改变了
-    current_path = []
+    if recording_enabled:
+        recorder = recording.GameRecorder(
+            engine.grid_width, engine.grid_height, seed, infinite_mode=infinite_mode, auto_mode=auto_mode,
+            autopilot_index=autopilot_index, color_index=snake_color_index)
+
+
+def finish_recording():
+    """结束当前录像并写入 RECORDING_DIR"""
+    global recorder
+
+    if recorder is None:
+        return
+    data = recorder.finish(engine.ticks, engine.score)
+    recorder = None
+    path = os.path.join(RECORDING_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{engine.seed}.snkr")
+    recording.save(path, data)
+    print(f"Recorded {engine.ticks} ticks in {len(data)} bytes to {path}")
+
+atexit.register(finish_recording)
+
 
+def record_key(code):
+    """对局进行中按下 A/B/C 键时写入录像"""
+    if recorder is not None and game_started and not engine.game_over:
+        recorder.record(engine.ticks, code)
+
+
+@profiler.timed("move_snake")
 def move_snake():
-    """移动蛇"""
-    global snake, game_over, score, high_score, power_bean_pos
-    
-    if game_over or not game_started:
+    """移动蛇（规则见 SnakeEngine.step）"""
+    if engine.game_over or not game_started:
         return
-    
-    # 获取当前头部位置
-    head_x, head_y = snake[0]
-    
-    # 根据方向计算新头部位置
-    dx, dy = direction
-    new_head = (head_x + dx, head_y + dy)
-    
-    # 检查是否撞墙
-    if (new_head[0] < 0 or new_head[0] >= GRID_WIDTH or 
-        new_head[1] < 0 or new_head[1] >= GRID_HEIGHT):
-        game_over = True
+    tick = engine.ticks
+    direction = engine.direction
+    engine.step(next_direction)
+    if recorder is not None:
+        recorder.record_step(tick, direction, engine.direction)
+        if engine.game_over:
+            finish_recording()
+
+
+def start_replay(path, speed=1.0):
+    """进入回放模式：按录像文件头恢复各模式，并用录像的种子重置引擎"""
+    global replayer, replay_speed, game_started, recording_enabled
+    global infinite_mode, auto_mode, autopilot_index, autopilot, snake_color_index
+
+    data = recording.load(path)
+    if (data.grid_width, data.grid_height) != (engine.grid_width, engine.grid_height):
+        set_board_size(data.grid_width, data.grid_height)
+    infinite_mode = data.infinite_mode
+    auto_mode = data.auto_mode
+    autopilot_index = data.autopilot_index
+    autopilot = AUTOPILOTS[autopilot_index][1]
+    snake_color_index = data.color_index
+    replayer = recording.Replayer(data)
+    replayer.start(engine)
+    center_camera()
+    replay_speed = speed
+    recording_enabled = False  # 回放不再录像
+    game_started = True
+
+
+def save_game():
+    """S键：把当前对局写入 SAVE_FILE"""
+    if not game_started or engine.game_over:
         return
-    
-    # 检查是否撞到自己
-    if new_head in snake:
-        game_over = True
+    engine.save(SAVE_FILE)
+    print(f"Game saved to {SAVE_FILE} ({len(engine.snake)} segments, score {engine.score})")
+
+
+def load_game():
+    """L键：从 SAVE_FILE 恢复对局（原地恢复，保留 engine 上的事件列表和计时包装）
+
+    存档的棋盘大小可以与当前不同，之后的新一局沿用存档的棋盘大小。
+    """
+    global next_direction, game_started, infinite_mode, full_repaint_needed
+    global GRID_WIDTH, GRID_HEIGHT
+
+    try:
+        with open(SAVE_FILE, "rb") as f:
+            data = f.read()
+        SnakeEngine.from_snapshot(data)  # 先在副本上校验，坏档不破坏当前对局
+    except (OSError, ValueError) as error:
+        print(f"Cannot load {SAVE_FILE}: {error}")
         return
-    
-    # 检查蛇的长度是否超过100，胜利条件
-    if len(snake) >= 100:
-        # 如果启用了无限模式，不触发胜利结束
-        if not infinite_mode:
-            global wingame
-            wingame = True
-            game_over = True
-            return
-    
-    # 添加新的头部
-    snake.insert(0, new_head)
-    
-    # 检查是否吃到食物
-    if new_head == food_pos:
-        score += 10
-        if score > high_score:
-            high_score = score
-        generate_food()
-        # 注意：吃到食物时不删除尾部，蛇就变长了（增加1节）
-    # 检查是否吃到能量豆（增加3节）
-    elif new_head == power_bean_pos:
-        score += 50  # 能量豆得分更高
-        if score > high_score:
-            high_score = score
-        power_bean_pos = None  # 消除能量豆
-        # 能量豆增加3节身体：不删除尾部，且额外保留2个节点
-        snake.append(snake[-1] if len(snake) > 1 else new_head)
-        snake.append(snake[-1] if len(snake) > 1 else new_head)
-        # 现在蛇会增长3节（头部+1 + 额外2节）
-    else:
-        # 没吃到食物或能量豆，删除尾部
-        snake.pop()
+    finish_recording()  # 读档前的对局照常保存录像；读档后的对局不录像
+    engine.restore(data)
+    GRID_WIDTH, GRID_HEIGHT = engine.grid_width, engine.grid_height
+    center_camera()
+    infinite_mode = engine.infinite_mode
+    for _, pilot in AUTOPILOTS:
+        pilot.reset()
+    next_direction = engine.direction
+    game_started = True
+    full_repaint_needed = True
+    print(f"Game loaded from {SAVE_FILE} (tick {engine.ticks}, score {engine.score})")
 
-def update():
-    """更新游戏逻辑（每秒调用60次）"""
-    global frame_count, direction, next_direction, auto_mode
-    
-    if not game_started or game_over:
+
+def apply_replay_key(code):
+    """回放到 A/B/C 键事件时，与游戏中按键的效果相同"""
+    if code == recording.CODE_AUTOPILOT:
+        toggle_autopilot()
+    elif code == recording.CODE_INFINITE:
+        toggle_infinite_mode()
+    elif code == recording.CODE_COLOR:
+        cycle_snake_color()
+
+
+def due_ticks(dt):
+    """固定步长调度：本帧应走的节拍数
+
+    正常速度下把帧间隔累加到 tick_accumulator，每满 TICK_SECONDS 走一个节拍，
+    掉帧时下一帧补上，游戏速度与帧率无关；回放时时间按 replay_speed 倍流逝。
+    加速档位下每帧固定走 TURBO_LEVELS[turbo_index] 个节拍，中间的画面都跳过。
+    """
+    global tick_accumulator
+
+    turbo = TURBO_LEVELS[turbo_index]
+    if turbo > 1:
+        tick_accumulator = 0.0
+        return turbo
+    speed = replay_speed if replayer is not None else 1.0
+    tick_accumulator += min(dt, MAX_FRAME_SECONDS) * speed
+    ticks = int(tick_accumulator / TICK_SECONDS + 1e-9)  # 容忍累加的浮点误差
+    tick_accumulator = max(0.0, tick_accumulator - ticks * TICK_SECONDS)
+    return ticks
+
+
+@profiler.timed("update")
+def advance(dt):
+    """推进 dt 秒的游戏逻辑：AI 每个节拍恰好决策一次，紧接着移动"""
+    global next_direction, tick_accumulator
+
+    if not game_started or engine.game_over:
+        tick_accumulator = 0.0
         return
-    
-    # 如果启用自动模式，调用自动吃食物函数
-    if auto_mode:
-        auto_eat_food()
-    else:
-        # 更新方向，确保不会直接反向移动
+    ticks = due_ticks(dt)
+    deadline = time.perf_counter() + TURBO_FRAME_BUDGET if ticks > 1 else None
+
+    if replayer is not None:
+        # 回放：按录像推进，不读键盘也不寻路
+        for _ in range(ticks):
+            if not replayer.step(engine, apply_replay_key):
+                break
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+        return
+
+    if not auto_mode:
+        # 每帧读一次键盘；确保不会直接反向移动
+        direction = engine.direction
         if keyboard.left and direction != RIGHT:
             next_direction = LEFT
         elif keyboard.right and direction != LEFT:
@@ -310,172 +395,385 @@ def update():
             next_direction = UP
         elif keyboard.down and direction != UP:
             next_direction = DOWN
-    
-    # 控制移动速度：每MOVEMENT_INTERVAL帧移动一次
-    frame_count += 1
-    if frame_count >= MOVEMENT_INTERVAL:
-        frame_count = 0
-        # 在自动模式下，直接更新方向（不需要检查反向移动）
+
+    for _ in range(ticks):
+        if engine.game_over:
+            break
+        # 如果启用自动模式，每个节拍调用一次自动吃食物函数
         if auto_mode:
-            direction = next_direction
-        else:
-            # 确保方向切换不会导致蛇直接反向移动
-            if (direction == RIGHT and next_direction != LEFT) or \
-               (direction == LEFT and next_direction != RIGHT) or \
-               (direction == UP and next_direction != DOWN) or \
-               (direction == DOWN and next_direction != UP):
-                direction = next_direction
+            auto_eat_food()
+        # 反向移动由 engine.step 忽略
         move_snake()
+        if deadline is not None and time.perf_counter() > deadline:
+            break
+
+
+def update(dt=FRAME_SECONDS):
+    """每帧调用一次；pgzero 传入距上一帧的秒数 dt（不带参数调用时按 60 帧/秒计）"""
+    advance(dt)
+    if spectator is not None and game_started:
+        # draw() 每帧清空事件列表，这里发布的正好是上一帧以来的全部变化（含按键触发的重开、读档）
+        spectator.publish(spectator_game, engine)
+
+
+def start_spectating(port):
+    """在后台线程启动旁观服务器；旁观需要引擎事件，因此始终开启事件记录"""
+    global spectator, spectator_game
+
+    spectator = SpectatorServer(port=port)
+    port = spectator.start()
+    spectator_game = spectator.add_game()
+    if engine.events is None:
+        engine.events = []
+    print(f"Spectator server listening on {spectator.host}:{port}")
+
+def get_background_layer():
+    """返回预渲染的背景层，窗口、格子或棋盘大小改变时重建"""
+    global background_layer, background_key
+
+    # 视野只按整格滚动，网格线总是对齐窗口，所以背景层与视野位置无关
+    board_width = min(WIDTH, engine.grid_width * CELL_SIZE)
+    board_height = min(HEIGHT, engine.grid_height * CELL_SIZE)
+    key = (WIDTH, HEIGHT, CELL_SIZE, board_width, board_height)
+    if background_layer is None or background_key != key:
+        surface = pygame.Surface((WIDTH, HEIGHT))
+        surface.fill(OUTSIDE_COLOR)
+        surface.fill(BACKGROUND_COLOR, pygame.Rect(0, 0, board_width, board_height))
+        for x in range(0, board_width, CELL_SIZE):
+            pygame.draw.line(surface, GRID_COLOR, (x, 0), (x, board_height))
+        for y in range(0, board_height, CELL_SIZE):
+            pygame.draw.line(surface, GRID_COLOR, (0, y), (board_width, y))
+        # 转换成与屏幕相同的像素格式，blit 更快
+        background_layer = surface.convert() if pygame.display.get_surface() else surface
+        background_key = key
+    return background_layer
+
+def follow(camera, head, view, board):
+    """一个方向上的视野位置：蛇头保持在离边缘 CAMERA_MARGIN 格以内，且不超出棋盘"""
+    if board <= view:
+        return 0
+    margin = min(CAMERA_MARGIN, (view - 1) // 2)
+    camera = min(camera, head - margin)
+    camera = max(camera, head - (view - 1 - margin))
+    return max(0, min(camera, board - view))
+
+def update_camera():
+    """让视野跟随蛇头滚动；返回视野是否移动"""
+    global camera_x, camera_y
+
+    if not engine.snake:
+        return False
+    head_x, head_y = engine.snake[0]
+    old = (camera_x, camera_y)
+    camera_x = follow(camera_x, head_x, VIEW_COLUMNS, engine.grid_width)
+    camera_y = follow(camera_y, head_y, VIEW_ROWS, engine.grid_height)
+    return (camera_x, camera_y) != old
 
+def center_camera():
+    """新的一局、读档或回放开始时，把视野移到蛇头居中"""
+    global camera_x, camera_y
+
+    camera_x = camera_y = 0
+    if engine.snake:
+        head_x, head_y = engine.snake[0]
+        camera_x = follow(head_x - VIEW_COLUMNS // 2, head_x, VIEW_COLUMNS, engine.grid_width)
+        camera_y = follow(head_y - VIEW_ROWS // 2, head_y, VIEW_ROWS, engine.grid_height)
+
+def set_board_size(width, height):
+    """修改棋盘大小（格子数，可以大于窗口）并重置引擎；在开始游戏前调用"""
+    global GRID_WIDTH, GRID_HEIGHT
+
+    finish_recording()  # 进行中的对局就此结束
+    GRID_WIDTH = width
+    GRID_HEIGHT = height
+    engine.grid_width = width
+    engine.grid_height = height
+    engine.reset()
+    for _, pilot in AUTOPILOTS:
+        pilot.reset()
+    center_camera()
+
+@profiler.timed("draw_grid")
 def draw_grid():
-    """绘制网格线"""
-    for x in range(0, WIDTH, CELL_SIZE):
-        screen.draw.line((x, 0), (x, HEIGHT), GRID_COLOR)
-    for y in range(0, HEIGHT, CELL_SIZE):
-        screen.draw.line((0, y), (WIDTH, y), GRID_COLOR)
-
-def draw_snake():
-    """绘制蛇"""
-    # 缓存蛇的屏幕坐标
-    snake_screen_coords = [(x * CELL_SIZE, y * CELL_SIZE) for (x, y) in snake]
-    
-    for i, (screen_x, screen_y) in enumerate(snake_screen_coords):
-        # 绘制蛇身
-        if i == 0:  # 头部
-            # 计算与身体颜色相近但略有区别的头部颜色
-            base_color = SNAKE_BODY_COLORS[snake_color_index]
-            r_norm, g_norm, b_norm = (c / 255.0 for c in base_color)
-            h, s, v = colorsys.rgb_to_hsv(r_norm, g_norm, b_norm)
-            # 增大色差：稍微偏移色相，显著降低饱和度并增加亮度
-            h = (h + 0.06) % 1.0
-            s = max(0.0, s * 0.55)   # 更明显去色
-            v = min(1.0, v * 1.18 + 0.06)  # 更明显提亮
-            r2, g2, b2 = colorsys.hsv_to_rgb(h, s, v)
-            head_color = (int(r2 * 255), int(g2 * 255), int(b2 * 255))
-
-            # 绘制头部矩形（使用与身体相近但不同的颜色）
-            screen.draw.filled_rect(
-                Rect((screen_x, screen_y), (CELL_SIZE, CELL_SIZE)),
-                head_color
-            )
-            # 绘制眼睛
-            eye_size = CELL_SIZE // 5
-            
-            if direction == RIGHT:
-                # 右眼（靠近头部右侧，上下分开）
-                screen.draw.filled_circle(
-                    (screen_x + CELL_SIZE - eye_size, screen_y + CELL_SIZE // 4),
-                    eye_size, (0, 0, 0)
-                )
-                # 左眼（靠近头部右侧，上下分开）
-                screen.draw.filled_circle(
-                    (screen_x + CELL_SIZE - eye_size, screen_y + 3 * CELL_SIZE // 4),
-                    eye_size, (0, 0, 0)
-                )
-            elif direction == LEFT:
-                # 左眼（靠近头部左侧，上下分开）
-                screen.draw.filled_circle(
-                    (screen_x + eye_size, screen_y + CELL_SIZE // 4),
-                    eye_size, (0, 0, 0)
-                )
-                # 右眼（靠近头部左侧，上下分开）
-                screen.draw.filled_circle(
-                    (screen_x + eye_size, screen_y + 3 * CELL_SIZE // 4),
-                    eye_size, (0, 0, 0)
-                )
-            elif direction == UP:
-                # 上眼（靠近头部上方，左右分开）
-                screen.draw.filled_circle(
-                    (screen_x + CELL_SIZE // 4, screen_y + eye_size),
-                    eye_size, (0, 0, 0)
-                )
-                # 下眼（靠近头部上方，左右分开）
-                screen.draw.filled_circle(
-                    (screen_x + 3 * CELL_SIZE // 4, screen_y + eye_size),
-                    eye_size, (0, 0, 0)
-                )
-            elif direction == DOWN:
-                # 上眼（靠近头部下方，左右分开）
-                screen.draw.filled_circle(
-                    (screen_x + CELL_SIZE // 4, screen_y + CELL_SIZE - eye_size),
-                    eye_size, (0, 0, 0)
-                )
-                # 下眼（靠近头部下方，左右分开）
-                screen.draw.filled_circle(
-                    (screen_x + 3 * CELL_SIZE // 4, screen_y + CELL_SIZE - eye_size),
-                    eye_size, (0, 0, 0)
-                )
-        else:  # 身体
-            # 绘制身体矩形，使用渐变颜色（从头部亮→尾部暗）
-            # 计算渐变进度：0 近头，1 在尾
-            body_progress = min(1.0, (i - 1) / max(1, len(snake) - 2))
-            # 从身体基础颜色逐渐变暗
-            r_norm, g_norm, b_norm = (c / 255.0 for c in SNAKE_BODY_COLORS[snake_color_index])
-            h, s, v = colorsys.rgb_to_hsv(r_norm, g_norm, b_norm)
-            v_grad = v * (1.0 - 0.55 * body_progress)  # 尾部暗度增加 55%
-            r_grad, g_grad, b_grad = colorsys.hsv_to_rgb(h, s, v_grad)
-            body_color = (int(r_grad * 255), int(g_grad * 255), int(b_grad * 255))
-
-            screen.draw.filled_rect(
-                Rect((screen_x, screen_y), (CELL_SIZE, CELL_SIZE)),
-                body_color
-            )
-
-def draw_food():
-    """绘制食物"""
-    if food_pos:
-        x, y = food_pos
-        screen_x = x * CELL_SIZE
-        screen_y = y * CELL_SIZE
-        
-        # 绘制一个红色的圆形食物
-        center_x = screen_x + CELL_SIZE // 2
-        center_y = screen_y + CELL_SIZE // 2
-        
-        # 主圆
-        screen.draw.filled_circle(
-            (center_x, center_y), CELL_SIZE // 2 - 2, FOOD_COLOR
-        )
-        
-        # 高光效果
-        screen.draw.filled_circle(
-            (center_x - CELL_SIZE // 6, center_y - CELL_SIZE // 6),
-            CELL_SIZE // 6, (255, 150, 150)
-        )
+    """绘制背景和网格线（一次 blit 预渲染的背景层）"""
+    screen.blit(get_background_layer(), (0, 0))
+
+def build_color_gradient(base_color):
+    """计算头部颜色和量化的身体渐变（从身体基础颜色逐渐变暗）"""
+    r_norm, g_norm, b_norm = (c / 255.0 for c in base_color)
+    h, s, v = colorsys.rgb_to_hsv(r_norm, g_norm, b_norm)
 
-def draw_power_bean():
-    """绘制能量豆"""
-    if power_bean_pos:
-        x, y = power_bean_pos
-        screen_x = x * CELL_SIZE
-        screen_y = y * CELL_SIZE
-        center_x = screen_x + CELL_SIZE // 2
-        center_y = screen_y + CELL_SIZE // 2
-        
-        # 绘制黄色的菱形能量豆，比食物稍小但更醒目
-        bean_color = (255, 220, 0)  # 金黄色
-        bean_radius = CELL_SIZE // 3
-        
-        # 绘制一个旋转的方形（菱形）来区分于食物的圆形
-        for i in range(4):
-            angle = i * 90 + 45  # 菱形顶点
-            angle_rad = math.radians(angle)
-            x1 = center_x + bean_radius * math.cos(angle_rad)
-            y1 = center_y + bean_radius * math.sin(angle_rad)
-            angle2_rad = math.radians((i + 1) * 90 + 45)
-            x2 = center_x + bean_radius * math.cos(angle2_rad)
-            y2 = center_y + bean_radius * math.sin(angle2_rad)
-            screen.draw.line((int(x1), int(y1)), (int(x2), int(y2)), bean_color)
-        
-        # 填充菱形中心
-        screen.draw.filled_rect(
-            Rect((screen_x + 5, screen_y + 5), (CELL_SIZE - 10, CELL_SIZE - 10)),
-            bean_color
+    # 头部：增大色差，稍微偏移色相，显著降低饱和度并增加亮度
+    head_h = (h + 0.06) % 1.0
+    head_s = max(0.0, s * 0.55)   # 更明显去色
+    head_v = min(1.0, v * 1.18 + 0.06)  # 更明显提亮
+    r2, g2, b2 = colorsys.hsv_to_rgb(head_h, head_s, head_v)
+    head_color = (int(r2 * 255), int(g2 * 255), int(b2 * 255))
+
+    # 身体：渐变进度 0 近头，1 在尾，尾部暗度增加 55%
+    body_colors = []
+    for step in range(GRADIENT_STEPS):
+        body_progress = step / (GRADIENT_STEPS - 1)
+        v_grad = v * (1.0 - 0.55 * body_progress)
+        r_grad, g_grad, b_grad = colorsys.hsv_to_rgb(h, s, v_grad)
+        body_colors.append((int(r_grad * 255), int(g_grad * 255), int(b_grad * 255)))
+    return head_color, body_colors
+
+def get_color_gradient(color_index):
+    """返回某种蛇身颜色的 (头部颜色, 身体渐变)，每种颜色只计算一次"""
+    if color_index not in gradient_cache:
+        gradient_cache[color_index] = build_color_gradient(SNAKE_BODY_COLORS[color_index])
+    return gradient_cache[color_index]
+
+def get_snake_colors(length):
+    """返回蛇每一节的颜色（[0] 为头部）；只在按C换色或蛇长改变时重建"""
+    global snake_colors, snake_colors_key
+
+    key = (snake_color_index, length)
+    if key != snake_colors_key:
+        head_color, body_colors = get_color_gradient(snake_color_index)
+        last_step = GRADIENT_STEPS - 1
+        denominator = max(1, length - 2)
+        snake_colors = [head_color]
+        snake_colors.extend(
+            body_colors[round(min(1.0, (i - 1) / denominator) * last_step)]
+            for i in range(1, length)
         )
+        snake_colors_key = key
+    return snake_colors
 
+def paint_snake_head(surface, screen_x, screen_y, color, direction):
+    """在 surface 上画蛇头（方块和朝向对应的两只眼睛）"""
+    # 绘制头部矩形（使用与身体相近但不同的颜色）
+    surface.fill(color, pygame.Rect(screen_x, screen_y, CELL_SIZE, CELL_SIZE))
+    # 绘制眼睛
+    eye_size = CELL_SIZE // 5
+    
+    if direction == RIGHT:
+        # 右眼（靠近头部右侧，上下分开）
+        pygame.draw.circle(surface, (0, 0, 0), (screen_x + CELL_SIZE - eye_size, screen_y + CELL_SIZE // 4), eye_size)
+        # 左眼（靠近头部右侧，上下分开）
+        pygame.draw.circle(surface, (0, 0, 0), (screen_x + CELL_SIZE - eye_size, screen_y + 3 * CELL_SIZE // 4), eye_size)
+    elif direction == LEFT:
+        # 左眼（靠近头部左侧，上下分开）
+        pygame.draw.circle(surface, (0, 0, 0), (screen_x + eye_size, screen_y + CELL_SIZE // 4), eye_size)
+        # 右眼（靠近头部左侧，上下分开）
+        pygame.draw.circle(surface, (0, 0, 0), (screen_x + eye_size, screen_y + 3 * CELL_SIZE // 4), eye_size)
+    elif direction == UP:
+        # 上眼（靠近头部上方，左右分开）
+        pygame.draw.circle(surface, (0, 0, 0), (screen_x + CELL_SIZE // 4, screen_y + eye_size), eye_size)
+        # 下眼（靠近头部上方，左右分开）
+        pygame.draw.circle(surface, (0, 0, 0), (screen_x + 3 * CELL_SIZE // 4, screen_y + eye_size), eye_size)
+    elif direction == DOWN:
+        # 上眼（靠近头部下方，左右分开）
+        pygame.draw.circle(surface, (0, 0, 0), (screen_x + CELL_SIZE // 4, screen_y + CELL_SIZE - eye_size), eye_size)
+        # 下眼（靠近头部下方，左右分开）
+        pygame.draw.circle(surface, (0, 0, 0), (screen_x + 3 * CELL_SIZE // 4, screen_y + CELL_SIZE - eye_size), eye_size)
+
+def paint_food(surface, screen_x, screen_y):
+    """在 surface 上画食物"""
+    # 绘制一个红色的圆形食物
+    center_x = screen_x + CELL_SIZE // 2
+    center_y = screen_y + CELL_SIZE // 2
+    
+    # 主圆
+    pygame.draw.circle(surface, FOOD_COLOR, (center_x, center_y), CELL_SIZE // 2 - 2)
+    
+    # 高光效果
+    pygame.draw.circle(surface, (255, 150, 150), (center_x - CELL_SIZE // 6, center_y - CELL_SIZE // 6), CELL_SIZE // 6)
+
+def paint_power_bean(surface, screen_x, screen_y):
+    """在 surface 上画能量豆"""
+    center_x = screen_x + CELL_SIZE // 2
+    center_y = screen_y + CELL_SIZE // 2
+    
+    # 绘制黄色的菱形能量豆，比食物稍小但更醒目
+    bean_color = (255, 220, 0)  # 金黄色
+    bean_radius = CELL_SIZE // 3
+    
+    # 绘制一个旋转的方形（菱形）来区分于食物的圆形
+    for i in range(4):
+        angle = i * 90 + 45  # 菱形顶点
+        angle_rad = math.radians(angle)
+        x1 = center_x + bean_radius * math.cos(angle_rad)
+        y1 = center_y + bean_radius * math.sin(angle_rad)
+        angle2_rad = math.radians((i + 1) * 90 + 45)
+        x2 = center_x + bean_radius * math.cos(angle2_rad)
+        y2 = center_y + bean_radius * math.sin(angle2_rad)
+        pygame.draw.line(surface, bean_color, (int(x1), int(y1)), (int(x2), int(y2)))
+    
+    # 填充菱形中心
+    surface.fill(bean_color, pygame.Rect(screen_x + 5, screen_y + 5, CELL_SIZE - 10, CELL_SIZE - 10))
+
+def get_sprite_atlas():
+    """返回 (图集, 区域表)：蛇头四个方向、食物、能量豆和身体渐变方块预渲染在一张 Surface 上
+
+    按 (CELL_SIZE, snake_color_index) 缓存，只在格子大小或蛇身颜色改变时重建。
+    区域表：{'head': {方向: 区域}, 'food': 区域, 'bean': 区域, 'body': {颜色: 区域}}
+    """
+    global sprite_atlas, sprite_areas, sprite_atlas_key
+
+    key = (CELL_SIZE, snake_color_index)
+    if sprite_atlas is None or sprite_atlas_key != key:
+        head_color, body_colors = get_color_gradient(snake_color_index)
+        body_tiles = list(dict.fromkeys(body_colors))  # 去掉重复的量化颜色
+        columns = ATLAS_COLUMNS
+        rows = 1 + (len(body_tiles) + columns - 1) // columns
+        atlas = pygame.Surface((columns * CELL_SIZE, rows * CELL_SIZE), pygame.SRCALPHA)
+
+        def tile(k):
+            return pygame.Rect((k % columns) * CELL_SIZE, (k // columns) * CELL_SIZE, CELL_SIZE, CELL_SIZE)
+
+        areas = {'head': {}, 'body': {}}
+        for k, direction in enumerate((RIGHT, LEFT, UP, DOWN)):
+            area = tile(k)
+            paint_snake_head(atlas, area.left, area.top, head_color, direction)
+            areas['head'][direction] = area
+        areas['food'] = tile(4)
+        paint_food(atlas, areas['food'].left, areas['food'].top)
+        areas['bean'] = tile(5)
+        paint_power_bean(atlas, areas['bean'].left, areas['bean'].top)
+        for k, color in enumerate(body_tiles, start=columns):
+            area = tile(k)
+            atlas.fill(color, area)
+            areas['body'][color] = area
+
+        sprite_atlas = atlas.convert_alpha() if pygame.display.get_surface() else atlas
+        sprite_areas = areas
+        sprite_atlas_key = key
+    return sprite_atlas, sprite_areas
+
+def get_body_blits():
+    """返回身体方块的批量 blit 条目表；图集、格子或视野大小改变时清空"""
+    global body_blits_key
+
+    key = (get_sprite_atlas()[0], CELL_SIZE, VIEW_COLUMNS, VIEW_ROWS)
+    if body_blits_key != key:
+        body_blits.clear()
+        body_blits_key = key
+    return body_blits
+
+def body_blit(color, cell):
+    """创建并缓存视野格子 cell 上颜色为 color 的身体方块条目（表中还没有时才调用）"""
+    row = body_blits.get(color)
+    if row is None:
+        row = body_blits[color] = [None] * (VIEW_COLUMNS * VIEW_ROWS)
+    x, y = cell % VIEW_COLUMNS, cell // VIEW_COLUMNS
+    row[cell] = entry = (sprite_atlas, (x * CELL_SIZE, y * CELL_SIZE), sprite_areas['body'][color])
+    return entry
+
+@profiler.timed("draw_snake")
+def draw_snake(batch):
+    """把蛇的每一节加入批量 blit 列表
+
+    直接遍历 engine.snake 的格子下标缓冲区（SnakeBody.views()，零拷贝），每节的 blit 条目
+    按（颜色, 视野格子）缓存在 body_blits 中，每帧不再为蛇身创建坐标和条目元组。
+    """
+    snake = engine.snake
+    length = len(snake)
+    colors = get_snake_colors(length)
+    atlas, areas = get_sprite_atlas()
+    blits = get_body_blits()
+    width = engine.grid_width
+    columns = VIEW_COLUMNS
+    rows = VIEW_ROWS
+    left, top = camera_x, camera_y
+
+    if incremental_mode:
+        cell_colors.clear()  # 视野内每个蛇身格子画的颜色，增量重绘时沿用
+
+    # 身体：渐变颜色（从头部亮→尾部暗），视野外的节不画
+    if length <= columns * rows:
+        # 从蛇尾往蛇头画，节点序号 i 递减：重复的尾节点最后画（并记下）最靠近头部的那一节
+        i = length - 1
+        for view in snake.views():
+            for index in view:
+                if i:
+                    x = index % width - left
+                    y = index // width - top
+                    if 0 <= x < columns and 0 <= y < rows:
+                        color = colors[i]
+                        cell = y * columns + x
+                        row = blits.get(color)
+                        entry = row[cell] if row is not None else None
+                        batch.append(entry or body_blit(color, cell))
+                        if incremental_mode:
+                            cell_colors[(x + left, y + top)] = color
+                i -= 1
+    else:
+        # 蛇比视野还长：改为扫描视野内的格子，节点序号由 engine.entry_tick 得出
+        occupancy = engine.occupancy
+        entry_tick = engine.entry_tick
+        ticks = engine.ticks
+        for y in range(min(rows, engine.grid_height - top)):
+            start = (top + y) * width + left
+            for x in range(min(columns, width - left)):
+                if occupancy[start + x]:
+                    i = ticks - entry_tick[start + x]
+                    if i:
+                        color = colors[i]
+                        cell = y * columns + x
+                        row = blits.get(color)
+                        entry = row[cell] if row is not None else None
+                        batch.append(entry or body_blit(color, cell))
+                        if incremental_mode:
+                            cell_colors[(x + left, y + top)] = color
+
+    # 头部：按当前方向选择带眼睛的精灵（视野总是包含蛇头）
+    head = snake.head
+    batch.append((atlas, ((head % width - left) * CELL_SIZE, (head // width - top) * CELL_SIZE),
+                  areas['head'][engine.direction]))
+
+def is_visible(pos):
+    """格子是否在视野内"""
+    return camera_x <= pos[0] < camera_x + VIEW_COLUMNS and camera_y <= pos[1] < camera_y + VIEW_ROWS
+
+@profiler.timed("draw_food")
+def draw_food(batch):
+    """把食物加入批量 blit 列表"""
+    if engine.food_pos and is_visible(engine.food_pos):
+        atlas, areas = get_sprite_atlas()
+        x, y = engine.food_pos
+        batch.append((atlas, ((x - camera_x) * CELL_SIZE, (y - camera_y) * CELL_SIZE), areas['food']))
+
+@profiler.timed("draw_power_bean")
+def draw_power_bean(batch):
+    """把能量豆加入批量 blit 列表"""
+    if engine.power_bean_pos and is_visible(engine.power_bean_pos):
+        atlas, areas = get_sprite_atlas()
+        x, y = engine.power_bean_pos
+        batch.append((atlas, ((x - camera_x) * CELL_SIZE, (y - camera_y) * CELL_SIZE), areas['bean']))
+
+def draw_text(text, pos=None, center=None, fontsize=30, fontname="simhei.ttf", color=TEXT_COLOR):
+    """绘制文字：渲染结果按 (文字, 字体, 字号, 颜色) 缓存，超出容量时淘汰最久未用的"""
+    global text_cache_hits, text_cache_misses
+
+    key = (text, fontname, fontsize, color)
+    surface = text_cache.get(key)
+    if surface is None:
+        text_cache_misses += 1
+        surface = ptext.getsurf(text, fontname=fontname, fontsize=fontsize, color=color)
+        text_cache[key] = surface
+        if len(text_cache) > TEXT_CACHE_SIZE:
+            text_cache.popitem(last=False)
+    else:
+        text_cache_hits += 1
+        text_cache.move_to_end(key)
+
+    if center is not None:
+        pos = surface.get_rect(center=center).topleft
+    screen.blit(surface, pos)
+    return pygame.Rect(pos, surface.get_size())
+
+def text_cache_hit_rate():
+    """文字缓存命中率（0~1）"""
+    total = text_cache_hits + text_cache_misses
+    return text_cache_hits / total if total else 0.0
+
+@profiler.timed("draw_start_screen")
 def draw_start_screen():
     """绘制开始屏幕"""
-    screen.draw.text(
+    draw_text(
         "贪吃蛇游戏",
         center=(WIDTH // 2, HEIGHT // 2 - 100),
         fontname="simhei.ttf",
@@ -483,7 +781,7 @@ def draw_start_screen():
         color=SNAKE_HEAD_COLOR
     )
     
-    screen.draw.text(
+    draw_text(
         "使用方向键控制蛇的移动",
         center=(WIDTH // 2, HEIGHT // 2 - 20),
         fontsize=30,
@@ -491,7 +789,7 @@ def draw_start_screen():
         color=TEXT_COLOR
     )
     
-    screen.draw.text(
+    draw_text(
         "吃到红色食物可以增长身体",
         center=(WIDTH // 2, HEIGHT // 2 + 20),
         fontsize=30,
@@ -499,7 +797,7 @@ def draw_start_screen():
         color=TEXT_COLOR
     )
     
-    screen.draw.text(
+    draw_text(
         "按空格键开始游戏",
         center=(WIDTH // 2, HEIGHT // 2 + 100),
         fontsize=40,
@@ -507,7 +805,7 @@ def draw_start_screen():
         color=(255, 255, 100)
     )
     
-    screen.draw.text(
+    draw_text(
         "按ESC键退出游戏",
         center=(WIDTH // 2, HEIGHT // 2 + 150),
         fontsize=25,
@@ -515,15 +813,16 @@ def draw_start_screen():
         color=(200, 200, 200)
     )
 
+@profiler.timed("draw_game_over_screen")
 def draw_game_over_screen():
     """绘制游戏结束屏幕"""
     # 半透明黑色覆盖层
     overlay = Rect((0, 0), (WIDTH, HEIGHT))
     screen.draw.filled_rect(overlay, (0, 0, 0, 128))
     
-    if wingame:
+    if engine.wingame:
         # 游戏胜利文字
-        screen.draw.text(
+        draw_text(
             "恭喜你，赢得了游戏!",
             center=(WIDTH // 2, HEIGHT // 2 - 50),
             fontsize=60,
@@ -532,7 +831,7 @@ def draw_game_over_screen():
         )
     else:
         # 游戏结束文字
-        screen.draw.text(
+        draw_text(
             "游戏结束!",
             center=(WIDTH // 2, HEIGHT // 2 - 50),
             fontsize=60,
@@ -540,23 +839,23 @@ def draw_game_over_screen():
             color=GAME_OVER_COLOR
         )
     
-    screen.draw.text(
-        f"最终得分: {score}",
+    draw_text(
+        f"最终得分: {engine.score}",
         center=(WIDTH // 2, HEIGHT // 2 + 20),
         fontsize=40,
         fontname="simhei.ttf",
         color=TEXT_COLOR
     )
     
-    screen.draw.text(
-        f"蛇的长度: {len(snake)}",
+    draw_text(
+        f"蛇的长度: {len(engine.snake)}",
         center=(WIDTH // 2, HEIGHT // 2 + 70),
         fontsize=35,
         fontname="simhei.ttf",
         color=TEXT_COLOR
     )
     
-    screen.draw.text(
+    draw_text(
         "按R键重新开始",
         center=(WIDTH // 2, HEIGHT // 2 + 130),
         fontsize=30,
@@ -564,125 +863,329 @@ def draw_game_over_screen():
         color=TEXT_COLOR
     )
 
+def hud_lines():
+    """返回当前 HUD 各行：(文字, 位置, 字号, 颜色)"""
+    # 自动模式状态
+    if not auto_mode:
+        mode_text = "按A键启用自动模式"
+    elif autopilot is background_autopilot:
+        mode_text = f"自动模式: {PATHFINDING_ALGORITHMS[algorithm_index][1]} (按A切换, F换算法)"
+    else:
+        mode_text = f"自动模式: {AUTOPILOTS[autopilot_index][0]} (按A切换)"
+    mode_color = (255, 200, 0) if auto_mode else TEXT_COLOR
+    # 无限模式状态
+    inf_text = "无限模式: 开启" if infinite_mode else "按B键启用无限模式"
+    inf_color = (255, 200, 0) if infinite_mode else TEXT_COLOR
+    # 蛇身颜色指示
+    color_names = ["红", "橙", "黄", "绿", "青", "蓝", "紫"]
+    color_text = f"蛇身颜色: {color_names[snake_color_index]} (按C切换)"
+    # 渲染模式
+    render_text = "增量渲染: 开启 (按D切换)" if incremental_mode else "按D键启用增量渲染"
+    profile_text = "性能分析: 开启 (按P切换)" if profiler.enabled else "按P键启用性能分析"
+    turbo = TURBO_LEVELS[turbo_index]
+    turbo_text = f"加速: 每帧 {turbo} 步 (按T切换)" if turbo > 1 else "按T键加速"
+
+    lines = [
+        (f"分数: {engine.score}", (10, 10), 30, TEXT_COLOR),
+        (f"长度: {len(engine.snake)}", (10, 50), 30, TEXT_COLOR),
+        (f"最高分: {engine.high_score}", (WIDTH - 200, 10), 30, TEXT_COLOR),
+        ("方向键控制移动", (WIDTH - 200, 50), 20, TEXT_COLOR),
+        (mode_text, (10, 90), 20, mode_color),
+        (inf_text, (10, 120), 20, inf_color),
+        (color_text, (10, 150), 20, SNAKE_BODY_COLORS[snake_color_index]),
+        (f"文字缓存命中率: {text_cache_hit_rate():.0%}", (10, 180), 20, TEXT_COLOR),
+        (render_text, (10, 210), 20, TEXT_COLOR),
+        (profile_text, (10, 240), 20, PROFILE_COLOR if profiler.enabled else TEXT_COLOR),
+        (turbo_text, (10, 270), 20, (255, 200, 0) if turbo > 1 else TEXT_COLOR),
+    ]
+    if replayer is not None:
+        lines.append((f"回放中: {replay_speed:g} 倍速 (ESC退出)", (10, 300), 20, (255, 200, 0)))
+    if engine.grid_width > VIEW_COLUMNS or engine.grid_height > VIEW_ROWS:
+        lines.append((f"棋盘: {engine.grid_width}x{engine.grid_height}  视野: ({camera_x}, {camera_y})",
+                      (10, HEIGHT - 30), 20, TEXT_COLOR))
+    if profiler.enabled:
+        lines.extend(profile_lines())
+    return lines
+
+def profile_lines():
+    """性能分析叠加层：寻路率和各计时项的 p50 / p99（毫秒），在右侧模式行下方"""
+    x = WIDTH - 330
+    bfs_rate = profiler.ratio("auto_eat_food:bfs", "auto_eat_food:cached")
+    lines = [(f"寻路率: {bfs_rate:.1%}", (x, 90), 18, PROFILE_COLOR)]
+    for i, (name, p50, p99) in enumerate(profiler.report()):
+        text = f"{name}: p50 {p50 * 1000:.2f} p99 {p99 * 1000:.2f} ms"
+        lines.append((text, (x, 112 + 20 * i), 16, PROFILE_COLOR))
+    return lines
+
+def dump_profile():
+    """退出时导出性能分析样本（只在开启过性能分析时）"""
+    if not profiler.used:
+        return
+    extra = {
+        "bfs_recompute_rate": profiler.ratio("auto_eat_food:bfs", "auto_eat_food:cached"),
+        "autopilot": AUTOPILOTS[autopilot_index][0],
+        "pathfinding": PATHFINDING_ALGORITHMS[algorithm_index][0],
+        "incremental_mode": incremental_mode,
+    }
+    profiler.dump(PROFILE_DUMP_FILE, extra)
+    print(f"Profile samples written to {PROFILE_DUMP_FILE}")
+
+atexit.register(dump_profile)
+
+@profiler.timed("draw_hud")
+def draw_hud():
+    """绘制 HUD 全部文字，并记下每行所占的矩形供增量渲染使用"""
+    global hud_drawn
+
+    hud_drawn = []
+    for line in hud_lines():
+        text, pos, fontsize, color = line
+        rect = draw_text(text, pos, fontsize=fontsize, fontname="simhei.ttf", color=color)
+        hud_drawn.append((line, rect))
+
+def draw_cell(pos):
+    """增量模式：重绘一个格子（背景 + 格子上的蛇身/食物/能量豆）"""
+    x, y = pos
+    screen_x = (x - camera_x) * CELL_SIZE
+    screen_y = (y - camera_y) * CELL_SIZE
+    cell_rect = pygame.Rect(screen_x, screen_y, CELL_SIZE, CELL_SIZE)
+    screen.surface.blit(get_background_layer(), cell_rect, cell_rect)
+    if not (x < engine.grid_width and y < engine.grid_height):
+        return cell_rect  # 棋盘比窗口小时，棋盘以外的区域只有背景
+
+    atlas, areas = get_sprite_atlas()
+    if engine.is_occupied(pos):
+        if pos == engine.snake[0]:
+            area = areas['head'][engine.direction]
+        else:
+            color = cell_colors.get(pos)
+            area = areas['body'].get(color) or areas['body'][get_snake_colors(len(engine.snake))[-1]]
+    elif pos == engine.food_pos:
+        area = areas['food']
+    elif pos == engine.power_bean_pos:
+        area = areas['bean']
+    else:
+        return cell_rect
+    screen.surface.blit(atlas, cell_rect, area)
+    return cell_rect
+
+def cells_in_rect(rect):
+    """返回与屏幕矩形相交的视野内格子（棋盘坐标）"""
+    x0 = max(0, rect.left // CELL_SIZE)
+    y0 = max(0, rect.top // CELL_SIZE)
+    x1 = min(VIEW_COLUMNS - 1, (rect.right - 1) // CELL_SIZE)
+    y1 = min(VIEW_ROWS - 1, (rect.bottom - 1) // CELL_SIZE)
+    return [(camera_x + x, camera_y + y) for y in range(y0, y1 + 1) for x in range(x0, x1 + 1)]
+
+@profiler.timed("draw_incremental")
+def draw_incremental():
+    """增量渲染：只重绘上一帧以来变化的格子（脏矩形）和变化的 HUD 行"""
+    global frames_since_full_repaint, drawn_head, full_repaint_needed, hud_drawn
+
+    frames_since_full_repaint += 1
+    dirty = set()  # 需要重绘的格子
+
+    events = engine.events
+    for event in events:
+        kind = event[0]
+        if kind == EVENT_HEAD:
+            # 旧蛇头变成脖子：换成渐变最亮的身体颜色，新蛇头画眼睛
+            if drawn_head is not None:
+                cell_colors[drawn_head] = get_snake_colors(len(engine.snake))[1]
+                dirty.add(drawn_head)
+            drawn_head = event[1]
+            dirty.add(drawn_head)
+        elif kind == EVENT_TAIL:
+            dirty.add(event[1])
+        elif kind == EVENT_FOOD or kind == EVENT_BEAN:
+            for pos in event[1:]:
+                if pos is not None:
+                    dirty.add(pos)
+        elif kind == EVENT_RESET:
+            full_repaint_needed = True
+    events.clear()
+    if update_camera():
+        full_repaint_needed = True  # 视野滚动了，整个画面都要平移
+    if full_repaint_needed:
+        draw()
+        return
+
+    # HUD 内容变化的行：擦掉旧文字所在的格子，之后重写
+    new_lines = hud_lines()
+    if len(new_lines) != len(hud_drawn):
+        full_repaint_needed = True
+        draw()
+        return
+    changed = set()
+    for i, (line, rect) in enumerate(hud_drawn):
+        if line != new_lines[i]:
+            changed.add(i)
+            dirty.update(cells_in_rect(rect))
+
+    dirty_rects = [draw_cell(pos) for pos in dirty if is_visible(pos)]
+
+    # 重写内容变化、或被重绘格子盖住的 HUD 行
+    for i, line in enumerate(new_lines):
+        rect = hud_drawn[i][1]
+        if i in changed or rect.collidelist(dirty_rects) != -1:
+            text, pos, fontsize, color = line
+            rect = draw_text(text, pos, fontsize=fontsize, fontname="simhei.ttf", color=color)
+            hud_drawn[i] = (line, rect)
+
+@profiler.timed("draw")
 def draw():
     """绘制游戏画面"""
-    # 清屏
-    screen.fill(BACKGROUND_COLOR)
-    
+    global full_repaint_needed, frames_since_full_repaint, drawn_head
+
+    profiler.mark_frame()
+    if (incremental_mode and game_started and not engine.game_over
+            and not full_repaint_needed and frames_since_full_repaint < FULL_REPAINT_INTERVAL):
+        draw_incremental()
+        return
+
+    # 整屏重绘：之前的增量事件都已体现在画面上
+    full_repaint_needed = False
+    frames_since_full_repaint = 0
+    if engine.events is not None:
+        engine.events.clear()
+    drawn_head = engine.snake[0] if engine.snake else None
+    update_camera()
+
     if not game_started:
-        # 绘制开始屏幕
+        # 清屏并绘制开始屏幕
+        screen.fill(BACKGROUND_COLOR)
         draw_start_screen()
         return
     
-    # 绘制网格
+    # 绘制背景和网格（同时起到清屏的作用）
     draw_grid()
     
-    # 绘制食物
-    draw_food()
-    
-    # 绘制能量豆
-    draw_power_bean()
-        # 绘制蛇
-    draw_snake()
-    
-    # 绘制分数
-    screen.draw.text(
-        f"分数: {score}",
-        (10, 10),
-        fontsize=30,
-        fontname="simhei.ttf",
-        color=TEXT_COLOR
-    )
-    
-    # 绘制长度
-    screen.draw.text(
-        f"长度: {len(snake)}",
-        (10, 50),
-        fontsize=30,
-        fontname="simhei.ttf",
-        color=TEXT_COLOR
-    )
-    
-    # 绘制最高分
-    screen.draw.text(
-        f"最高分: {high_score}",
-        (WIDTH - 200, 10),
-        fontsize=30,
-        fontname="simhei.ttf",
-        color=TEXT_COLOR
-    )
-    
-    # 绘制操作提示 
-    screen.draw.text(
-        "方向键控制移动",
-        (WIDTH - 200, 50),
-        fontsize=20,
-        fontname="simhei.ttf",
-        color=TEXT_COLOR
-    )
+    # 食物、能量豆和蛇：从精灵图集一次批量 blit
+    batch = []
+    draw_food(batch)
+    draw_power_bean(batch)
+    draw_snake(batch)
+    screen.surface.blits(batch, doreturn=False)
     
-    # 绘制自动模式状态
-    mode_text = "自动模式: 开启" if auto_mode else "按A键启用自动模式"
-    mode_color = (255, 200, 0) if auto_mode else TEXT_COLOR
-    screen.draw.text(
-        mode_text,
-        (10, 90),
-        fontsize=20,
-        fontname="simhei.ttf",
-        color=mode_color
-    )
-    # 绘制无限模式状态
-    inf_text = "无限模式: 开启" if infinite_mode else "按B键启用无限模式"
-    inf_color = (255, 200, 0) if infinite_mode else TEXT_COLOR
-    screen.draw.text(
-        inf_text,
-        (10, 120),
-        fontsize=20,
-        fontname="simhei.ttf",
-        color=inf_color
-    )
-    # 绘制蛇身颜色指示
-    color_names = ["红", "橙", "黄", "绿", "青", "蓝", "紫"]
-    color_text = f"蛇身颜色: {color_names[snake_color_index]} (按C切换)"
-    screen.draw.text(
-        color_text,
-        (10, 150),
-        fontsize=20,
-        fontname="simhei.ttf",
-        color=SNAKE_BODY_COLORS[snake_color_index]
-    )
+    # 绘制分数、长度、模式等 HUD 文字
+    draw_hud()
     
     # 游戏结束显示
-    if game_over:
+    if engine.game_over:
         draw_game_over_screen()
+        full_repaint_needed = True  # 覆盖层之后必须整屏重绘
 
 import sys
 
+def cycle_snake_color():
+    """C键：切换蛇身颜色"""
+    global snake_color_index, full_repaint_needed
+
+    snake_color_index = (snake_color_index + 1) % len(SNAKE_BODY_COLORS)
+    full_repaint_needed = True  # 整条蛇换色
+    print(f"Snake color changed to index {snake_color_index}")
+
+def toggle_infinite_mode():
+    """B键：切换无限模式"""
+    global infinite_mode
+
+    infinite_mode = not infinite_mode
+    engine.infinite_mode = infinite_mode
+    if infinite_mode:
+        engine.wingame = False
+    print(f"INFINITE MODE set to {infinite_mode}")
+
+def cycle_turbo():
+    """T键：切换加速档位（每帧走的节拍数）"""
+    global turbo_index
+
+    turbo_index = (turbo_index + 1) % len(TURBO_LEVELS)
+    print(f"TURBO set to {TURBO_LEVELS[turbo_index]} ticks per frame")
+
+def cycle_algorithm():
+    """F键：切换 BFS 自动模式使用的寻路算法"""
+    global algorithm_index
+
+    algorithm_index = (algorithm_index + 1) % len(PATHFINDING_ALGORITHMS)
+    algorithm, _ = PATHFINDING_ALGORITHMS[algorithm_index]
+    background_autopilot.set_algorithm(algorithm)
+    print(f"PATHFINDING set to {algorithm}")
+
+def toggle_autopilot():
+    """A键：切换自动模式：关闭 → BFS → 哈密顿回路 → 关闭"""
+    global auto_mode, autopilot_index, autopilot
+
+    if not auto_mode:
+        auto_mode = True
+        autopilot_index = 0
+    elif autopilot_index + 1 < len(AUTOPILOTS):
+        autopilot_index += 1
+    else:
+        auto_mode = False
+    autopilot = AUTOPILOTS[autopilot_index][1]
+    autopilot.reset()  # 丢弃切换前的缓存
+
 def on_key_down(key):
     """处理按键按下"""
-    global next_direction, game_started, auto_mode, infinite_mode, wingame, snake_color_index
+    global next_direction, game_started
+    global incremental_mode, full_repaint_needed
     
     # 只处理预期的按键
-    valid_keys = [keys.SPACE, keys.ESCAPE, keys.R, keys.LEFT, keys.RIGHT, keys.UP, keys.DOWN, keys.A, keys.B, keys.C]
+    valid_keys = [keys.SPACE, keys.ESCAPE, keys.R, keys.LEFT, keys.RIGHT, keys.UP, keys.DOWN, keys.A, keys.B, keys.C, keys.D, keys.P, keys.S, keys.L, keys.T, keys.F]
     if key not in valid_keys:
         return
     
+    # Allow toggling incremental (dirty-rectangle) rendering at any time with D
+    if key == keys.D:
+        incremental_mode = not incremental_mode
+        engine.events = [] if incremental_mode or spectator is not None else None
+        full_repaint_needed = True
+        print(f"INCREMENTAL RENDERING set to {incremental_mode}")
+        return
+
+    # Allow toggling the profiling overlay at any time with P
+    if key == keys.P:
+        print(f"PROFILING set to {profiler.toggle()}")
+        return
+
+    # T cycles turbo (ticks per frame) at any time, replays included
+    if key == keys.T:
+        cycle_turbo()
+        return
+
+    # F 切换寻路算法（回放时不寻路，也可以先选好）
+    if key == keys.F:
+        cycle_algorithm()
+        return
+
+    # 回放模式只响应 D / P / T / F 和 ESC（退出）
+    if replayer is not None:
+        if key == keys.ESCAPE:
+            sys.exit()
+        return
+
+    # S saves the running game, L loads the last save (from the menu too)
+    if key == keys.S:
+        save_game()
+        return
+    if key == keys.L:
+        load_game()
+        return
+
     # Allow toggling color at any time with C
     if key == keys.C:
-        snake_color_index = (snake_color_index + 1) % len(SNAKE_BODY_COLORS)
-        print(f"Snake color changed to index {snake_color_index}")
+        record_key(recording.CODE_COLOR)
+        cycle_snake_color()
         return
-    
+
     # Allow toggling infinite mode at any time with B
     if key == keys.B:
-        infinite_mode = not infinite_mode
-        if infinite_mode:
-            wingame = False
-        print(f"INFINITE MODE set to {infinite_mode}")
+        record_key(recording.CODE_INFINITE)
+        toggle_infinite_mode()
         return
 
     # 优先处理游戏结束状态，确保按R可重启（即使 game_started 被误置为 False）
-    if game_over:
+    if engine.game_over:
         if key == keys.R:
             reset_game()
         elif key == keys.ESCAPE:
@@ -698,8 +1201,8 @@ def on_key_down(key):
     
     # 游戏进行中按键处理
     if key == keys.A:
-        # 按A键切换自动模式
-        auto_mode = not auto_mode
+        record_key(recording.CODE_AUTOPILOT)
+        toggle_autopilot()
     elif not auto_mode:
         # 只有在非自动模式下才响应方向键
         if key == keys.LEFT:
@@ -712,9 +1215,33 @@ def on_key_down(key):
             next_direction = DOWN
     
     if key == keys.ESCAPE:
-        # 返回主菜单
+        # 返回主菜单（中途放弃的对局也保存录像）
+        finish_recording()
         game_started = False
     # 注意：不要在游戏进行中按空格重置游戏（避免误触）。
 
-# 启动游戏
-pgzrun.go()
\ No newline at end of file
+# 启动游戏（仅直接运行时；被导入时不会打开窗口）
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description=TITLE)
+    parser.add_argument("--replay", metavar="FILE", help="回放录像文件（见 recording.py）")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="回放速度倍数（默认 1，即正常速度）")
+    parser.add_argument("--board", metavar="WxH",
+                        help="棋盘大小（格子数），可以大于窗口，例如 2000x2000；默认铺满窗口")
+    parser.add_argument("--spectate", metavar="PORT", type=int,
+                        help="在本机该端口上推送对局给观众（python spectator.py watch --port PORT）")
+    args = parser.parse_args()
+    if args.board:
+        board_width, board_height = (int(n) for n in args.board.lower().split("x"))
+        set_board_size(board_width, board_height)
+    if args.replay:
+        try:
+            start_replay(args.replay, args.speed)
+        except (OSError, ValueError) as error:
+            parser.error(f"cannot replay {args.replay}: {error}")
+    if args.spectate is not None:
+        start_spectating(args.spectate)
+
+    import pgzrun
+    pgzrun.go()
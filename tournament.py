@@ -0,0 +1,245 @@
+"""Tournament runner: play seeded headless games for every autopilot strategy.
+
+Each task is one game (strategy, board size, seed), run by `SnakeEngine` in a
+process pool. Results are streamed to a CSV or JSONL file as they arrive
+(format chosen by the file extension), and per-strategy percentiles are printed
+at the end.
+
+Per-game fields: score, final length, ticks survived, win flag, time spent in
+the strategy's `next_direction()` (pathfinding) and total wall time.
+With --record-dir each game is also saved as a replayable recording
+(see recording.py), named <strategy>-<W>x<H>-<seed>.snkr.
+
+Usage:
+    python tournament.py                                   # all strategies, 40x30, 100 seeds
+    python tournament.py --seeds 5000 --sizes 40x30 20x20 --output results.csv
+    python tournament.py --strategies bfs --infinite --workers 32 --output bfs.jsonl
+"""
+import argparse
+import csv
+import importlib
+import json
+import os
+import pickle
+import sys
+import time
+from functools import partial
+from multiprocessing import get_context
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from snake_engine import SnakeEngine  # noqa: E402
+from autopilot import BfsAutopilot, HamiltonianAutopilot  # noqa: E402
+import recording  # noqa: E402
+
+# Strategy name -> zero-argument factory returning an object with
+# reset() and next_direction(engine), like the classes in autopilot.py.
+STRATEGIES = {
+    "bfs": BfsAutopilot,
+    "bfs-greedy": partial(BfsAutopilot, safe=False),  # no tail-reachability check
+    "astar": partial(BfsAutopilot, algorithm="astar"),
+    "field": partial(BfsAutopilot, algorithm="field"),  # nearest of power bean / food
+    "hamiltonian": HamiltonianAutopilot,
+}
+
+FIELDS = ["strategy", "width", "height", "seed", "infinite", "score", "length",
+          "ticks", "won", "path_ms", "wall_ms"]
+PERCENTILES = (50, 90, 99)
+DEFAULT_MAX_TICKS = 1000000
+
+_pilots = {}  # per-worker pilot cache, reused across games like the game does
+_registered = {}  # strategies added by register_strategy(), re-registered in each worker
+
+
+def load_strategy(spec):
+    """Resolve a "module:callable" string to the factory it names."""
+    module, _, attr = spec.partition(":")
+    if not module or not attr:
+        raise ValueError(f"strategy must be given as 'module:callable', got {spec!r}")
+    factory = importlib.import_module(module)
+    for part in attr.split("."):
+        factory = getattr(factory, part)
+    return factory
+
+
+def register_strategy(name, factory):
+    """Make a strategy available to --strategies (call before main()).
+
+    `factory` is either an importable "module:callable" string or a picklable
+    zero-argument callable (a module-level function or class, or a partial of
+    one; not a lambda or a nested function). Workers started with spawn or
+    forkserver do not inherit this call, so the strategy is passed to each
+    worker when the pool starts.
+    """
+    if isinstance(factory, str):
+        STRATEGIES[name] = load_strategy(factory)
+    else:
+        try:
+            pickle.dumps(factory)
+        except (pickle.PicklingError, AttributeError, TypeError) as error:
+            raise ValueError(f"strategy {name!r} cannot be sent to worker processes: {error}"
+                             " (pass a 'module:callable' string instead)") from None
+        STRATEGIES[name] = factory
+    _registered[name] = factory
+
+
+def init_worker(registered):
+    """Pool initializer: add the strategies registered in the parent process."""
+    for name, factory in registered.items():
+        STRATEGIES[name] = load_strategy(factory) if isinstance(factory, str) else factory
+
+
+def play_game(task):
+    """Play one seeded game and return its result row."""
+    name, width, height, seed, infinite, max_ticks, record_dir = task
+    pilot = _pilots.get(name)
+    if pilot is None:
+        pilot = _pilots[name] = STRATEGIES[name]()
+    pilot.reset()
+
+    engine = SnakeEngine(width, height, seed=seed, infinite_mode=infinite)
+    engine.reset()
+    recorder = None
+    if record_dir:
+        recorder = recording.GameRecorder(width, height, seed, infinite_mode=infinite)
+    clock = time.perf_counter
+    path_time = 0.0
+    start = clock()
+    while engine.ticks < max_ticks:
+        t0 = clock()
+        action = pilot.next_direction(engine)
+        path_time += clock() - t0
+        tick = engine.ticks
+        direction = engine.direction
+        running = engine.step(action)
+        if recorder is not None:
+            recorder.record_step(tick, direction, engine.direction)
+        if not running:
+            break
+    wall_time = clock() - start
+    if recorder is not None:
+        recording.save(os.path.join(record_dir, f"{name}-{width}x{height}-{seed}.snkr"),
+                       recorder.finish(engine.ticks, engine.score))
+
+    return {
+        "strategy": name,
+        "width": width,
+        "height": height,
+        "seed": seed,
+        "infinite": infinite,
+        "score": engine.score,
+        "length": len(engine.snake),
+        "ticks": engine.ticks,
+        "won": engine.wingame,
+        "path_ms": round(path_time * 1000, 3),
+        "wall_ms": round(wall_time * 1000, 3),
+    }
+
+
+class ResultWriter:
+    """Append result rows to a .csv or .jsonl file, flushing after each row."""
+
+    def __init__(self, path):
+        self.file = open(path, "w", newline="")
+        self.csv = None
+        if not path.endswith((".jsonl", ".json")):
+            self.csv = csv.DictWriter(self.file, fieldnames=FIELDS)
+            self.csv.writeheader()
+
+    def write(self, row):
+        if self.csv is not None:
+            self.csv.writerow(row)
+        else:
+            self.file.write(json.dumps(row) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0
+    rank = max(1, -(-p * len(sorted_values) // 100))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(rows):
+    """Print per (strategy, board) percentiles, win rate and pathfinding cost."""
+    groups = {}
+    for row in rows:
+        groups.setdefault((row["strategy"], row["width"], row["height"]), []).append(row)
+
+    header = f"{'strategy':>12} {'board':>9} {'games':>6} {'win %':>6}"
+    for field in ("score", "length", "ticks"):
+        header += "".join(f" {f'{field[:5]} p{p}':>9}" for p in PERCENTILES)
+    header += f" {'path us/tick':>13}"
+    print(header)
+    for (name, width, height), group in sorted(groups.items()):
+        line = f"{name:>12} {f'{width}x{height}':>9} {len(group):6d}"
+        line += f" {100.0 * sum(r['won'] for r in group) / len(group):6.1f}"
+        for field in ("score", "length", "ticks"):
+            values = sorted(r[field] for r in group)
+            line += "".join(f" {percentile(values, p):>9}" for p in PERCENTILES)
+        ticks = sum(r["ticks"] for r in group) or 1
+        line += f" {1000 * sum(r['path_ms'] for r in group) / ticks:13.2f}"
+        print(line)
+
+
+def parse_size(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--strategies", nargs="+", default=sorted(STRATEGIES),
+                        choices=sorted(STRATEGIES), help="strategies to run (default: all)")
+    parser.add_argument("--sizes", nargs="+", default=["40x30"],
+                        help="board sizes as WxH (default: %(default)s)")
+    parser.add_argument("--seeds", type=int, default=100, help="games per strategy and size")
+    parser.add_argument("--seed-start", type=int, default=0, help="first seed")
+    parser.add_argument("--infinite", action="store_true",
+                        help="infinite mode (no win at length 100)")
+    parser.add_argument("--max-ticks", type=int, default=DEFAULT_MAX_TICKS,
+                        help="stop a game after this many ticks (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="worker processes (default: CPU count)")
+    parser.add_argument("--output", help="stream results to this .csv or .jsonl file")
+    parser.add_argument("--record-dir", help="save every game as a recording in this directory")
+    parser.add_argument("--start-method", choices=("fork", "spawn", "forkserver"),
+                        help="how worker processes are started (default: platform default)")
+    args = parser.parse_args(argv)
+
+    sizes = [parse_size(text) for text in args.sizes]
+    tasks = [(name, width, height, seed, args.infinite, args.max_ticks, args.record_dir)
+             for width, height in sizes
+             for name in args.strategies
+             for seed in range(args.seed_start, args.seed_start + args.seeds)]
+
+    writer = ResultWriter(args.output) if args.output else None
+    rows = []
+    start = time.perf_counter()
+    chunksize = max(1, min(16, len(tasks) // (4 * max(1, args.workers))))
+    try:
+        context = get_context(args.start_method)
+        with context.Pool(args.workers, initializer=init_worker,
+                          initargs=(_registered,)) as pool:
+            for row in pool.imap_unordered(play_game, tasks, chunksize):
+                rows.append(row)
+                if writer is not None:
+                    writer.write(row)
+                if len(rows) % 100 == 0:
+                    print(f"\r{len(rows)}/{len(tasks)} games", end="", file=sys.stderr, flush=True)
+    finally:
+        if writer is not None:
+            writer.close()
+    elapsed = time.perf_counter() - start
+    print(f"\r{len(rows)} games in {elapsed:.1f} s with {args.workers} workers", file=sys.stderr)
+
+    summarize(rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())